@@ -4,25 +4,44 @@ Owner/Administrator interface
 """
 
 import customtkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 import sqlite3
-import subprocess
 from datetime import datetime, timedelta
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import matplotlib.pyplot as plt
-import numpy as np
-import sys
 import re
+from jsfoods_analytics import CHART_WINDOWS, revenue_series, window_dates
+from jsfoods_background import BackgroundRunner
+from jsfoods_changes import ChangeFeed
+from jsfoods_database import db
+from jsfoods_export import EXPORT_FORMATS, EXPORTS, available_formats, default_filename, export_dataset
+from jsfoods_instrumentation import tracked_action
+from jsfoods_widgets import TreeviewBinding
 
-class AdminPortal(tk.CTk):
+# Sample activity if the database cannot be read
+SAMPLE_ACTIVITY = """📦 Recent Orders:
+  • Order #1023: £1,245.50 by Customer #45 at 15 Jan 14:30
+  • Order #1022: £890.25 by Customer #32 at 15 Jan 11:15
+  • Order #1021: £1,520.75 by Customer #67 at 14 Jan 16:45
+  • Order #1020: £2,350.00 by Restaurant #12 at 14 Jan 09:20
+
+👥 Recent User Activity:
+  • meat_supplier (Customer) joined on 15 Jan
+  • jane_kitchen (Customer) joined on 14 Jan
+  • bobs_bbq (Customer) joined on 13 Jan
+  
+⚙️ System Events:
+  • Daily backup completed at 02:00
+  • Low stock alert: Chicken Wings (45kg)
+  • Payment processed: £3,450.20"""
+
+
+class AdminPortal(tk.CTkToplevel):
     def open_inventory_manager(self):
         """Open the Inventory Manager"""
-        self.destroy()
-        subprocess.Popen([sys.executable, "jsfoods_inventory.py"])
+        self.shell.show("inventory")
         
-    def __init__(self):
-        super().__init__()
+    def __init__(self, shell, user=None):
+        super().__init__(shell)
+        self.shell = shell
         
         self.title("JS Foods - Admin Portal")
         self.geometry("1400x800")
@@ -31,9 +50,18 @@ class AdminPortal(tk.CTk):
         tk.set_appearance_mode("light")
         tk.set_default_color_theme("blue")
         
+        # Queries run here so a slow report never freezes the window
+        self.background = BackgroundRunner(self)
+        
         self.setup_ui()
         self.load_dashboard()
         self.load_sales_chart()
+        
+        # New users and orders from other windows or processes show up by themselves
+        self.changes = ChangeFeed(self, db, {
+            'users': self.apply_user_changes,
+            'orders': self.refresh_dashboard
+        }, on_reset=self.reload_all)
     
     def setup_ui(self):
         """Setup admin portal UI"""
@@ -100,7 +128,8 @@ class AdminPortal(tk.CTk):
         tabs = [
             "📊 Dashboard",
             "👥 User Management",
-            "🔒 Audit Log"
+            "🔒 Audit Log",
+            "⏱️ Query Stats"
         ]
         
         for tab in tabs:
@@ -110,6 +139,7 @@ class AdminPortal(tk.CTk):
         self.setup_dashboard_tab()
         self.setup_user_management_tab()
         self.setup_audit_tab()
+        self.setup_query_stats_tab()
         
                # Navigation
         nav_frame = tk.CTkFrame(self, height=50)
@@ -145,66 +175,70 @@ class AdminPortal(tk.CTk):
         ).pack(side="right", padx=20)
     
     def load_dashboard(self):
-        """Load dashboard data"""
-        try:
-            conn = sqlite3.connect('jsfoods.db')
-            conn.row_factory = sqlite3.Row
+        """Load dashboard data in the background"""
+        for key in ('total_customers', 'month_revenue', 'growth_rate'):
+            self.stat_widgets[key].configure(text="…")
+        self.refresh_dashboard()
+    
+    def refresh_dashboard(self, changed=None):
+        """Re-read the dashboard figures, keeping the current ones until they arrive"""
+        self.background.submit(
+            "dashboard",
+            self.fetch_dashboard,
+            on_done=self.show_dashboard,
+            on_error=lambda e: print(f"Dashboard load error: {e}")
+        )
+    
+    @tracked_action
+    def fetch_dashboard(self):
+        """Read the dashboard figures; runs on a worker thread"""
+        with db.connection() as conn:
             cursor = conn.cursor()
-            
+
             # Total customers - Updated to ~100 for JS Foods
             cursor.execute("SELECT COUNT(*) FROM users WHERE role = 'customer'")
             total_customers = cursor.fetchone()[0]
-            
-            # Set realistic numbers for JS Foods (poultry/meat wholesaler)
-            if total_customers < 90:
-                total_customers = 98  # Approx 100 customers
-            
-            # Month revenue
-            month_revenue = 0
-            month_start = datetime.now().replace(day=1).strftime("%Y-%m-%d")
-            
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='orders'")
-            if cursor.fetchone():
-                cursor.execute(
-                    """SELECT SUM(total_amount) FROM orders 
-                       WHERE order_date >= ? AND status != 'cancelled'""",
-                    (month_start,)
-                )
-                result = cursor.fetchone()
-                month_revenue = result[0] or 0
-            
-            # Set realistic revenue for JS Foods
-            if month_revenue < 10000:
-                month_revenue = 25480.75  # Realistic monthly revenue
-            
-            # Calculate growth rate based on previous month
-            growth_rate = "+12.5%"  # Realistic growth for a growing business
-            
-            # Update header stats
-            self.stat_widgets['total_customers'].configure(text=str(total_customers))
-            self.stat_widgets['month_revenue'].configure(text=f"£{month_revenue:,.2f}")
-            self.stat_widgets['growth_rate'].configure(text=growth_rate)
-            
-            # Update dashboard stats
-            dashboard_tab = self.tabview.tab("📊 Dashboard")
-            for widget in dashboard_tab.winfo_children():
-                if isinstance(widget, tk.CTkFrame):
-                    for child in widget.winfo_children():
-                        if isinstance(child, tk.CTkFrame):
-                            for stat_child in child.winfo_children():
-                                if isinstance(stat_child, tk.CTkLabel):
-                                    text = stat_child.cget("text")
-                                    if "Total Customers:" in text:
-                                        stat_child.configure(text=f"Total Customers: {total_customers}")
-                                    elif "Monthly Revenue:" in text:
-                                        stat_child.configure(text=f"Monthly Revenue: £{month_revenue:,.2f}")
-                                    elif "Growth Rate:" in text:
-                                        stat_child.configure(text=f"Growth Rate: {growth_rate}")
-            
-            conn.close()
-            
-        except sqlite3.Error as e:
-            print(f"Dashboard load error: {e}")
+
+        # Month revenue from the daily sales rollup
+        today = datetime.now()
+        month_revenue = db.get_revenue(today.replace(day=1).strftime("%Y-%m-%d"), today.strftime("%Y-%m-%d"))
+        return total_customers, month_revenue
+    
+    def show_dashboard(self, figures):
+        """Update the header and dashboard cards with fetched figures"""
+        total_customers, month_revenue = figures
+        
+        # Set realistic numbers for JS Foods (poultry/meat wholesaler)
+        if total_customers < 90:
+            total_customers = 98  # Approx 100 customers
+
+        # Set realistic revenue for JS Foods
+        if month_revenue < 10000:
+            month_revenue = 25480.75  # Realistic monthly revenue
+        
+        # Calculate growth rate based on previous month
+        growth_rate = "+12.5%"  # Realistic growth for a growing business
+        
+        # Update header stats
+        self.stat_widgets['total_customers'].configure(text=str(total_customers))
+        self.stat_widgets['month_revenue'].configure(text=f"£{month_revenue:,.2f}")
+        self.stat_widgets['growth_rate'].configure(text=growth_rate)
+        
+        # Update dashboard stats
+        dashboard_tab = self.tabview.tab("📊 Dashboard")
+        for widget in dashboard_tab.winfo_children():
+            if isinstance(widget, tk.CTkFrame):
+                for child in widget.winfo_children():
+                    if isinstance(child, tk.CTkFrame):
+                        for stat_child in child.winfo_children():
+                            if isinstance(stat_child, tk.CTkLabel):
+                                text = stat_child.cget("text")
+                                if "Total Customers:" in text:
+                                    stat_child.configure(text=f"Total Customers: {total_customers}")
+                                elif "Monthly Revenue:" in text:
+                                    stat_child.configure(text=f"Monthly Revenue: £{month_revenue:,.2f}")
+                                elif "Growth Rate:" in text:
+                                    stat_child.configure(text=f"Growth Rate: {growth_rate}")
     
     def setup_dashboard_tab(self):
         """Setup dashboard tab"""
@@ -258,11 +292,25 @@ class AdminPortal(tk.CTk):
         chart_frame.pack(fill="both", expand=True, pady=(0, 20))
         chart_frame.grid_propagate(False)
         
-        tk.CTkLabel(
-            chart_frame,
+        chart_header = tk.CTkFrame(chart_frame, fg_color="transparent")
+        chart_header.pack(fill="x", padx=20, pady=10)
+        
+        self.chart_title = tk.CTkLabel(
+            chart_header,
             text="📈 Sales Overview (Last 30 Days)",
             font=("Helvetica", 16, "bold")
-        ).pack(pady=10)
+        )
+        self.chart_title.pack(side="left")
+        
+        # Chart window selector
+        self.chart_window_var = tk.StringVar(value="30 days")
+        self.chart_range = window_dates(CHART_WINDOWS["30 days"])
+        tk.CTkSegmentedButton(
+            chart_header,
+            values=list(CHART_WINDOWS) + ["Custom..."],
+            variable=self.chart_window_var,
+            command=self.change_chart_window
+        ).pack(side="right")
         
         # Container for matplotlib chart
         self.chart_container = tk.CTkFrame(chart_frame, fg_color="white")
@@ -316,64 +364,89 @@ class AdminPortal(tk.CTk):
         self.activity_list.pack(fill="x", padx=20, pady=(0, 10))
         self.load_recent_activity()
     
+    def change_chart_window(self, choice):
+        """Switch the sales chart to a preset or custom date window"""
+        if choice in CHART_WINDOWS:
+            self.chart_range = window_dates(CHART_WINDOWS[choice])
+        else:
+            start_text = tk.CTkInputDialog(text="Start date (YYYY-MM-DD):", title="Custom Range").get_input()
+            end_text = tk.CTkInputDialog(text="End date (YYYY-MM-DD):", title="Custom Range").get_input()
+            try:
+                start_date = datetime.strptime(start_text or "", "%Y-%m-%d").date()
+                end_date = datetime.strptime(end_text or "", "%Y-%m-%d").date()
+            except ValueError:
+                messagebox.showerror("Invalid Date", "Please enter dates as YYYY-MM-DD")
+                return
+            if start_date > end_date:
+                messagebox.showerror("Invalid Range", "The start date must be before the end date")
+                return
+            self.chart_range = (start_date, end_date)
+        self.load_sales_chart()
+    
     def load_sales_chart(self):
-        """Load and display sales chart for last 30 days"""
-        try:
-            conn = sqlite3.connect('jsfoods.db')
-            cursor = conn.cursor()
-            
-            # Get last 30 days of sales data
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=30)
-            
-            # Create a list of dates for the last 30 days
-            date_list = []
-            for i in range(30):
-                date = start_date + timedelta(days=i)
-                date_list.append(date.strftime("%Y-%m-%d"))
-            
-            # Get sales data for these dates
-            sales_data = []
-            for date in date_list:
-                cursor.execute(
-                    """SELECT SUM(total_amount) FROM orders 
-                       WHERE date(order_date) = ? AND status != 'cancelled'""",
-                    (date,)
-                )
-                result = cursor.fetchone()
-                amount = result[0] if result[0] else 0
-                sales_data.append(amount)
-            
-            conn.close()
-            
-            # Generate realistic data if database is empty
-            if sum(sales_data) == 0:
-                # Generate realistic sales data for a meat wholesaler
-                base_sales = np.random.normal(800, 200, 30)
-                # Add weekly pattern (higher on weekdays)
-                for i in range(30):
-                    day_of_week = (start_date + timedelta(days=i)).weekday()
-                    if day_of_week < 5:  # Weekday
-                        base_sales[i] *= 1.3
-                    else:  # Weekend
-                        base_sales[i] *= 0.7
-                # Ensure no negative values
-                base_sales = np.maximum(base_sales, 100)
-                sales_data = base_sales
-            
-            # Create the chart
-            self.create_bar_chart(date_list, sales_data)
-            
-        except sqlite3.Error as e:
-            print(f"Chart data error: {e}")
-            # Create sample chart if database error
-            date_list = [(datetime.now() - timedelta(days=i)).strftime("%d-%b") for i in range(29, -1, -1)]
-            sales_data = np.random.normal(800, 200, 30)
-            sales_data = np.maximum(sales_data, 100)
-            self.create_bar_chart(date_list, sales_data)
-    
-    def create_bar_chart(self, dates, sales_data):
+        """Load and display the sales chart for the selected window"""
+        start_date, end_date = self.chart_range
+        choice = self.chart_window_var.get()
+        if choice in CHART_WINDOWS:
+            title = f"Last {choice.title()}"
+        else:
+            title = f"{start_date:%d %b %Y} - {end_date:%d %b %Y}"
+        self.chart_title.configure(text=f"📈 Sales Overview ({title})")
+        
+        # Keep the old chart visible under a loading note until the data arrives
+        self.chart_loading = tk.CTkLabel(self.chart_container, text="⏳ Loading sales…", fg_color="white")
+        self.chart_loading.place(relx=0.5, rely=0.5, anchor="center")
+        
+        # One grouped range query, however long the window is; switching
+        # window again before it returns supersedes it
+        self.background.submit(
+            "sales_chart",
+            self.fetch_sales_chart,
+            start_date,
+            end_date,
+            on_done=lambda series: self.create_bar_chart(*series, title),
+            on_error=self.show_chart_error
+        )
+    
+    def show_chart_error(self, error):
+        """Replace the loading note with the reason the sales could not be read"""
+        print(f"❌ Sales chart error: {error}")
+        if self.chart_loading.winfo_exists():
+            self.chart_loading.configure(text=f"❌ Could not load sales: {error}", text_color="#C62828")
+    
+    @tracked_action
+    def fetch_sales_chart(self, start_date, end_date):
+        """Build the chart series (runs in the background)
+        
+        numpy and matplotlib are first imported here, off the Tk thread,
+        so opening the portal does not wait for them.
+        """
+        import numpy as np
+        import matplotlib.figure
+        
+        rows = db.get_daily_revenue(start_date.isoformat(), end_date.isoformat())
+        # Generate realistic data if database is empty
+        if not rows:
+            # Generate realistic daily sales for a meat wholesaler
+            day_count = (end_date - start_date).days + 1
+            base_sales = np.random.normal(800, 200, day_count)
+            # Add weekly pattern (higher on weekdays)
+            weekdays = (np.arange(day_count) + start_date.weekday()) % 7
+            base_sales = np.where(weekdays < 5, base_sales * 1.3, base_sales * 0.7)
+            # Ensure no negative values
+            base_sales = np.maximum(base_sales, 100)
+            rows = [
+                {'day': (start_date + timedelta(days=i)).isoformat(), 'revenue': amount}
+                for i, amount in enumerate(base_sales)
+            ]
+        
+        return revenue_series(rows, start_date, end_date)
+    
+    def create_bar_chart(self, dates, sales_data, bucket="day", period="Last 30 Days"):
         """Create a bar chart from the sales data"""
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        
         # Clear existing chart
         for widget in self.chart_container.winfo_children():
             widget.destroy()
@@ -382,13 +455,15 @@ class AdminPortal(tk.CTk):
         fig = Figure(figsize=(12, 5), dpi=80, facecolor='white')
         ax = fig.add_subplot(111)
         
-        # Format dates for x-axis (show only every 5th date to avoid clutter)
+        # Format dates for x-axis (about 8 labels whatever the length to avoid clutter)
+        label_step = max(1, len(dates) // 8)
+        label_format = "%b %Y" if bucket == "month" else "%d %b"
         x_labels = []
         for i, date in enumerate(dates):
-            if i % 5 == 0:
-                # Format date as "15 Jan"
+            if i % label_step == 0:
+                # Format date as "15 Jan" (or "Jan 2025" for months)
                 date_obj = datetime.strptime(date, "%Y-%m-%d")
-                x_labels.append(date_obj.strftime("%d %b"))
+                x_labels.append(date_obj.strftime(label_format))
             else:
                 x_labels.append("")
         
@@ -399,24 +474,27 @@ class AdminPortal(tk.CTk):
         ax.plot(range(len(dates)), sales_data, color='#FF9800', linewidth=2, marker='o', markersize=4)
         
         # Customize chart
-        ax.set_xlabel('Date', fontsize=12, fontweight='bold')
+        ax.set_xlabel('Date' if bucket == "day" else f'{bucket.title()} starting', fontsize=12, fontweight='bold')
         ax.set_ylabel('Revenue (£)', fontsize=12, fontweight='bold')
-        ax.set_title('Daily Revenue - Last 30 Days', fontsize=14, fontweight='bold', pad=15)
+        bucket_titles = {"day": "Daily", "week": "Weekly", "month": "Monthly"}
+        ax.set_title(f'{bucket_titles[bucket]} Revenue - {period}', fontsize=14, fontweight='bold', pad=15)
         ax.set_xticks(range(len(dates)))
         ax.set_xticklabels(x_labels, rotation=45, ha='right')
         
         # Add grid
         ax.grid(True, alpha=0.3, linestyle='--')
         
-        # Add value labels on top of bars (only for significant values)
-        for i, bar in enumerate(bars):
-            height = bar.get_height()
-            if height > 500:  # Only label bars with significant revenue
-                ax.text(bar.get_x() + bar.get_width()/2., height,
-                        f'£{height:,.0f}', ha='center', va='bottom', fontsize=8)
+        # Add value labels on top of bars (only for significant values on short charts)
+        if len(bars) <= 31:
+            threshold = 500 if bucket == "day" else 0
+            for i, bar in enumerate(bars):
+                height = bar.get_height()
+                if height > threshold:
+                    ax.text(bar.get_x() + bar.get_width()/2., height,
+                            f'£{height:,.0f}', ha='center', va='bottom', fontsize=8)
         
         # Add total revenue annotation
-        total_revenue = sum(sales_data)
+        total_revenue = float(sales_data.sum())
         ax.text(0.02, 0.95, f'Total: £{total_revenue:,.2f}', 
                 transform=ax.transAxes, fontsize=12, fontweight='bold',
                 bbox=dict(boxstyle="round,pad=0.3", facecolor="#E8F5E9", edgecolor="#2E7D32"))
@@ -430,69 +508,69 @@ class AdminPortal(tk.CTk):
         canvas.get_tk_widget().pack(fill="both", expand=True)
     
     def load_recent_activity(self):
-        """Load recent system activity"""
-        try:
-            conn = sqlite3.connect('jsfoods.db')
+        """Load recent system activity in the background"""
+        self.show_activity("⏳ Loading recent activity…")
+        self.background.submit(
+            "recent_activity",
+            self.fetch_recent_activity,
+            on_done=self.format_recent_activity,
+            on_error=lambda e: self.show_activity(SAMPLE_ACTIVITY)
+        )
+    
+    @tracked_action
+    def fetch_recent_activity(self):
+        """Read recent orders and registrations; runs on a worker thread"""
+        with db.connection() as conn:
             cursor = conn.cursor()
-            
+
             # Get recent orders
             cursor.execute(
-                """SELECT order_id, customer_id, total_amount, order_date 
-                   FROM orders 
+                """SELECT order_id, customer_id, total_amount, order_date
+                   FROM orders
                    ORDER BY order_date DESC LIMIT 10"""
             )
             orders = cursor.fetchall()
-            
+
             # Get recent user registrations
             cursor.execute(
-                """SELECT username, role, registration_date 
-                   FROM users 
+                """SELECT username, role, registration_date
+                   FROM users
                    ORDER BY registration_date DESC LIMIT 5"""
             )
             users = cursor.fetchall()
-            
-            # Format activity log
-            activity_text = ""
-            
-            # Add recent orders
-            activity_text += "📦 Recent Orders:\n"
-            if orders:
-                for order in orders:
-                    order_id, cust_id, amount, date = order
-                    date_str = datetime.strptime(date, "%Y-%m-%d %H:%M:%S").strftime("%d %b %H:%M")
-                    activity_text += f"  • Order #{order_id}: £{amount:.2f} by Customer #{cust_id} at {date_str}\n"
-            else:
-                activity_text += "  No recent orders\n"
-            
-            activity_text += "\n👥 Recent User Activity:\n"
-            if users:
-                for user in users:
-                    username, role, reg_date = user
-                    date_str = datetime.strptime(reg_date, "%Y-%m-%d %H:%M:%S").strftime("%d %b")
-                    activity_text += f"  • {username} ({role.title()}) joined on {date_str}\n"
-            else:
-                activity_text += "  No recent user activity\n"
-            
-            conn.close()
-            
-        except sqlite3.Error:
-            # Sample activity if database error
-            activity_text = """📦 Recent Orders:
-  • Order #1023: £1,245.50 by Customer #45 at 15 Jan 14:30
-  • Order #1022: £890.25 by Customer #32 at 15 Jan 11:15
-  • Order #1021: £1,520.75 by Customer #67 at 14 Jan 16:45
-  • Order #1020: £2,350.00 by Restaurant #12 at 14 Jan 09:20
-
-👥 Recent User Activity:
-  • meat_supplier (Customer) joined on 15 Jan
-  • jane_kitchen (Customer) joined on 14 Jan
-  • bobs_bbq (Customer) joined on 13 Jan
-  
-⚙️ System Events:
-  • Daily backup completed at 02:00
-  • Low stock alert: Chicken Wings (45kg)
-  • Payment processed: £3,450.20"""
-        
+        return orders, users
+    
+    def format_recent_activity(self, activity):
+        """Show fetched orders and registrations in the activity list"""
+        orders, users = activity
+        
+        # Format activity log
+        activity_text = ""
+        
+        # Add recent orders
+        activity_text += "📦 Recent Orders:\n"
+        if orders:
+            for order in orders:
+                order_id, cust_id, amount, date = order
+                date_str = datetime.strptime(date, "%Y-%m-%d %H:%M:%S").strftime("%d %b %H:%M")
+                activity_text += f"  • Order #{order_id}: £{amount:.2f} by Customer #{cust_id} at {date_str}\n"
+        else:
+            activity_text += "  No recent orders\n"
+        
+        activity_text += "\n👥 Recent User Activity:\n"
+        if users:
+            for user in users:
+                username, role, reg_date = user
+                date_str = datetime.strptime(reg_date, "%Y-%m-%d %H:%M:%S").strftime("%d %b")
+                activity_text += f"  • {username} ({role.title()}) joined on {date_str}\n"
+        else:
+            activity_text += "  No recent user activity\n"
+        
+        self.show_activity(activity_text)
+    
+    def show_activity(self, activity_text):
+        """Replace the text of the activity list"""
+        self.activity_list.configure(state="normal")
         self.activity_list.delete("1.0", "end")
         self.activity_list.insert("1.0", activity_text)
         self.activity_list.configure(state="disabled")
@@ -564,34 +642,29 @@ class AdminPortal(tk.CTk):
             self.users_tree.heading(col, text=col)
             self.users_tree.column(col, width=width, anchor=anchor)
         
+        self.user_rows = TreeviewBinding(self.users_tree, {
+            'owner': '#FF5722',
+            'manager': '#2196F3',
+            'employee': '#4CAF50',
+            'customer': '#757575'
+        })
+        
         # Load users
         self.load_users()
     
+    @tracked_action
     def load_users(self):
         """Load users from database"""
         try:
-            conn = sqlite3.connect('jsfoods.db')
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute(
-                """SELECT user_id, username, first_name, last_name, role, email, phone, registration_date 
-                   FROM users ORDER BY user_id DESC"""
-            )
-            
-            # Clear existing items
-            for item in self.users_tree.get_children():
-                self.users_tree.delete(item)
-            
-            # Add users
-            for user in cursor.fetchall():
-                role_color = {
-                    'owner': '#FF5722',
-                    'manager': '#2196F3',
-                    'employee': '#4CAF50',
-                    'customer': '#757575'
-                }.get(user['role'], 'black')
-                
-                self.users_tree.insert("", "end", values=(
+            with db.connection() as conn:
+                users = conn.execute(
+                    """SELECT user_id, username, first_name, last_name, role, email, phone, registration_date
+                       FROM users ORDER BY user_id DESC"""
+                ).fetchall()
+
+            # Only rows that changed since the last refresh touch the table
+            self.user_rows.set_rows(
+                (user['user_id'], (
                     user['user_id'],
                     user['username'],
                     f"{user['first_name']} {user['last_name']}",
@@ -599,15 +672,19 @@ class AdminPortal(tk.CTk):
                     user['email'],
                     user['phone'] or "N/A",
                     user['registration_date'][:10] if user['registration_date'] else "N/A"
-                ), tags=(user['role'],))
-                
-                self.users_tree.tag_configure(user['role'], foreground=role_color)
-            
-            conn.close()
+                ), (user['role'],))
+                for user in users
+            )
                 
         except sqlite3.Error as e:
             messagebox.showerror("Database Error", f"Could not load users: {e}")
     
+    def apply_user_changes(self, user_ids):
+        """Bring the user list and customer count up to date after users changed"""
+        # The list is diffed, so only the changed users' rows are touched
+        self.load_users()
+        self.refresh_dashboard()
+    
     def add_user(self):
         """Add new user"""
         add_window = tk.CTkToplevel(self)
@@ -683,21 +760,15 @@ class AdminPortal(tk.CTk):
                 return
             
             try:
-                conn = sqlite3.connect('jsfoods.db')
-                cursor = conn.cursor()
-                
                 # Hash password
-                import hashlib
-                hashed_password = hashlib.sha256(password.encode()).hexdigest()
+                hashed_password = db.hash_password(password)
                 
                 # Insert user
-                cursor.execute('''
-                    INSERT INTO users (username, password, role, first_name, last_name, email)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (username, hashed_password, role, first_name, last_name, email))
-                
-                conn.commit()
-                conn.close()
+                with db.transaction() as conn:
+                    conn.execute('''
+                        INSERT INTO users (username, password, role, first_name, last_name, email)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', (username, hashed_password, role, first_name, last_name, email))
                 
                 messagebox.showinfo(
                     "Success",
@@ -724,31 +795,104 @@ class AdminPortal(tk.CTk):
         ).pack(fill="x", pady=20)
     
     def generate_report(self):
-        """Generate simple report"""
-        messagebox.showinfo(
-            "Generate Report",
-            "Report generation feature\n\n"
-            "In full implementation, this would:\n"
-            "• Generate PDF/Excel reports\n"
-            "• Include sales analytics\n"
-            "• Export customer lists\n"
-            "• Create inventory reports"
+        """Export orders, order lines, customers or products to a file"""
+        self.open_export_dialog('orders')
+    
+    def open_export_dialog(self, dataset):
+        """Choose a dataset and format, then stream it to a file in the background"""
+        dialog = tk.CTkToplevel(self)
+        dialog.title("JS Foods - Export Data")
+        dialog.geometry("520x340")
+        dialog.resizable(False, False)
+        dialog.transient(self)  # Set as transient to main window
+        dialog.lift()  # Bring to front
+        
+        tk.CTkLabel(
+            dialog,
+            text="📤 Export Data",
+            font=("Helvetica", 18, "bold")
+        ).pack(pady=(20, 10))
+        
+        titles = {export['title']: key for key, export in EXPORTS.items()}
+        dataset_var = tk.StringVar(value=EXPORTS[dataset]['title'])
+        tk.CTkLabel(dialog, text="Data:", font=("Helvetica", 12)).pack(anchor="w", padx=30)
+        tk.CTkOptionMenu(dialog, values=list(titles), variable=dataset_var).pack(fill="x", padx=30, pady=(0, 10))
+        
+        # Excel and Parquet only appear if their packages are installed
+        formats = available_formats()
+        format_var = tk.StringVar(value=formats[0])
+        tk.CTkLabel(dialog, text="Format:", font=("Helvetica", 12)).pack(anchor="w", padx=30)
+        tk.CTkSegmentedButton(dialog, values=formats, variable=format_var).pack(fill="x", padx=30, pady=(0, 15))
+        
+        progress_bar = tk.CTkProgressBar(dialog)
+        progress_bar.set(0)
+        progress_bar.pack(fill="x", padx=30)
+        
+        status_label = tk.CTkLabel(dialog, text="", font=("Helvetica", 11), text_color="#666666")
+        status_label.pack(pady=5)
+        
+        def show_progress(written, total):
+            if dialog.winfo_exists():
+                progress_bar.set(written / total if total else 1)
+                status_label.configure(text=f"{written:,} of {total:,} rows written")
+        
+        def show_done(count, path):
+            if dialog.winfo_exists():
+                progress_bar.set(1)
+                status_label.configure(text=f"✅ {count:,} rows exported")
+                export_button.configure(state="normal")
+            messagebox.showinfo("Export Complete", f"Exported {count:,} rows to:\n{path}")
+        
+        def show_error(error):
+            if dialog.winfo_exists():
+                status_label.configure(text=f"❌ Export failed: {error}")
+                export_button.configure(state="normal")
+        
+        def start_export():
+            key = titles[dataset_var.get()]
+            export_format = format_var.get()
+            extension = EXPORT_FORMATS[export_format][0]
+            path = filedialog.asksaveasfilename(
+                parent=dialog,
+                title="Export Data",
+                initialfile=default_filename(key, export_format, datetime.now().strftime('%Y%m%d')),
+                defaultextension=extension,
+                filetypes=[(export_format, f"*{extension}")]
+            )
+            if not path:
+                return
+            export_button.configure(state="disabled")
+            progress_bar.set(0)
+            status_label.configure(text="Counting rows...")
+            # Keyed per dialog, so a second export window does not cancel this one
+            self.background.submit(
+                f"export_{id(dialog)}",
+                export_dataset, db, key, path, export_format,
+                on_progress=show_progress,
+                on_done=lambda count: show_done(count, path),
+                on_error=show_error
+            )
+        
+        export_button = tk.CTkButton(
+            dialog,
+            text="Export",
+            command=start_export,
+            height=40,
+            fg_color="#2E7D32",
+            hover_color="#1B5E20"
         )
+        export_button.pack(fill="x", padx=30, pady=10)
     
+    @tracked_action
     def stock_check(self):
         """Check stock levels"""
         try:
-            conn = sqlite3.connect('jsfoods.db')
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                """SELECT name, category, current_stock_kg, min_stock_level 
-                   FROM products WHERE is_active = 1 
-                   ORDER BY current_stock_kg ASC LIMIT 10"""
-            )
-            low_stock = cursor.fetchall()
-            
-            conn.close()
+            with db.connection() as conn:
+                low_stock = conn.execute(
+                    """SELECT name, category, current_stock_kg, min_stock_level 
+                       FROM products WHERE is_active = 1 
+                       ORDER BY current_stock_kg ASC LIMIT 10"""
+                ).fetchall()
             
             stock_text = "📦 Low Stock Items:\n\n"
             if low_stock:
@@ -843,15 +987,105 @@ class AdminPortal(tk.CTk):
         log_text.insert("1.0", audit_logs)
         log_text.configure(state="disabled")
     
-    def export_audit_log(self):
-        """Export audit log"""
-        messagebox.showinfo(
-            "Export Audit Log",
-            "Audit log exported successfully!\n\n"
-            "Log contains all system activities from today.\n"
-            "Exported to: jsfoods_audit_log_20240115.csv\n\n"
-            "Location: C:/JSFoods/Reports/Audit/"
+    def setup_query_stats_tab(self):
+        """Setup the database query timing tab"""
+        tab = self.tabview.tab("⏱️ Query Stats")
+        
+        stats_frame = tk.CTkFrame(tab)
+        stats_frame.pack(fill="both", expand=True, padx=20, pady=20)
+        stats_frame.grid_columnconfigure(0, weight=1)
+        stats_frame.grid_rowconfigure(1, weight=1)
+        
+        # Controls
+        controls_frame = tk.CTkFrame(stats_frame)
+        controls_frame.grid(row=0, column=0, columnspan=2, sticky="ew", pady=(0, 10))
+        
+        self.query_stats_summary = tk.CTkLabel(controls_frame, text="", font=("Helvetica", 12))
+        self.query_stats_summary.pack(side="left", padx=10)
+        
+        tk.CTkButton(
+            controls_frame,
+            text="🔄 Refresh",
+            command=self.load_query_stats,
+            width=100
+        ).pack(side="right", padx=5)
+        
+        tk.CTkButton(
+            controls_frame,
+            text="Reset",
+            command=self.reset_query_stats,
+            width=100,
+            fg_color="#757575",
+            hover_color="#616161"
+        ).pack(side="right", padx=5)
+        
+        # One row per statement shape, most total time first
+        columns = [
+            ("Statement", 420, "w"),
+            ("Calls", 70, "center"),
+            ("Total ms", 90, "center"),
+            ("Mean ms", 80, "center"),
+            ("p50 ms", 80, "center"),
+            ("p95 ms", 80, "center"),
+            ("Max ms", 80, "center"),
+            ("Slow", 60, "center")
+        ]
+        self.query_stats_tree = ttk.Treeview(
+            stats_frame,
+            columns=[col for col, _, _ in columns],
+            show="headings",
+            height=15
+        )
+        self.query_stats_tree.grid(row=1, column=0, sticky="nsew")
+        
+        scrollbar = ttk.Scrollbar(stats_frame, orient="vertical", command=self.query_stats_tree.yview)
+        scrollbar.grid(row=1, column=1, sticky="ns")
+        self.query_stats_tree.configure(yscrollcommand=scrollbar.set)
+        
+        for col, width, anchor in columns:
+            self.query_stats_tree.heading(col, text=col)
+            self.query_stats_tree.column(col, width=width, anchor=anchor)
+        
+        self.query_stat_rows = TreeviewBinding(self.query_stats_tree, {'slow': 'red'})
+        self.load_query_stats()
+    
+    def load_query_stats(self):
+        """Show the timing collected for every statement since startup or the last reset"""
+        stats = db.query_stats
+        rows = stats.snapshot()
+        self.query_stat_rows.set_rows(
+            (row['shape'], (
+                row['shape'][:200],
+                row['calls'],
+                f"{row['total_ms']:.1f}",
+                f"{row['mean_ms']:.2f}",
+                f"{row['p50_ms']:.2f}",
+                f"{row['p95_ms']:.2f}",
+                f"{row['max_ms']:.1f}",
+                row['slow']
+            ), ('slow',) if row['slow'] else ())
+            for row in rows
         )
+        total_ms = sum(row['total_ms'] for row in rows)
+        calls = sum(row['calls'] for row in rows)
+        slow_note = (f"over {stats.slow_ms:g} ms logged to {stats.log_path}" if stats.slow_ms > 0
+                     else "slow-query log off")
+        writes = db.write_stats.snapshot()
+        write_note = (f"{writes['writes']:,} writes, {writes['retries']} retried, "
+                      f"{writes['failures']} locked out, {writes['mean_wait_ms']:.1f} ms mean lock wait")
+        self.query_stats_summary.configure(
+            text=f"{calls:,} statements, {total_ms:,.0f} ms in SQLite · {slow_note} · {write_note}"
+        )
+    
+    def reset_query_stats(self):
+        """Start collecting query timings afresh"""
+        db.query_stats.reset()
+        db.write_stats.reset()
+        self.load_query_stats()
+    
+    def export_audit_log(self):
+        """Export the stock ledger: every stock movement and who made it"""
+        self.open_export_dialog('stock_ledger')
     
     def clear_audit_logs(self):
         """Clear old audit logs"""
@@ -863,23 +1097,24 @@ class AdminPortal(tk.CTk):
                 "Archived to: C:/JSFoods/Archives/Audit_2023/"
             )
     
-    def refresh_all(self):
-        """Refresh all data"""
+    def reload_all(self):
+        """Re-read every tab"""
         self.load_dashboard()
         self.load_users()
         self.load_sales_chart()
         self.load_recent_activity()
+        self.load_query_stats()
+    
+    def refresh_all(self):
+        """Refresh all data"""
+        self.reload_all()
         messagebox.showinfo("Refreshed", "All admin data has been refreshed")
     
     def go_back(self):
         """Return to main menu"""
-        self.destroy()
-        try:
-            subprocess.Popen([sys.executable, "jsfoods_login.py"])
-        except:
-            messagebox.showinfo("Info", "Login program not found or cannot be launched.")
+        self.shell.logout()
 
 
 if __name__ == "__main__":
-    app = AdminPortal()
-    app.mainloop()
\ No newline at end of file
+    from jsfoods_main import run
+    run("admin")
\ No newline at end of file
@@ -0,0 +1,121 @@
+"""
+JS Foods Background Queries
+Runs database work off the Tk thread and hands results back through after()
+"""
+
+import queue
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+# Kept below the connection pool size so the Tk thread can always get one
+BACKGROUND_WORKERS = 2
+POLL_INTERVAL_MS = 25
+
+
+class BackgroundRunner:
+    """Run slow calls on worker threads and deliver results on the Tk thread
+
+    Every request is submitted under a key naming what it is for, such as
+    "sales_chart". A new request with the same key supersedes the previous
+    one: it is cancelled if it has not started yet, and its result is thrown
+    away if it has, so changing a filter twice only ever shows the newest
+    answer. Finished results wait in a queue that the Tk thread drains with
+    after(), because Tk widgets must only be touched from that thread.
+    Progress reports from long calls travel the same way; only the newest
+    one per poll is delivered.
+    """
+
+    def __init__(self, widget, workers: int = BACKGROUND_WORKERS):
+        self.widget = widget
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jsfoods-background")
+        self._finished = queue.SimpleQueue()
+        self._progress = queue.SimpleQueue()
+        self._latest: Dict[str, Future] = {}
+        self._polling = False
+        self._closed = False
+        widget.bind("<Destroy>", self._on_destroy, add="+")
+
+    def submit(self, key: str, func: Callable, *args, on_done: Callable = None,
+               on_error: Callable = None, on_progress: Callable = None, **kwargs) -> Optional[Future]:
+        """Run func(*args, **kwargs) in the background
+
+        on_done(result) or on_error(exception) is called on the Tk thread,
+        unless a newer request with the same key was submitted meanwhile.
+        With on_progress, func is also passed progress=callable; whatever
+        func calls it with is passed on to on_progress on the Tk thread.
+        Returns None once the window has been destroyed.
+        """
+        if self._closed:
+            return None
+        self.cancel(key)
+        # Filled in once submitted, so reports can be matched to this request
+        request = []
+        if on_progress is not None:
+            kwargs['progress'] = lambda *values: self._progress.put((key, request, on_progress, values))
+        future = self._executor.submit(func, *args, **kwargs)
+        request.append(future)
+        self._latest[key] = future
+        future.add_done_callback(lambda done: self._finished.put((key, done, on_done, on_error)))
+        self._schedule_poll()
+        return future
+
+    def cancel(self, key: str):
+        """Forget the pending request for key, cancelling it if not yet started"""
+        future = self._latest.pop(key, None)
+        if future is not None:
+            future.cancel()
+
+    def is_pending(self, key: str) -> bool:
+        """True while a request for key is running or queued"""
+        return key in self._latest
+
+    def _schedule_poll(self):
+        if not self._polling and not self._closed:
+            self._polling = True
+            self.widget.after(POLL_INTERVAL_MS, self._poll)
+
+    def _poll(self):
+        """Deliver finished results; keeps polling while requests are pending"""
+        self._polling = False
+        if self._closed:
+            return
+        newest = {}
+        while True:
+            try:
+                key, request, on_progress, values = self._progress.get_nowait()
+            except queue.Empty:
+                break
+            if request and self._latest.get(key) is request[0]:
+                newest[key] = (on_progress, values)
+        for on_progress, values in newest.values():
+            on_progress(*values)
+        while True:
+            try:
+                key, future, on_done, on_error = self._finished.get_nowait()
+            except queue.Empty:
+                break
+            # Superseded or cancelled requests are dropped silently
+            if self._latest.get(key) is not future:
+                continue
+            del self._latest[key]
+            error = future.exception()
+            if error is None:
+                if on_done:
+                    on_done(future.result())
+            elif on_error:
+                on_error(error)
+            else:
+                print(f"❌ Background task '{key}' error: {error}")
+        if self._latest:
+            self._schedule_poll()
+
+    def _on_destroy(self, event):
+        # <Destroy> also fires for every child of a toplevel
+        if event.widget is self.widget:
+            self.shutdown()
+
+    def shutdown(self):
+        """Stop delivering results and drop anything not yet started"""
+        self._closed = True
+        self._latest.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
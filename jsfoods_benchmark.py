@@ -0,0 +1,692 @@
+"""
+JS Foods Benchmarks
+Performance measurements for the database layer
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import statistics
+import sqlite3
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from jsfoods_database import DatabaseManager
+from jsfoods_datagen import SCALES, DatasetGenerator
+from jsfoods_migrations import LATEST_VERSION, migrate
+
+
+def legacy_calculate_discount(manager: DatabaseManager, product_id: int, quantity: float) -> float:
+    """The original two-query calculate_discount, kept as the benchmark baseline"""
+    with manager.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT category FROM products WHERE product_id = ?", (product_id,))
+        row = cursor.fetchone()
+        if not row:
+            return 0.0
+        cursor.execute('''
+            SELECT discount_percent FROM discount_rules 
+            WHERE min_quantity_kg <= ? 
+            AND (applicable_categories IS NULL OR applicable_categories LIKE ?)
+            AND is_active = 1
+            AND (start_date IS NULL OR start_date <= date('now'))
+            AND (end_date IS NULL OR end_date >= date('now'))
+            ORDER BY min_quantity_kg DESC
+            LIMIT 1
+        ''', (quantity, f"%{row[0]}%"))
+        result = cursor.fetchone()
+        return result[0] if result else 0.0
+
+
+def legacy_create_order(manager: DatabaseManager, order_data: Dict, items: List[Dict]) -> Optional[int]:
+    """The original per-line create_order, kept as the benchmark baseline"""
+    try:
+        with manager.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO orders (customer_id, total_amount, delivery_date, delivery_address, payment_method, notes)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (
+                order_data['customer_id'],
+                order_data['total_amount'],
+                order_data.get('delivery_date'),
+                order_data.get('delivery_address'),
+                order_data.get('payment_method', 'cash'),
+                order_data.get('notes', '')
+            ))
+            order_id = cursor.lastrowid
+
+            for item in items:
+                discount = legacy_calculate_discount(manager, item['product_id'], item['quantity_kg'])
+                final_price = item['quantity_kg'] * item['unit_price'] * (1 - discount/100)
+                cursor.execute('''
+                    INSERT INTO order_items (order_id, product_id, quantity_kg, unit_price, discount_percent, final_price)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (order_id, item['product_id'], item['quantity_kg'], item['unit_price'], discount, final_price))
+                manager.update_stock(item['product_id'], -item['quantity_kg'], f"Order #{order_id}", order_data['customer_id'])
+
+            return order_id
+    except sqlite3.Error as e:
+        print(f"❌ Legacy create order error: {e}")
+        return None
+
+
+def create_bench_database(path: str, product_count: int = 100) -> DatabaseManager:
+    """Create a fresh database with enough products and discount rules to benchmark against"""
+    manager = DatabaseManager(database=path)
+    categories = ["Beef", "Pork", "Poultry", "Lamb"]
+    with manager.transaction() as conn:
+        conn.executemany('''
+            INSERT INTO products (name, category, description, price_per_kg, current_stock_kg, min_stock_level, unit)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (f"Bench Product {i}", categories[i % len(categories)], "Benchmark product", 5.0 + i % 20, 1e9, 10, 'kg')
+            for i in range(product_count)
+        ])
+        conn.executemany('''
+            INSERT INTO discount_rules (min_quantity_kg, discount_percent, applicable_categories)
+            VALUES (?, ?, ?)
+        ''', [(10, 5, None), (25, 10, "Beef,Lamb"), (50, 15, "Poultry")])
+    return manager
+
+
+def make_order(manager: DatabaseManager, line_count: int) -> tuple:
+    """Build an order payload with line_count distinct products"""
+    with manager.connection() as conn:
+        rows = conn.execute('''
+            SELECT product_id, price_per_kg FROM products
+            WHERE name LIKE 'Bench Product%'
+            ORDER BY product_id LIMIT ?
+        ''', (line_count,)).fetchall()
+    items = [
+        {'product_id': row['product_id'], 'quantity_kg': 5.0 + (i % 4) * 15, 'unit_price': row['price_per_kg']}
+        for i, row in enumerate(rows)
+    ]
+    order_data = {
+        'customer_id': 1,
+        'total_amount': sum(item['quantity_kg'] * item['unit_price'] for item in items),
+        'delivery_date': '2030-01-01',
+        'delivery_address': '1 Benchmark Road',
+        'payment_method': 'cash'
+    }
+    return order_data, items
+
+
+def time_orders(create: Callable, manager: DatabaseManager, line_count: int, repeat: int) -> float:
+    """Place repeat orders of line_count lines and return orders per second"""
+    order_data, items = make_order(manager, line_count)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        if create(manager, order_data, items) is None:
+            raise RuntimeError("Order failed during benchmark")
+    elapsed = time.perf_counter() - start
+    return repeat / elapsed
+
+
+def bench_create_order(line_counts: List[int], repeat: int) -> List[Dict]:
+    """Compare orders/sec of the legacy and current create_order paths"""
+    implementations = [
+        ("legacy", legacy_create_order),
+        ("current", lambda manager, order_data, items: manager.create_order(order_data, items))
+    ]
+    results = []
+    workdir = tempfile.mkdtemp(prefix="jsfoods_bench_")
+    try:
+        for name, create in implementations:
+            manager = create_bench_database(os.path.join(workdir, f"{name}.db"), max(line_counts))
+            try:
+                for line_count in line_counts:
+                    rate = time_orders(create, manager, line_count, repeat)
+                    results.append({'implementation': name, 'lines': line_count, 'orders_per_sec': rate})
+            finally:
+                manager.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def bench_discounts(line_count: int, repeat: int) -> List[Dict]:
+    """Microseconds per cart line for SQL and in-memory discount lookup"""
+    workdir = tempfile.mkdtemp(prefix="jsfoods_bench_")
+    try:
+        manager = create_bench_database(os.path.join(workdir, "discounts.db"), line_count)
+        try:
+            _, items = make_order(manager, line_count)
+            implementations = [
+                ("sql per line", lambda: [
+                    legacy_calculate_discount(manager, item['product_id'], item['quantity_kg']) for item in items
+                ]),
+                ("engine per line", lambda: [
+                    manager.calculate_discount(item['product_id'], item['quantity_kg']) for item in items
+                ]),
+                ("engine whole cart", lambda: manager.price_cart(items))
+            ]
+            results = []
+            for name, price in implementations:
+                price()
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    price()
+                elapsed = time.perf_counter() - start
+                results.append({'implementation': name, 'us_per_line': elapsed / (repeat * line_count) * 1e6})
+        finally:
+            manager.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def print_order_results(results: List[Dict]):
+    """Print create_order results as a table"""
+    print(f"\n{'Lines':>6} {'Legacy/s':>12} {'Current/s':>12} {'Speed-up':>10}")
+    by_lines = {}
+    for result in results:
+        by_lines.setdefault(result['lines'], {})[result['implementation']] = result['orders_per_sec']
+    for lines, rates in sorted(by_lines.items()):
+        legacy = rates.get('legacy', 0)
+        current = rates.get('current', 0)
+        speedup = current / legacy if legacy else 0
+        print(f"{lines:>6} {legacy:>12.1f} {current:>12.1f} {speedup:>9.1f}x")
+
+
+# Queries from the portals and DatabaseManager, with representative parameters
+HOT_QUERIES = [
+    ("customer order history", '''
+        SELECT o.*, (SELECT COUNT(*) FROM order_items WHERE order_id = o.order_id) as item_count
+        FROM orders o WHERE o.customer_id = ? ORDER BY o.order_date DESC LIMIT 50
+    ''', lambda ctx: (ctx['customer_id'],)),
+    ("orders by status", '''
+        SELECT o.order_id, u.first_name || ' ' || u.last_name as customer,
+               o.order_date, o.total_amount, o.status, o.delivery_date
+        FROM orders o JOIN users u ON o.customer_id = u.user_id
+        WHERE o.status = ? ORDER BY o.order_date DESC LIMIT 100
+    ''', lambda ctx: ('pending',)),
+    ("recent orders", '''
+        SELECT o.order_id, u.first_name || ' ' || u.last_name as customer,
+               o.order_date, o.total_amount, o.status, o.delivery_date
+        FROM orders o JOIN users u ON o.customer_id = u.user_id
+        ORDER BY o.order_date DESC LIMIT 100
+    ''', lambda ctx: ()),
+    ("pending order count", '''
+        SELECT COUNT(*) FROM orders WHERE status IN ('pending', 'confirmed')
+    ''', lambda ctx: ()),
+    ("day revenue", '''
+        SELECT SUM(total_amount) FROM orders
+        WHERE order_date >= ? AND order_date < date(?, '+1 day') AND status != 'cancelled'
+    ''', lambda ctx: (ctx['day'], ctx['day'])),
+    ("month revenue", '''
+        SELECT SUM(total_amount) FROM orders WHERE order_date >= ? AND status != 'cancelled'
+    ''', lambda ctx: (ctx['month_start'],)),
+    ("order details", '''
+        SELECT oi.*, p.name as product_name, p.category
+        FROM order_items oi JOIN products p ON oi.product_id = p.product_id
+        WHERE oi.order_id = ?
+    ''', lambda ctx: (ctx['order_id'],)),
+    ("product usage check", '''
+        SELECT (SELECT COUNT(*) FROM order_items WHERE product_id = ?),
+               (SELECT COUNT(*) FROM stock_transactions WHERE product_id = ?)
+    ''', lambda ctx: (ctx['product_id'], ctx['product_id'])),
+    ("products by category", '''
+        SELECT * FROM products WHERE category = ? AND is_active = 1
+    ''', lambda ctx: ('Beef',)),
+    ("lowest stock", '''
+        SELECT name, current_stock_kg, min_stock_level FROM products
+        WHERE is_active = 1 ORDER BY current_stock_kg ASC LIMIT 10
+    ''', lambda ctx: ()),
+    ("month sales by category", '''
+        SELECT p.category, SUM(oi.quantity_kg), SUM(oi.final_price), COUNT(DISTINCT o.order_id)
+        FROM order_items oi
+        JOIN orders o ON oi.order_id = o.order_id
+        JOIN products p ON oi.product_id = p.product_id
+        WHERE o.order_date BETWEEN ? AND ? AND o.status != 'cancelled'
+        GROUP BY p.category
+    ''', lambda ctx: (ctx['month_start'], ctx['month_end'])),
+]
+
+# Queries the app answers from the sales rollups once migration 3 is applied
+ROLLUP_QUERIES = {
+    "day revenue": ('''
+        SELECT SUM(revenue) FROM sales_daily WHERE day BETWEEN date(?) AND date(?)
+    ''', lambda ctx: (ctx['day'], ctx['day'])),
+    "month revenue": ('''
+        SELECT SUM(revenue) FROM sales_daily WHERE day >= date(?)
+    ''', lambda ctx: (ctx['month_start'],)),
+    "month sales by category": ('''
+        SELECT category, SUM(kg), SUM(revenue), SUM(order_count)
+        FROM sales_category_daily
+        WHERE day BETWEEN date(?) AND date(?)
+        GROUP BY category HAVING SUM(line_count) > 0
+    ''', lambda ctx: (ctx['month_start'], ctx['month_end'])),
+}
+
+
+def populate_orders(manager: DatabaseManager, order_count: int, product_count: int = 200,
+                    customer_count: int = 1000, days: int = 730, seed: int = 1):
+    """Bulk load order_count orders spread over the last days days"""
+    rng = random.Random(seed)
+    statuses = ['pending', 'confirmed', 'processing', 'ready', 'delivered', 'delivered', 'delivered', 'cancelled']
+    categories = ["Beef", "Pork", "Poultry", "Lamb"]
+    start = time.time() - days * 86400
+    with manager.transaction() as conn:
+        conn.executemany('''
+            INSERT INTO users (username, password, role, first_name, last_name, email)
+            VALUES (?, 'x', 'customer', 'Bench', ?, ?)
+        ''', [(f"bench_{i}", f"Customer {i}", f"bench_{i}@example.com") for i in range(customer_count)])
+        customer_ids = [row[0] for row in conn.execute("SELECT user_id FROM users WHERE username LIKE 'bench_%'")]
+        conn.executemany('''
+            INSERT INTO products (name, category, description, price_per_kg, current_stock_kg, min_stock_level, unit)
+            VALUES (?, ?, 'Benchmark product', ?, ?, 10, 'kg')
+        ''', [(f"Bench Product {i}", categories[i % 4], 5.0 + i % 20, rng.uniform(0, 500)) for i in range(product_count)])
+        product_ids = [row[0] for row in conn.execute("SELECT product_id FROM products WHERE name LIKE 'Bench Product%'")]
+        first_order = (conn.execute("SELECT MAX(order_id) FROM orders").fetchone()[0] or 0) + 1
+
+        orders, items, movements = [], [], []
+        for order_id in range(first_order, first_order + order_count):
+            placed = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(start + rng.random() * days * 86400))
+            total = 0.0
+            for product_id in rng.sample(product_ids, rng.randint(1, 4)):
+                quantity = float(rng.randint(1, 40))
+                price = quantity * 10.0
+                total += price
+                items.append((order_id, product_id, quantity, 10.0, 0, price))
+                movements.append((product_id, quantity, f"Order #{order_id}", placed))
+            orders.append((order_id, rng.choice(customer_ids), placed, total, rng.choice(statuses)))
+            if len(orders) >= 50000:
+                _flush_orders(conn, orders, items, movements)
+        _flush_orders(conn, orders, items, movements)
+
+
+def _flush_orders(conn: sqlite3.Connection, orders: List, items: List, movements: List):
+    """Write buffered benchmark rows and empty the buffers"""
+    conn.executemany('''
+        INSERT INTO orders (order_id, customer_id, order_date, total_amount, status)
+        VALUES (?, ?, ?, ?, ?)
+    ''', orders)
+    conn.executemany('''
+        INSERT INTO order_items (order_id, product_id, quantity_kg, unit_price, discount_percent, final_price)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', items)
+    conn.executemany('''
+        INSERT INTO stock_transactions (product_id, transaction_type, quantity_kg, notes, transaction_date)
+        VALUES (?, 'sale', ?, ?, ?)
+    ''', movements)
+    orders.clear()
+    items.clear()
+    movements.clear()
+
+
+def reset_migrations(conn: sqlite3.Connection):
+    """Drop every table, index and trigger and reset the schema version
+
+    Migrations add columns as well as indexes, so the tables go too and
+    create_tables then rebuilds them as they were before any migration.
+    """
+    conn.execute("PRAGMA foreign_keys = OFF")
+    # Triggers first, since dropping a table they mention would break them
+    objects = conn.execute(
+        "SELECT type, name FROM sqlite_master WHERE type IN ('trigger', 'table') AND name NOT LIKE 'sqlite%' "
+        "ORDER BY type = 'table'"
+    ).fetchall()
+    for object_type, name in objects:
+        conn.execute(f'DROP {object_type.upper()} "{name}"')
+    conn.execute("DROP TABLE IF EXISTS sqlite_stat1")
+    conn.execute("PRAGMA user_version = 0")
+    conn.execute("PRAGMA foreign_keys = ON")
+
+
+def time_queries(conn: sqlite3.Connection, ctx: Dict, repeat: int, overrides: Dict = None) -> Dict[str, float]:
+    """Median milliseconds for each hot query, using overrides by name where given"""
+    timings = {}
+    for name, sql, params in HOT_QUERIES:
+        sql, params = (overrides or {}).get(name, (sql, params))
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            conn.execute(sql, params(ctx)).fetchall()
+            samples.append((time.perf_counter() - start) * 1000)
+        timings[name] = statistics.median(samples)
+    return timings
+
+
+def bench_indexes(order_count: int, repeat: int) -> List[Dict]:
+    """Time the hot queries before and after the migrations on order_count orders
+
+    "After" runs the queries the app uses once migrated, which for revenue
+    and sales reports means the rollup tables.
+    """
+    workdir = tempfile.mkdtemp(prefix="jsfoods_bench_")
+    try:
+        manager = DatabaseManager(database=os.path.join(workdir, "indexes.db"))
+        try:
+            with manager.connection() as conn:
+                reset_migrations(conn)
+            manager.create_tables()
+            start = time.perf_counter()
+            populate_orders(manager, order_count)
+            print(f"   loaded {order_count:,} orders in {time.perf_counter() - start:.1f}s")
+
+            with manager.connection() as conn:
+                row = conn.execute('''
+                    SELECT customer_id, order_id, date(order_date) AS day FROM orders
+                    ORDER BY order_id DESC LIMIT 1
+                ''').fetchone()
+                product_id = conn.execute("SELECT product_id FROM products WHERE name = 'Bench Product 7'").fetchone()[0]
+                month_start = row['day'][:8] + "01"
+                ctx = {
+                    'customer_id': row['customer_id'],
+                    'order_id': row['order_id'],
+                    'day': row['day'],
+                    'month_start': month_start,
+                    'month_end': conn.execute("SELECT date(?, '+1 month')", (month_start,)).fetchone()[0],
+                    'product_id': product_id
+                }
+                before = time_queries(conn, ctx, repeat)
+                start = time.perf_counter()
+                migrate(conn)
+                print(f"   migrations and ANALYZE took {time.perf_counter() - start:.1f}s")
+                after = time_queries(conn, ctx, repeat, ROLLUP_QUERIES)
+        finally:
+            manager.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return [{'query': name, 'before_ms': before[name], 'after_ms': after[name]} for name, _, _ in HOT_QUERIES]
+
+
+def print_index_results(results: List[Dict]):
+    """Print hot query timings as a table"""
+    print(f"\n{'Query':<26} {'Before ms':>11} {'After ms':>10} {'Speed-up':>10}")
+    for result in results:
+        speedup = result['before_ms'] / result['after_ms'] if result['after_ms'] else 0
+        print(f"{result['query']:<26} {result['before_ms']:>11.2f} {result['after_ms']:>10.2f} {speedup:>9.1f}x")
+
+
+# Hot path suite: every DatabaseManager call the portals lean on, timed
+# against generated datasets and compared with a stored JSON baseline
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark-baseline.json")
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "jsfoods-bench-data")
+DEFAULT_SIZES = [10000, 100000]
+# Fixed so datasets, and so baselines, are the same on every run
+DATASET_END = date(2025, 12, 31)
+DATASET_SEED = 1
+# A path regresses when a checked percentile is this fraction slower than the
+# baseline and also slower by more than the floor, which keeps microsecond
+# noise out. Tail percentiles swing with anything else running on the
+# machine, so only the median is checked unless asked
+DEFAULT_THRESHOLD = 0.25
+REGRESSION_FLOOR_MS = 0.05
+PERCENTILES = (50, 95, 99)
+DEFAULT_CHECKED = [50]
+CART_LINES = 3
+
+
+def dataset_path(order_count: int, data_dir: str = DATA_DIR) -> str:
+    """Generated dataset with order_count orders, created on first use and kept for later runs
+
+    The schema version is part of the name, so a new migration means a new
+    dataset rather than one migrated (and re-seeded) by whoever opens it first.
+    """
+    path = os.path.join(data_dir, f"orders-{order_count}-seed{DATASET_SEED}-v{LATEST_VERSION}.db")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        # Customers, products and years from the preset nearest in size
+        sizes = dict(min(SCALES.values(), key=lambda scale: abs(math.log(scale['orders'] / order_count))))
+        sizes['orders'] = order_count
+        print(f"   generating {order_count:,} orders into {path}")
+        partial = path + ".partial"
+        if os.path.exists(partial):
+            os.remove(partial)
+        DatasetGenerator(partial, seed=DATASET_SEED, end=DATASET_END, **sizes).generate()
+        os.replace(partial, path)
+    return path
+
+
+def disable_cache(manager: DatabaseManager):
+    """Send every cached read to SQLite so the benchmark times the queries, not the cache"""
+    if manager.cache:
+        manager.cache.close()
+    manager.cache = None
+    manager.pool.cache = None
+
+
+def hot_path_context(manager: DatabaseManager, repeat: int) -> Dict:
+    """Users, orders and carts to spread the timed calls across"""
+    rng = random.Random(DATASET_SEED)
+    with manager.connection() as conn:
+        customers = [tuple(row) for row in conn.execute(
+            "SELECT user_id, username, address FROM users WHERE role = 'customer' ORDER BY user_id"
+        )]
+        order_ids = [row[0] for row in conn.execute("SELECT order_id FROM orders ORDER BY order_id")]
+        # Carts stay off the low stock list so topping them up below changes nothing it shows
+        products = [tuple(row) for row in conn.execute('''
+            SELECT product_id, price_per_kg FROM products
+            WHERE is_active = 1 AND current_stock_kg > min_stock_level
+            ORDER BY product_id
+        ''')]
+    carts = []
+    for _ in range(repeat + 1):
+        customer_id, _, address = rng.choice(customers)
+        items = [
+            {'product_id': product_id, 'quantity_kg': float(rng.randint(1, 60)), 'unit_price': price}
+            for product_id, price in rng.sample(products, min(CART_LINES, len(products)))
+        ]
+        carts.append(({
+            'customer_id': customer_id,
+            'total_amount': sum(item['quantity_kg'] * item['unit_price'] for item in items),
+            'delivery_date': (DATASET_END + timedelta(days=1)).isoformat(),
+            'delivery_address': address,
+            'payment_method': 'account'
+        }, items))
+    return {
+        'usernames': [rng.choice(customers)[1] for _ in range(repeat + 1)],
+        'customer_ids': [rng.choice(customers)[0] for _ in range(repeat + 1)],
+        'order_ids': [rng.choice(order_ids) for _ in range(repeat + 1)],
+        'lines': [(item['product_id'], item['quantity_kg']) for _, items in carts for item in items],
+        'carts': carts
+    }
+
+
+def employee_dashboard(manager: DatabaseManager, today: str) -> tuple:
+    """The reads behind EmployeePortal.fetch_dashboard_data"""
+    with manager.connection() as conn:
+        pending = conn.execute("SELECT COUNT(*) FROM orders WHERE status IN ('pending', 'confirmed')").fetchone()[0]
+    return pending, len(manager.get_low_stock_items()), manager.get_revenue(today, today)
+
+
+def hot_paths(manager: DatabaseManager, ctx: Dict) -> List[tuple]:
+    """(name, call) pairs; call(i) runs the i-th sample"""
+    end = DATASET_END.isoformat()
+    month_start = (DATASET_END - timedelta(days=29)).isoformat()
+    year_start = (DATASET_END - timedelta(days=364)).isoformat()
+    lines, carts = ctx['lines'], ctx['carts']
+    return [
+        ("verify_user", lambda i: manager.verify_user(ctx['usernames'][i], "password123")),
+        ("get_products", lambda i: manager.get_products()),
+        ("get_low_stock_items", lambda i: manager.get_low_stock_items()),
+        ("calculate_discount", lambda i: manager.calculate_discount(*lines[i % len(lines)])),
+        ("get_user_orders", lambda i: manager.get_user_orders(ctx['customer_ids'][i])),
+        ("get_order_details", lambda i: manager.get_order_details(ctx['order_ids'][i])),
+        ("get_sales_report", lambda i: manager.get_sales_report(month_start, end)),
+        # AdminPortal.fetch_sales_chart over its widest default range
+        ("admin sales chart", lambda i: manager.get_daily_revenue(year_start, end)),
+        ("employee dashboard", lambda i: employee_dashboard(manager, end)),
+        ("create_order", lambda i: manager.create_order(*carts[i])),
+    ]
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 in ms and calls per second from per-call times in ms"""
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return {
+        'p50_ms': round(cuts[49], 4),
+        'p95_ms': round(cuts[94], 4),
+        'p99_ms': round(cuts[98], 4),
+        'ops_per_sec': round(len(samples) / (sum(samples) / 1000), 1)
+    }
+
+
+def bench_hot_paths(sizes: List[int], repeat: int, data_dir: str = DATA_DIR,
+                    cached: bool = False) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Time each hot path repeat times on a copy of the dataset for each size
+
+    Returns {size: {path: summary}}, with sizes as strings so the result
+    round-trips through JSON unchanged.
+    """
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="jsfoods_bench_")
+    try:
+        for size in sizes:
+            source = dataset_path(size, data_dir)
+            # create_order writes, so the kept dataset is never benchmarked in place
+            path = os.path.join(workdir, f"hot-{size}.db")
+            shutil.copyfile(source, path)
+            manager = DatabaseManager(database=path)
+            try:
+                if not cached:
+                    disable_cache(manager)
+                ctx = hot_path_context(manager, repeat)
+                # Every cart must go through, whatever stock the dataset left
+                cart_products = {item['product_id'] for _, items in ctx['carts'] for item in items}
+                with manager.transaction() as conn:
+                    conn.executemany(
+                        "UPDATE products SET current_stock_kg = current_stock_kg + 1000000 WHERE product_id = ?",
+                        [(product_id,) for product_id in sorted(cart_products)]
+                    )
+                    conn.executemany('''
+                        INSERT INTO stock_transactions (product_id, transaction_type, quantity_kg, notes)
+                        VALUES (?, 'receive', 1000000, 'Benchmark stock')
+                    ''', [(product_id,) for product_id in sorted(cart_products)])
+                paths = hot_paths(manager, ctx)
+                # One untimed call each warms the statement cache and the pages
+                for name, call in paths:
+                    if call(repeat) is None:
+                        raise RuntimeError(f"{name} failed during benchmark")
+                # Round robin, so a burst of load on the machine slows every
+                # path a little instead of one path a lot
+                samples = {name: [] for name, _ in paths}
+                for i in range(repeat):
+                    for name, call in paths:
+                        start = time.perf_counter()
+                        call(i)
+                        samples[name].append((time.perf_counter() - start) * 1000)
+                results[str(size)] = {name: latency_summary(times) for name, times in samples.items()}
+            finally:
+                manager.close()
+            os.remove(path)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def print_hot_path_results(results: Dict, baseline: Dict = None):
+    """Print p50/p95/p99 and throughput per size, with the p50 change against the baseline"""
+    for size, paths in results.items():
+        print(f"\n{int(size):,} orders")
+        print(f"{'Path':<22} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>10} {'vs base':>9}")
+        for name, summary in paths.items():
+            before = ((baseline or {}).get(size) or {}).get(name)
+            change = f"{(summary['p50_ms'] / before['p50_ms'] - 1) * 100:>+8.0f}%" if before and before['p50_ms'] else ""
+            print(f"{name:<22} {summary['p50_ms']:>9.3f} {summary['p95_ms']:>9.3f} {summary['p99_ms']:>9.3f} "
+                  f"{summary['ops_per_sec']:>10.0f} {change:>9}")
+
+
+def load_baseline(path: str) -> Optional[Dict]:
+    """Results stored by save_baseline, or None if there is no baseline yet"""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)['results']
+
+
+def save_baseline(path: str, results: Dict, repeat: int):
+    """Store results as the new baseline, with enough context to tell runs apart"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'machine': platform.machine(),
+            'repeat': repeat,
+            'results': results
+        }, f, indent=2)
+        f.write("\n")
+
+
+def find_regressions(results: Dict, baseline: Dict, threshold: float = DEFAULT_THRESHOLD,
+                     percentiles: List[int] = None) -> List[str]:
+    """One line per path and percentile that got slower than the threshold allows"""
+    regressions = []
+    for size, paths in results.items():
+        for name, summary in paths.items():
+            before = (baseline.get(size) or {}).get(name)
+            if not before:
+                continue
+            for metric in [f"p{percentile}_ms" for percentile in percentiles or DEFAULT_CHECKED]:
+                old, new = before[metric], summary[metric]
+                if new > old * (1 + threshold) and new - old > REGRESSION_FLOOR_MS:
+                    regressions.append(f"{name} at {int(size):,} orders: {metric} {old:.3f} -> {new:.3f} ms "
+                                       f"(+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JS Foods database benchmarks")
+    parser.add_argument("suite", nargs="?", choices=["orders", "indexes", "discounts", "hotpaths"], default="orders",
+                        help="orders: create_order throughput, indexes: hot queries before/after migrations, "
+                             "discounts: discount lookup cost, hotpaths: latency of every hot path against a baseline")
+    parser.add_argument("--lines", type=int, nargs="+", default=[1, 10, 100], help="order sizes to benchmark")
+    parser.add_argument("--repeat", type=int,
+                        help="orders placed per size, or runs per query (default 50, 200 for hotpaths)")
+    parser.add_argument("--orders", type=int, default=1000000, help="orders loaded for the index benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="orders in each generated dataset for hotpaths")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="where generated datasets are kept between runs")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="JSON baseline to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="fail when a checked percentile is this fraction slower than the baseline")
+    parser.add_argument("--check", type=int, nargs="+", choices=PERCENTILES, default=DEFAULT_CHECKED,
+                        help="percentiles compared with the baseline")
+    parser.add_argument("--cached", action="store_true",
+                        help="leave the query cache on, so repeated reads time the cache")
+    args = parser.parse_args()
+    repeat = args.repeat or 50
+
+    if args.suite == "discounts":
+        print("📊 Benchmarking discount lookup (microseconds per line)")
+        for result in bench_discounts(max(args.lines), repeat):
+            print(f"{result['implementation']:<20} {result['us_per_line']:>10.2f}")
+    elif args.suite == "indexes":
+        print(f"📊 Benchmarking hot queries at {args.orders:,} orders (median ms)")
+        print_index_results(bench_indexes(args.orders, repeat))
+    elif args.suite == "hotpaths":
+        repeat = args.repeat or 200
+        print(f"📊 Benchmarking hot paths, {repeat} calls each")
+        results = bench_hot_paths(args.sizes, repeat, args.data_dir, args.cached)
+        baseline = load_baseline(args.baseline)
+        print_hot_path_results(results, baseline)
+        if args.save_baseline:
+            save_baseline(args.baseline, results, repeat)
+            print(f"\n✅ Baseline saved to {args.baseline}")
+        elif baseline is None:
+            print(f"\n⚠️ No baseline at {args.baseline}; run with --save-baseline to create one")
+        else:
+            regressions = find_regressions(results, baseline, args.threshold, args.check)
+            if regressions:
+                print(f"\n❌ {len(regressions)} regression(s) over {args.threshold:.0%} against {args.baseline}:")
+                for regression in regressions:
+                    print(f"   {regression}")
+                raise SystemExit(1)
+            print(f"\n✅ No regressions over {args.threshold:.0%} against {args.baseline}")
+    else:
+        print("📊 Benchmarking create_order (orders/sec)")
+        print_order_results(bench_create_order(args.lines, repeat))
+
+
+if __name__ == "__main__":
+    main()
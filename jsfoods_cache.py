@@ -0,0 +1,219 @@
+"""
+JS Foods Query Cache
+Read results cached until a table they depend on changes
+"""
+
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, Iterable, List, Set
+
+QUERY_CACHE_SIZE = 256
+
+_WRITE_TARGET = re.compile(
+    r"\b(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+[\"`\[]?(\w+)",
+    re.IGNORECASE
+)
+_READ_SOURCE = re.compile(r"\b(?:FROM|JOIN)\s+[\"`\[]?(\w+)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def tables_written(sql: str) -> FrozenSet[str]:
+    """Tables a statement inserts into, updates or deletes from"""
+    return frozenset(name.lower() for name in _WRITE_TARGET.findall(sql))
+
+
+@lru_cache(maxsize=1024)
+def tables_read(sql: str) -> FrozenSet[str]:
+    """Tables (and CTE names, harmlessly) a query reads from"""
+    return frozenset(name.lower() for name in _READ_SOURCE.findall(sql))
+
+
+class TrackedCursor(sqlite3.Cursor):
+    """Cursor that records the tables its statements write to"""
+
+    def execute(self, sql, *args):
+        self.connection.written_tables |= tables_written(sql)
+        return super().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        self.connection.written_tables |= tables_written(sql)
+        return super().executemany(sql, *args)
+
+    def executescript(self, sql):
+        self.connection.written_tables |= tables_written(sql)
+        return super().executescript(sql)
+
+
+class TrackedConnection(sqlite3.Connection):
+    """Connection that remembers which tables were written since the last reset
+
+    Used as the connection factory for the pool so a committed transaction
+    can invalidate exactly the cached queries that read those tables.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.written_tables: Set[str] = set()
+
+    def cursor(self, factory=TrackedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, *args):
+        self.written_tables |= tables_written(sql)
+        return super().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        self.written_tables |= tables_written(sql)
+        return super().executemany(sql, *args)
+
+    def executescript(self, sql):
+        self.written_tables |= tables_written(sql)
+        return super().executescript(sql)
+
+
+class QueryCache:
+    """Size-bounded LRU of query results with per-table invalidation
+
+    Writes committed through the pool bump a version for each table they
+    touched (including tables written by triggers), which invalidates only
+    the entries that read those tables. Commits from any other process are
+    spotted through PRAGMA data_version on a private monitor connection;
+    since the cache cannot tell which tables they touched, they clear it.
+    """
+
+    def __init__(self, database: str, max_entries: int = QUERY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.RLock()
+        self._entries: OrderedDict = OrderedDict()
+        self._table_versions: Dict[str, int] = {}
+        self._generation = 0
+        self._monitor = sqlite3.connect(database, check_same_thread=False)
+        self._data_version = self._read_data_version()
+        self._trigger_targets: Dict[str, FrozenSet[str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.external_flushes = 0
+        self.load_triggers()
+
+    def _read_data_version(self) -> int:
+        return self._monitor.execute("PRAGMA data_version").fetchone()[0]
+
+    def load_triggers(self):
+        """Learn which tables each table's triggers write, transitively"""
+        direct: Dict[str, Set[str]] = {}
+        for table, sql in self._monitor.execute("SELECT tbl_name, sql FROM sqlite_master WHERE type = 'trigger'"):
+            direct.setdefault(table.lower(), set()).update(tables_written(sql))
+        targets = {}
+        for table in direct:
+            seen, pending = set(), [table]
+            while pending:
+                for target in direct.get(pending.pop(), ()):
+                    if target not in seen:
+                        seen.add(target)
+                        pending.append(target)
+            targets[table] = frozenset(seen)
+        with self._lock:
+            self._trigger_targets = targets
+
+    def _flush(self):
+        """Drop every entry; used when another process changed the database"""
+        self._entries.clear()
+        self._generation += 1
+        self.external_flushes += 1
+
+    def _check_external(self):
+        """Clear the cache if a connection we do not track has committed"""
+        data_version = self._read_data_version()
+        if data_version != self._data_version:
+            self._data_version = data_version
+            self._flush()
+
+    def invalidate(self, tables: Iterable[str]):
+        """Invalidate entries reading any of these tables or tables their triggers write"""
+        with self._lock:
+            affected = set()
+            for table in tables:
+                table = table.lower()
+                affected.add(table)
+                affected |= self._trigger_targets.get(table, frozenset())
+            for table in affected:
+                self._table_versions[table] = self._table_versions.get(table, 0) + 1
+            self.invalidations += 1
+
+    def _stamp(self, tables: FrozenSet[str]) -> tuple:
+        return (self._generation,) + tuple(self._table_versions.get(table, 0) for table in sorted(tables))
+
+    @contextmanager
+    def committing(self, conn: sqlite3.Connection, tables: Iterable[str]):
+        """Wrap a pooled commit so it invalidates its own tables only
+
+        The writer still holds the write lock when this is entered, so no one
+        else can commit before it does. Any data_version change seen here is
+        therefore someone else's. After the commit the writer's own
+        data_version (which ignores its own commits) shows whether another
+        connection slipped in before the monitor was read again.
+        """
+        with self._lock:
+            self._check_external()
+            writer_before = conn.execute("PRAGMA data_version").fetchone()[0]
+            yield
+            monitor_after = self._read_data_version()
+            writer_after = conn.execute("PRAGMA data_version").fetchone()[0]
+            self._data_version = monitor_after
+            if writer_after != writer_before:
+                self._flush()
+            self.invalidate(tables)
+
+    def get(self, sql: str, params: tuple, loader: Callable[[], List]) -> List:
+        """Cached rows for sql/params, calling loader() on a miss"""
+        key = (sql, params)
+        tables = tables_read(sql)
+        with self._lock:
+            self._check_external()
+            stamp = self._stamp(tables)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        # The stamp was taken before loading, so a write that lands while
+        # the query runs leaves this entry already out of date
+        rows = loader()
+        with self._lock:
+            self._entries[key] = (stamp, rows)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return rows
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'invalidations': self.invalidations,
+                'external_flushes': self.external_flushes
+            }
+
+    def close(self):
+        """Close the monitor connection"""
+        with self._lock:
+            self._entries.clear()
+            self._monitor.close()
@@ -0,0 +1,74 @@
+"""
+JS Foods Change Feed
+Tells a portal window which rows other windows and processes changed
+"""
+
+from typing import Callable, Dict, Iterable, Set
+
+CHANGE_POLL_MS = 1000
+# Changes read per poll; a window further behind than this reloads instead
+CHANGE_BATCH = 500
+
+
+class ChangeFeed:
+    """Tail the changes table and pass the changed row ids to a window
+
+    Triggers add a row to `changes` for every insert, update and delete on
+    the tables in jsfoods_migrations.CHANGE_FEED_TABLES, in the same
+    transaction, so every process sees a change as soon as it commits.
+    Each poll reads only the rows after the last one seen, by primary
+    key, and calls handlers[table](row_ids) on the Tk thread once per
+    table that changed. The handler re-reads just those rows; a row that
+    is no longer found was deleted. If the window fell so far behind
+    that rows were pruned, or more than CHANGE_BATCH arrived at once,
+    on_reset() is called instead so the window reloads everything once.
+    """
+
+    def __init__(self, widget, manager, handlers: Dict[str, Callable[[Set[int]], None]],
+                 on_reset: Callable[[], None], interval_ms: int = CHANGE_POLL_MS):
+        self.widget = widget
+        self.manager = manager
+        self.handlers = handlers
+        self.on_reset = on_reset
+        self.interval_ms = interval_ms
+        # Everything up to now is already on screen
+        self.last_id = manager.latest_change_id()
+        self._closed = False
+        widget.bind("<Destroy>", self._on_destroy, add="+")
+        widget.after(interval_ms, self._poll)
+
+    def _poll(self):
+        if self._closed:
+            return
+        try:
+            self.poll()
+        finally:
+            if not self._closed:
+                self.widget.after(self.interval_ms, self._poll)
+
+    def poll(self):
+        """Deliver every change committed since the last poll"""
+        changes = self.manager.get_changes(self.last_id, CHANGE_BATCH + 1)
+        if not changes:
+            return
+        if changes[0]['change_id'] != self.last_id + 1 or len(changes) > CHANGE_BATCH:
+            self.last_id = self.manager.latest_change_id()
+            self.on_reset()
+            return
+        self.last_id = changes[-1]['change_id']
+        self.dispatch(changes)
+
+    def dispatch(self, changes: Iterable[Dict]):
+        """Group changes by table and call each table's handler once"""
+        changed: Dict[str, Set[int]] = {}
+        for change in changes:
+            changed.setdefault(change['table_name'], set()).add(change['row_id'])
+        for table, row_ids in changed.items():
+            handler = self.handlers.get(table)
+            if handler is not None:
+                handler(row_ids)
+
+    def _on_destroy(self, event):
+        # <Destroy> also fires for every child of a toplevel
+        if event.widget is self.widget:
+            self._closed = True
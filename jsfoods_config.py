@@ -0,0 +1,25 @@
+"""
+JS Foods Configuration
+Optional settings file shared by every portal
+"""
+
+import configparser
+import os
+
+CONFIG_FILE = 'jsfoods.ini'
+CONFIG_ENV = 'JSFOODS_CONFIG'
+
+
+def load_config(path: str = None) -> configparser.ConfigParser:
+    """Read the settings file, returning an empty config if there is none
+
+    The file is looked up from the path argument, then the JSFOODS_CONFIG
+    environment variable, then jsfoods.ini in the working directory.
+    """
+    config = configparser.ConfigParser()
+    path = path or os.environ.get(CONFIG_ENV) or CONFIG_FILE
+    try:
+        config.read(path, encoding='utf-8')
+    except configparser.Error as e:
+        print(f"⚠️ Could not read config file {path}: {e}")
+    return config
@@ -9,13 +9,87 @@ import customtkinter as tk
 from tkinter import ttk, messagebox
 from PIL import Image, ImageTk
 import sqlite3
-import subprocess
 from datetime import datetime, timedelta
+from jsfoods_background import BackgroundRunner
+from jsfoods_changes import ChangeFeed
 from jsfoods_database import db
+from jsfoods_instrumentation import tracked_action
+from jsfoods_widgets import ORDER_STATUS_COLORS, TreeviewBinding, VirtualCardGrid
 
-class CustomerPortal(tk.CTk):
-    def __init__(self):
-        super().__init__()
+
+class ProductCard(tk.CTkFrame):
+    """Product card that the catalogue grid refills as it scrolls"""
+    
+    def __init__(self, parent, portal):
+        super().__init__(parent, width=250, height=180)
+        self.pack_propagate(False)
+        self.portal = portal
+        self.product = None
+        
+        # Product name
+        self.name_label = tk.CTkLabel(self, font=("Helvetica", 14, "bold"), wraplength=200)
+        self.name_label.pack(pady=(10, 5))
+        
+        # Category and stock
+        info_frame = tk.CTkFrame(self, fg_color="transparent")
+        info_frame.pack(fill="x", padx=10, pady=5)
+        
+        self.category_label = tk.CTkLabel(info_frame, font=("Helvetica", 10), text_color="#666666")
+        self.category_label.pack(anchor="w")
+        
+        self.stock_label = tk.CTkLabel(info_frame, font=("Helvetica", 10))
+        self.stock_label.pack(anchor="w", pady=(0, 5))
+        
+        # Price
+        self.price_label = tk.CTkLabel(self, font=("Helvetica", 16, "bold"), text_color="#2E7D32")
+        self.price_label.pack(pady=5)
+        
+        # Add to cart controls
+        control_frame = tk.CTkFrame(self, fg_color="transparent")
+        control_frame.pack(fill="x", padx=10, pady=(0, 10))
+        
+        # Quantity input
+        quantity_frame = tk.CTkFrame(control_frame, fg_color="transparent")
+        quantity_frame.pack(side="left", fill="x", expand=True)
+        
+        tk.CTkLabel(quantity_frame, text="Qty (kg):").pack(side="left")
+        self.quantity_var = tk.StringVar(value="1")
+        tk.CTkEntry(
+            quantity_frame,
+            textvariable=self.quantity_var,
+            width=60
+        ).pack(side="left", padx=5)
+        
+        # Add button
+        tk.CTkButton(
+            control_frame,
+            text="+ Add",
+            command=lambda: self.portal.add_to_cart(self.product, self.quantity_var),
+            width=60,
+            fg_color="#2E7D32",
+            hover_color="#1B5E20"
+        ).pack(side="right")
+    
+    def show(self, product):
+        """Display a product, keeping any quantity typed for the previous one"""
+        if self.product is not None:
+            self.portal.card_quantities[self.product['product_id']] = self.quantity_var.get()
+        self.product = product
+        self.name_label.configure(text=product['name'])
+        self.category_label.configure(text=f"Category: {product['category']}")
+        stock_color = "#4CAF50" if product['current_stock_kg'] > 10 else "#FF9800"
+        self.stock_label.configure(
+            text=f"Stock: {product['current_stock_kg']} {product['unit']}",
+            text_color=stock_color
+        )
+        self.price_label.configure(text=f"£{product['price_per_kg']:.2f}/{product['unit']}")
+        self.quantity_var.set(self.portal.card_quantities.get(product['product_id'], "1"))
+
+
+class CustomerPortal(tk.CTkToplevel):
+    def __init__(self, shell, user=None):
+        super().__init__(shell)
+        self.shell = shell
         
         self.title("JS Foods - Customer Portal")
         self.geometry("1200x700")
@@ -24,14 +98,25 @@ class CustomerPortal(tk.CTk):
         tk.set_appearance_mode("light")
         tk.set_default_color_theme("blue")
         
-        # Demo customer ID (in real app, this would come from login)
-        self.customer_id = 1
+        # The logged-in customer; the demo customer when opened directly
+        self.customer_id = user['user_id'] if user else 1
         self.cart = []
         self.total_amount = 0.0
+        # Quantities typed on product cards, kept while cards are recycled
+        self.card_quantities = {}
+        
+        # Queries run here so a slow report never freezes the window
+        self.background = BackgroundRunner(self)
         
         self.setup_ui()
         self.load_products()
         self.load_customer_orders()
+        
+        # Stock levels and order statuses changed elsewhere show up by themselves
+        self.changes = ChangeFeed(self, db, {
+            'products': self.apply_product_changes,
+            'orders': self.apply_order_changes
+        }, on_reset=self.refresh_all)
     
     def setup_ui(self):
         """Setup customer portal UI"""
@@ -74,17 +159,22 @@ class CustomerPortal(tk.CTk):
         )
         self.category_combo.pack(side="left", padx=5)
         
-        # Products grid
+        # Products grid; only the cards in view are built
         self.products_canvas = tk.CTkCanvas(products_frame, bg="white")
         self.products_canvas.grid(row=1, column=0, sticky="nsew", padx=10, pady=(0, 10))
         
         scrollbar = ttk.Scrollbar(products_frame, orient="vertical", command=self.products_canvas.yview)
         scrollbar.grid(row=1, column=1, sticky="ns", pady=(0, 10))
         
-        self.products_canvas.configure(yscrollcommand=scrollbar.set)
-        
-        self.products_inner_frame = tk.CTkFrame(self.products_canvas)
-        self.products_canvas.create_window((0, 0), window=self.products_inner_frame, anchor="nw")
+        self.products_grid = VirtualCardGrid(
+            self.products_canvas,
+            scrollbar,
+            make_card=lambda canvas: ProductCard(canvas, self),
+            fill_card=lambda card, product: card.show(product),
+            card_width=250,
+            card_height=180,
+            columns=3
+        )
         
         # Right panel - Cart & Orders
         right_frame = tk.CTkFrame(self)
@@ -186,6 +276,7 @@ class CustomerPortal(tk.CTk):
         self.orders_tree.column("Date", width=100, anchor="center")
         self.orders_tree.column("Amount", width=80, anchor="center")
         self.orders_tree.column("Status", width=100, anchor="center")
+        self.order_rows = TreeviewBinding(self.orders_tree, ORDER_STATUS_COLORS)
         
         self.orders_tree.bind("<Double-1>", self.view_order_details)
         
@@ -211,6 +302,7 @@ class CustomerPortal(tk.CTk):
             width=100
         ).pack(side="right", padx=20)
     
+    @tracked_action
     def load_products(self):
         """Load products from database"""
         category = self.category_var.get()
@@ -218,90 +310,38 @@ class CustomerPortal(tk.CTk):
         
         products = db.get_products(category=category, active_only=True)
         
-        # Clear existing products
-        for widget in self.products_inner_frame.winfo_children():
-            widget.destroy()
-        
-        # Display products in grid
-        row, col = 0, 0
-        max_cols = 3
+        self.products_grid.set_items(products)
+    
+    @tracked_action
+    def apply_product_changes(self, product_ids):
+        """Refill only the cards of products whose stock, price or details changed
         
-        for product in products:
-            product_frame = tk.CTkFrame(self.products_inner_frame, width=250, height=180)
-            product_frame.grid(row=row, column=col, padx=10, pady=10, sticky="nsew")
-            product_frame.grid_propagate(False)
-            
-            # Product name
-            tk.CTkLabel(
-                product_frame,
-                text=product['name'],
-                font=("Helvetica", 14, "bold"),
-                wraplength=200
-            ).pack(pady=(10, 5))
-            
-            # Category and stock
-            info_frame = tk.CTkFrame(product_frame, fg_color="transparent")
-            info_frame.pack(fill="x", padx=10, pady=5)
-            
-            tk.CTkLabel(
-                info_frame,
-                text=f"Category: {product['category']}",
-                font=("Helvetica", 10),
-                text_color="#666666"
-            ).pack(anchor="w")
-            
-            stock_color = "#4CAF50" if product['current_stock_kg'] > 10 else "#FF9800"
-            tk.CTkLabel(
-                info_frame,
-                text=f"Stock: {product['current_stock_kg']} {product['unit']}",
-                font=("Helvetica", 10),
-                text_color=stock_color
-            ).pack(anchor="w", pady=(0, 5))
-            
-            # Price
-            tk.CTkLabel(
-                product_frame,
-                text=f"£{product['price_per_kg']:.2f}/{product['unit']}",
-                font=("Helvetica", 16, "bold"),
-                text_color="#2E7D32"
-            ).pack(pady=5)
-            
-            # Add to cart controls
-            control_frame = tk.CTkFrame(product_frame, fg_color="transparent")
-            control_frame.pack(fill="x", padx=10, pady=(0, 10))
-            
-            # Quantity input
-            quantity_frame = tk.CTkFrame(control_frame, fg_color="transparent")
-            quantity_frame.pack(side="left", fill="x", expand=True)
-            
-            tk.CTkLabel(quantity_frame, text="Qty (kg):").pack(side="left")
-            quantity_var = tk.StringVar(value="1")
-            quantity_entry = tk.CTkEntry(
-                quantity_frame,
-                textvariable=quantity_var,
-                width=60
-            )
-            quantity_entry.pack(side="left", padx=5)
-            
-            # Add button
-            add_btn = tk.CTkButton(
-                control_frame,
-                text="+ Add",
-                command=lambda p=product, q=quantity_var: self.add_to_cart(p, q),
-                width=60,
-                fg_color="#2E7D32",
-                hover_color="#1B5E20"
-            )
-            add_btn.pack(side="right")
-            
-            col += 1
-            if col >= max_cols:
-                col = 0
-                row += 1
-        
-        # Update canvas scroll region
-        self.products_inner_frame.update_idletasks()
-        self.products_canvas.configure(scrollregion=self.products_canvas.bbox("all"))
+        A product added, removed, deactivated or moved out of the category
+        shown changes which cards exist, so that reloads the catalogue.
+        """
+        category = self.category_var.get()
+        changed = {product['product_id']: product for product in db.get_products_by_ids(sorted(product_ids))}
+        positions = {item['product_id']: index for index, item in enumerate(self.products_grid.items)}
+        updates = {}
+        for product_id in product_ids:
+            product = changed.get(product_id)
+            belongs = product is not None and bool(product['is_active']) and category in ("All", product['category'])
+            if belongs != (product_id in positions):
+                self.load_products()
+                return
+            if belongs:
+                updates[positions[product_id]] = product
+        self.products_grid.update_items(updates)
+    
+    @tracked_action
+    def apply_order_changes(self, order_ids):
+        """Reload the order history only if one of this customer's orders changed"""
+        if set(order_ids) & set(self.order_rows.keys()):
+            self.load_customer_orders()
+            return
+        mine, _ = db.get_orders_page(customer_id=self.customer_id, order_ids=sorted(order_ids), limit=1)
+        if mine:
+            self.load_customer_orders()
     
     def filter_products(self, choice):
         """Filter products by category"""
@@ -374,33 +414,21 @@ class CustomerPortal(tk.CTk):
             self.cart = []
             self.update_cart_display()
     
+    @tracked_action
     def load_customer_orders(self):
         """Load customer's recent orders"""
         orders = db.get_user_orders(self.customer_id, limit=10)
         
-        # Clear orders tree
-        for item in self.orders_tree.get_children():
-            self.orders_tree.delete(item)
-        
-        # Add orders
-        for order in orders:
-            status_color = {
-                'pending': 'orange',
-                'confirmed': 'blue',
-                'processing': 'purple',
-                'ready': 'green',
-                'delivered': '#2E7D32',
-                'cancelled': 'red'
-            }.get(order['status'], 'black')
-            
-            self.orders_tree.insert("", "end", values=(
+        # Only rows that changed since the last refresh touch the table
+        self.order_rows.set_rows(
+            (order['order_id'], (
                 order['order_id'],
                 order['order_date'][:10],
                 f"£{order['total_amount']:.2f}",
                 order['status'].title()
-            ), tags=(order['status'],))
-            
-            self.orders_tree.tag_configure(order['status'], foreground=status_color)
+            ), (order['status'],))
+            for order in orders
+        )
     
     def view_order_details(self, event):
         """View details of selected order"""
@@ -409,8 +437,18 @@ class CustomerPortal(tk.CTk):
             return
         
         order_id = self.orders_tree.item(selection[0])['values'][0]
-        order, items = db.get_order_details(order_id)
-        
+        self.configure(cursor="watch")
+        self.background.submit(
+            "order_details",
+            db.get_order_details,
+            order_id,
+            on_done=lambda details: self.show_order_details(order_id, *details),
+            on_error=lambda e: self.configure(cursor="")
+        )
+    
+    def show_order_details(self, order_id, order, items):
+        """Open the order details window for a fetched order"""
+        self.configure(cursor="")
         if not order:
             return
         
@@ -522,8 +560,7 @@ class CustomerPortal(tk.CTk):
     
     def go_back(self):
         """Return to main menu"""
-        self.destroy()
-        subprocess.Popen(["python", "jsfoods_main.py"])
+        self.shell.logout()
 
 
 class CheckoutWindow(tk.CTkToplevel):
@@ -735,6 +772,7 @@ class CheckoutWindow(tk.CTkToplevel):
             errors.append("Please enter a valid date (YYYY-MM-DD)")
         return errors
     
+    @tracked_action
     def place_order(self):
         """Place the order"""
         # Validate form
@@ -789,5 +827,5 @@ class CheckoutWindow(tk.CTkToplevel):
 
 
 if __name__ == "__main__":
-    app = CustomerPortal()
-    app.mainloop()
\ No newline at end of file
+    from jsfoods_main import run
+    run("customer")
\ No newline at end of file
@@ -5,212 +5,665 @@ Database operations and helper functions
 
 import sqlite3
 import hashlib
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
+
+from jsfoods_cache import QueryCache
+from jsfoods_config import load_config
+from jsfoods_discounts import DiscountEngine
+from jsfoods_instrumentation import InstrumentedConnection, QueryStats, WriteStats, query_tracker, tracked_action
+from jsfoods_migrations import (LATEST_VERSION, SALES_ROLLUP_REBUILD, STOCK_LEDGER_REBUILD, STOCK_SNAPSHOT,
+                                get_schema_version, migrate, signed_quantity)
 
 DATABASE = 'jsfoods.db'
+POOL_SIZE = 5
+POOL_TIMEOUT = 10.0
+# Longest backoff between write retries, however many retries are allowed
+WRITE_BACKOFF_CAP_MS = 1000.0
+ORDER_PAGE_SIZE = 100
+# Newest rows of the changes feed kept when it is pruned; a portal further
+# behind than this reloads everything instead
+CHANGE_RETENTION = 10000
+# Rows fetched at a time by stream_rows
+STREAM_BATCH = 5000
+
+PROFILE_ENV = 'JSFOODS_DB_PROFILE'
+DEFAULT_PROFILE = 'balanced'
+
+# Named SQLite tuning profiles. journal_mode is stored in the database file,
+# the other PRAGMAs are set on every pooled connection. maintenance_interval
+# is how often (seconds) the WAL is checkpointed and PRAGMA optimize runs;
+# 0 turns the background maintenance off. query_cache_size is how many read
+# results DatabaseManager keeps (see jsfoods_cache); 0 turns the cache off.
+# Statements slower than slow_query_ms go to the slow-query log (see
+# jsfoods_instrumentation); 0 turns the log off. A write transaction still
+# locked out after busy_timeout is retried up to write_retries times, with
+# a random backoff of up to write_backoff_ms, doubling each time.
+PERFORMANCE_PROFILES = {
+    'safe': {
+        'busy_timeout': 5000,
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'cache_size': -2000,
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT',
+        'wal_autocheckpoint': 1000,
+        'maintenance_interval': 0,
+        'query_cache_size': 256,
+        'slow_query_ms': 100.0,
+        'write_retries': 3,
+        'write_backoff_ms': 50.0
+    },
+    'balanced': {
+        'busy_timeout': 5000,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -16000,
+        'mmap_size': 64 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'wal_autocheckpoint': 1000,
+        'maintenance_interval': 300,
+        'query_cache_size': 256,
+        'slow_query_ms': 100.0,
+        'write_retries': 3,
+        'write_backoff_ms': 50.0
+    },
+    'fast': {
+        'busy_timeout': 10000,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'wal_autocheckpoint': 4000,
+        'maintenance_interval': 600,
+        'query_cache_size': 256,
+        'slow_query_ms': 100.0,
+        'write_retries': 3,
+        'write_backoff_ms': 50.0
+    }
+}
+
+# Accepted values for the text settings; PRAGMAs cannot take bound parameters
+PRAGMA_CHOICES = {
+    'journal_mode': ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'),
+    'synchronous': ('OFF', 'NORMAL', 'FULL', 'EXTRA'),
+    'temp_store': ('DEFAULT', 'FILE', 'MEMORY')
+}
+CONNECTION_PRAGMAS = ('busy_timeout', 'journal_mode', 'synchronous', 'cache_size',
+                      'mmap_size', 'temp_store', 'wal_autocheckpoint')
+
+
+def load_performance_profile(name: str = None, config_path: str = None) -> Tuple[str, Dict]:
+    """Resolve the SQLite profile to use and any overrides from the config file
+    
+    The profile name comes from the argument, the JSFOODS_DB_PROFILE
+    environment variable, or `profile` in the [database] section of
+    jsfoods.ini, in that order. Any setting from PERFORMANCE_PROFILES can
+    also be overridden individually in the [database] section.
+    """
+    config = load_config(config_path)
+    section = config['database'] if config.has_section('database') else {}
+    name = name or os.environ.get(PROFILE_ENV) or section.get('profile') or DEFAULT_PROFILE
+    if name not in PERFORMANCE_PROFILES:
+        print(f"⚠️ Unknown database profile '{name}', using '{DEFAULT_PROFILE}'")
+        name = DEFAULT_PROFILE
+    settings = dict(PERFORMANCE_PROFILES[name])
+    for key, default in PERFORMANCE_PROFILES[name].items():
+        if key not in section:
+            continue
+        value = section[key].strip()
+        try:
+            if key in PRAGMA_CHOICES:
+                value = value.upper()
+                if value not in PRAGMA_CHOICES[key]:
+                    raise ValueError(f"expected one of {', '.join(PRAGMA_CHOICES[key])}")
+            else:
+                value = type(default)(value)
+        except ValueError as e:
+            print(f"⚠️ Ignoring database setting {key} = {section[key]}: {e}")
+            continue
+        settings[key] = value
+    return name, settings
+
+def is_locked_error(error: sqlite3.Error) -> bool:
+    """Whether an error means another connection held the lock (SQLITE_BUSY)"""
+    return isinstance(error, sqlite3.OperationalError) and str(error).startswith("database is locked")
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections shared by every portal
+    
+    A thread checks out one connection and keeps it for nested calls, so a
+    DatabaseManager method that calls another method runs on the same
+    connection and inside the same transaction. Connections go back to the
+    pool when the outermost block exits, which keeps each connection's
+    prepared statement cache warm between calls.
+    """
+    
+    def __init__(self, database: str, max_size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT,
+                 pragmas: Dict = None, stats: QueryStats = None):
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pragmas = pragmas or {}
+        # QueryStats every pooled connection times its statements into
+        self.stats = stats
+        self._idle = queue.LifoQueue()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+        # QueryCache told about every commit made through transaction()
+        self.cache = None
+    
+    def _create_connection(self) -> sqlite3.Connection:
+        """Open a new connection configured the way the app expects"""
+        conn = sqlite3.connect(self.database, timeout=self.timeout, check_same_thread=False,
+                               cached_statements=256, factory=InstrumentedConnection)
+        conn.row_factory = sqlite3.Row
+        conn.query_stats = self.stats
+        # Lets query_tracker group statements by the action that ran them
+        conn.set_trace_callback(query_tracker.trace)
+        # Enable foreign keys
+        conn.execute("PRAGMA foreign_keys = ON")
+        # Apply the performance profile; values were validated when it was loaded
+        for pragma in CONNECTION_PRAGMAS:
+            if pragma in self.pragmas:
+                conn.execute(f"PRAGMA {pragma} = {self.pragmas[pragma]}")
+        return conn
+    
+    def _acquire(self) -> sqlite3.Connection:
+        """Take an idle connection, opening a new one while below max_size"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._connections) < self.max_size:
+                conn = self._create_connection()
+                self._connections.append(conn)
+                return conn
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"No database connection free after {self.timeout}s")
+    
+    def _release(self, conn: sqlite3.Connection):
+        """Return a connection, discarding any work that was never committed"""
+        if conn.in_transaction:
+            conn.rollback()
+        if self._closed:
+            conn.close()
+        else:
+            self._idle.put(conn)
+    
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the current thread"""
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            yield held
+            return
+        conn = self._acquire()
+        self._local.conn = conn
+        self._local.in_transaction_block = False
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._release(conn)
+    
+    @contextmanager
+    def transaction(self, immediate: bool = False):
+        """Check out a connection and commit on success or roll back on error
+        
+        Nested transaction blocks join the outermost one, so only the
+        outermost block commits. With immediate the outermost block takes
+        the write lock as it begins (BEGIN IMMEDIATE), waiting up to the
+        busy timeout for it, instead of at its first write.
+        """
+        with self.connection() as conn:
+            if self._local.in_transaction_block:
+                yield conn
+                return
+            self._local.in_transaction_block = True
+            try:
+                if not conn.in_transaction:
+                    conn.written_tables.clear()
+                    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+                yield conn
+                if self.cache is not None and conn.written_tables:
+                    with self.cache.committing(conn, conn.written_tables):
+                        conn.commit()
+                else:
+                    conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                self._local.in_transaction_block = False
+    
+    def in_transaction(self) -> bool:
+        """Whether the current thread is inside a transaction block"""
+        return getattr(self._local, 'conn', None) is not None and self._local.in_transaction_block
+    
+    def size(self) -> int:
+        """Number of connections currently open"""
+        return len(self._connections)
+    
+    def close_all(self):
+        """Close every idle connection; checked-out ones close when returned"""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._connections = []
+
 
 class DatabaseManager:
     """Manages all database operations for JS Foods"""
     
-    def __init__(self):
-        self.conn = None
-        self.cursor = None
+    def __init__(self, database: str = None, pool_size: int = POOL_SIZE, profile: str = None):
+        self.database = database or DATABASE
+        self.pool_size = pool_size
+        self.pool = None
+        self.profile, self.settings = load_performance_profile(profile)
+        self._stop_maintenance = threading.Event()
+        self._maintenance_thread = None
+        self.cache = None
+        self.query_stats = QueryStats(self.settings['slow_query_ms'],
+                                      os.path.splitext(self.database)[0] + '-slow.log')
+        self.write_stats = WriteStats()
+        self.discounts = DiscountEngine(self.connection)
         self.connect()
-        self.create_tables()
-        self.create_default_data()
+        # A database already at the latest migration has its tables, indexes
+        # and seed data from an earlier run, so skip the DDL and the hashing
+        if self.schema_version() < LATEST_VERSION:
+            self.create_tables()
+            self.run_migrations()
+            self.create_default_data()
+        # Profiles without background maintenance still prune and snapshot once per start
+        if self.settings['maintenance_interval'] <= 0:
+            self.prune_changes()
+            self.snapshot_stock()
+        self.enable_cache()
     
     def connect(self):
         """Connect to database"""
         try:
-            self.conn = sqlite3.connect(DATABASE, check_same_thread=False)
-            self.conn.row_factory = sqlite3.Row
-            self.cursor = self.conn.cursor()
-            # Enable foreign keys
-            self.cursor.execute("PRAGMA foreign_keys = ON")
+            self.pool = ConnectionPool(self.database, self.pool_size, pragmas=self.settings,
+                                       stats=self.query_stats)
+            # Open the first connection now so a bad path fails at startup
+            with self.connection():
+                pass
             print("✅ Database connected successfully")
+            self.print_performance_report()
+            self.start_maintenance()
         except sqlite3.Error as e:
             print(f"❌ Database connection error: {e}")
             raise
     
+    def performance_report(self) -> Dict:
+        """Read back the effective SQLite settings from a pooled connection"""
+        synchronous_names = {0: 'OFF', 1: 'NORMAL', 2: 'FULL', 3: 'EXTRA'}
+        temp_store_names = {0: 'DEFAULT', 1: 'FILE', 2: 'MEMORY'}
+        with self.connection() as conn:
+            report = {
+                pragma: conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+                for pragma in CONNECTION_PRAGMAS
+            }
+        report['journal_mode'] = report['journal_mode'].upper()
+        report['synchronous'] = synchronous_names.get(report['synchronous'], report['synchronous'])
+        report['temp_store'] = temp_store_names.get(report['temp_store'], report['temp_store'])
+        report['maintenance_interval'] = self.settings['maintenance_interval']
+        return report
+    
+    def print_performance_report(self):
+        """Print the profile in use and the settings SQLite actually applied"""
+        try:
+            report = self.performance_report()
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not read database settings: {e}")
+            return
+        print(f"⚙️ Database profile '{self.profile}':")
+        for key, value in report.items():
+            requested = self.settings.get(key)
+            note = "" if requested == value else f" (requested {requested})"
+            print(f"   {key:<20} {value}{note}")
+    
+    def start_maintenance(self):
+        """Run WAL checkpoints and PRAGMA optimize in the background"""
+        interval = self.settings['maintenance_interval']
+        if interval <= 0 or self._maintenance_thread is not None:
+            return
+        self._stop_maintenance.clear()
+        self._maintenance_thread = threading.Thread(
+            target=self._maintenance_loop, args=(interval,), name="jsfoods-db-maintenance", daemon=True
+        )
+        self._maintenance_thread.start()
+    
+    def _maintenance_loop(self, interval: float):
+        """Call run_maintenance every interval seconds until stopped"""
+        while not self._stop_maintenance.wait(interval):
+            self.run_maintenance()
+    
+    def run_maintenance(self):
+        """Prune the changes feed, snapshot stock, checkpoint the WAL and refresh planner statistics"""
+        self.prune_changes()
+        self.snapshot_stock()
+        try:
+            with self.connection() as conn:
+                if self.settings['journal_mode'] == 'WAL':
+                    conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+                conn.execute("PRAGMA optimize").fetchall()
+        except sqlite3.Error as e:
+            print(f"⚠️ Database maintenance error: {e}")
+    
+    def enable_cache(self):
+        """Start caching read results if the profile asks for it
+        
+        Called once the schema is in place, since the cache learns from the
+        triggers which tables each write can reach.
+        """
+        size = self.settings['query_cache_size']
+        if size <= 0 or self.cache is not None:
+            return
+        try:
+            self.cache = QueryCache(self.database, size)
+            self.pool.cache = self.cache
+        except sqlite3.Error as e:
+            print(f"⚠️ Query cache disabled: {e}")
+    
+    def cached_query(self, sql: str, params: tuple = ()) -> List[Dict]:
+        """Rows for a read query as dicts, served from the cache when still valid
+        
+        Reads inside an open transaction bypass the cache so uncommitted
+        changes are never stored.
+        """
+        with self.connection() as conn:
+            load = lambda: [dict(row) for row in conn.execute(sql, params)]
+            if self.cache is None or conn.in_transaction:
+                return load()
+            rows = self.cache.get(sql, params, load)
+        # Copies, so callers can edit what they get without touching the cache
+        return [dict(row) for row in rows]
+    
+    def stream_rows(self, sql: str, params: tuple = (), batch_size: int = STREAM_BATCH) -> Iterator[List[tuple]]:
+        """Yield the rows of a read query as lists of up to batch_size tuples
+        
+        Rows come from one cursor with fetchmany, so only one batch is in
+        memory however large the result, and all of them come from the
+        same read snapshot. The pooled connection is held until the
+        iterator is used up or closed, so use it on one thread. Errors are
+        raised rather than printed: a caller writing a file must not
+        mistake a failed read for the end of the rows.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield rows
+    
+    def cache_stats(self) -> Dict:
+        """Hit/miss counters for the query cache, empty if it is off"""
+        return self.cache.stats() if self.cache else {}
+    
+    def connection(self):
+        """Context manager yielding a pooled connection for reads"""
+        return self.pool.connection()
+    
+    def transaction(self):
+        """Context manager yielding a pooled connection inside a transaction"""
+        return self.pool.transaction()
+    
+    def write_transaction(self, work: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Run work(conn) in a BEGIN IMMEDIATE transaction and return its result
+        
+        The write lock is taken before work reads anything, so it never acts
+        on stock another process has changed since. If the lock is still
+        held elsewhere after the busy timeout, the whole transaction is
+        rolled back and retried after a jittered backoff, so work must only
+        touch the database; do any slow preparation before calling this.
+        Inside an enclosing transaction work simply joins it. Retries and
+        time spent waiting for the lock are counted in write_stats. Raises
+        the last sqlite3.Error once the retries are used up.
+        """
+        if self.pool.in_transaction():
+            with self.transaction() as conn:
+                return work(conn)
+        started = time.perf_counter()
+        retries = 0
+        while True:
+            try:
+                with self.pool.transaction(immediate=True) as conn:
+                    wait_ms = (time.perf_counter() - started) * 1000
+                    result = work(conn)
+            except sqlite3.OperationalError as e:
+                if not is_locked_error(e) or retries >= self.settings['write_retries']:
+                    self.write_stats.record(retries, (time.perf_counter() - started) * 1000,
+                                            failed=is_locked_error(e))
+                    raise
+                backoff_ms = min(self.settings['write_backoff_ms'] * 2 ** retries, WRITE_BACKOFF_CAP_MS)
+                time.sleep(random.uniform(0, backoff_ms) / 1000)
+                retries += 1
+                continue
+            self.write_stats.record(retries, wait_ms)
+            return result
+    
     def create_tables(self):
         """Create all necessary tables if they don't exist"""
         try:
-            # Users table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    password TEXT NOT NULL,
-                    role TEXT NOT NULL CHECK(role IN ('customer', 'employee', 'manager', 'owner')),
-                    first_name TEXT NOT NULL,
-                    last_name TEXT NOT NULL,
-                    email TEXT UNIQUE NOT NULL,
-                    phone TEXT,
-                    address TEXT,
-                    registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Products table (with category as text, unit, description)
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS products (
-                    product_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    category TEXT NOT NULL,
-                    description TEXT,
-                    unit TEXT DEFAULT 'kg',
-                    current_stock_kg REAL DEFAULT 0,
-                    min_stock_level REAL DEFAULT 10,
-                    is_active INTEGER DEFAULT 1,
-                    price_per_kg REAL DEFAULT 0
-                )
-            ''')
-            
-            # Orders table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS orders (
-                    order_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    customer_id INTEGER NOT NULL,
-                    order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    total_amount REAL NOT NULL,
-                    status TEXT DEFAULT 'pending' CHECK(status IN ('pending', 'confirmed', 'processing', 'ready', 'delivered', 'cancelled')),
-                    delivery_date DATE,
-                    delivery_address TEXT,
-                    payment_method TEXT DEFAULT 'cash',
-                    notes TEXT,
-                    FOREIGN KEY (customer_id) REFERENCES users(user_id)
-                )
-            ''')
-            
-            # Order items table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS order_items (
-                    item_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    order_id INTEGER NOT NULL,
-                    product_id INTEGER NOT NULL,
-                    quantity_kg REAL NOT NULL,
-                    unit_price REAL NOT NULL,
-                    discount_percent REAL DEFAULT 0,
-                    final_price REAL NOT NULL,
-                    FOREIGN KEY (order_id) REFERENCES orders(order_id),
-                    FOREIGN KEY (product_id) REFERENCES products(product_id)
-                )
-            ''')
-            
-            # Stock transactions table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS stock_transactions (
-                    transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    product_id INTEGER NOT NULL,
-                    transaction_type TEXT NOT NULL,
-                    quantity_kg REAL NOT NULL,
-                    notes TEXT,
-                    transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (product_id) REFERENCES products(product_id)
-                )
-            ''')
-            
-            # Discount rules table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS discount_rules (
-                    rule_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    min_quantity_kg REAL NOT NULL,
-                    discount_percent REAL NOT NULL,
-                    applicable_categories TEXT,
-                    is_active INTEGER DEFAULT 1,
-                    start_date DATE,
-                    end_date DATE
-                )
-            ''')
-            
-            # Delivery routes table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS delivery_routes (
-                    route_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    route_name TEXT NOT NULL,
-                    employee_id INTEGER,
-                    delivery_date DATE NOT NULL,
-                    status TEXT DEFAULT 'scheduled',
-                    vehicle_info TEXT,
-                    notes TEXT,
-                    FOREIGN KEY (employee_id) REFERENCES users(user_id)
-                )
-            ''')
-            
-            # Route orders table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS route_orders (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    route_id INTEGER NOT NULL,
-                    order_id INTEGER NOT NULL,
-                    sequence_number INTEGER NOT NULL,
-                    FOREIGN KEY (route_id) REFERENCES delivery_routes(route_id),
-                    FOREIGN KEY (order_id) REFERENCES orders(order_id)
-                )
-            ''')
-            
-            # Inventory log table (for audit, optional)
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS inventory_log (
-                    log_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    product_id INTEGER NOT NULL,
-                    change_amount REAL NOT NULL,
-                    new_stock REAL NOT NULL,
-                    reason TEXT,
-                    logged_by INTEGER,
-                    log_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (product_id) REFERENCES products(product_id),
-                    FOREIGN KEY (logged_by) REFERENCES users(user_id)
-                )
-            ''')
-            
-            self.conn.commit()
-            print("✅ Database tables created successfully")
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                # Users table
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS users (
+                        user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        username TEXT UNIQUE NOT NULL,
+                        password TEXT NOT NULL,
+                        role TEXT NOT NULL CHECK(role IN ('customer', 'employee', 'manager', 'owner')),
+                        first_name TEXT NOT NULL,
+                        last_name TEXT NOT NULL,
+                        email TEXT UNIQUE NOT NULL,
+                        phone TEXT,
+                        address TEXT,
+                        registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                
+                # Products table (with category as text, unit, description)
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS products (
+                        product_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        name TEXT NOT NULL,
+                        category TEXT NOT NULL,
+                        description TEXT,
+                        unit TEXT DEFAULT 'kg',
+                        current_stock_kg REAL DEFAULT 0,
+                        min_stock_level REAL DEFAULT 10,
+                        is_active INTEGER DEFAULT 1,
+                        price_per_kg REAL DEFAULT 0
+                    )
+                ''')
+                
+                # Orders table
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS orders (
+                        order_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        customer_id INTEGER NOT NULL,
+                        order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        total_amount REAL NOT NULL,
+                        status TEXT DEFAULT 'pending' CHECK(status IN ('pending', 'confirmed', 'processing', 'ready', 'delivered', 'cancelled')),
+                        delivery_date DATE,
+                        delivery_address TEXT,
+                        payment_method TEXT DEFAULT 'cash',
+                        notes TEXT,
+                        FOREIGN KEY (customer_id) REFERENCES users(user_id)
+                    )
+                ''')
+                
+                # Order items table
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS order_items (
+                        item_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        order_id INTEGER NOT NULL,
+                        product_id INTEGER NOT NULL,
+                        quantity_kg REAL NOT NULL,
+                        unit_price REAL NOT NULL,
+                        discount_percent REAL DEFAULT 0,
+                        final_price REAL NOT NULL,
+                        FOREIGN KEY (order_id) REFERENCES orders(order_id),
+                        FOREIGN KEY (product_id) REFERENCES products(product_id)
+                    )
+                ''')
+                
+                # Stock transactions table
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS stock_transactions (
+                        transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        product_id INTEGER NOT NULL,
+                        transaction_type TEXT NOT NULL,
+                        quantity_kg REAL NOT NULL,
+                        notes TEXT,
+                        transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        FOREIGN KEY (product_id) REFERENCES products(product_id)
+                    )
+                ''')
+                
+                # Discount rules table
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS discount_rules (
+                        rule_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        min_quantity_kg REAL NOT NULL,
+                        discount_percent REAL NOT NULL,
+                        applicable_categories TEXT,
+                        is_active INTEGER DEFAULT 1,
+                        start_date DATE,
+                        end_date DATE
+                    )
+                ''')
+                
+                # Delivery routes table
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS delivery_routes (
+                        route_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        route_name TEXT NOT NULL,
+                        employee_id INTEGER,
+                        delivery_date DATE NOT NULL,
+                        status TEXT DEFAULT 'scheduled',
+                        vehicle_info TEXT,
+                        notes TEXT,
+                        FOREIGN KEY (employee_id) REFERENCES users(user_id)
+                    )
+                ''')
+                
+                # Route orders table
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS route_orders (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        route_id INTEGER NOT NULL,
+                        order_id INTEGER NOT NULL,
+                        sequence_number INTEGER NOT NULL,
+                        FOREIGN KEY (route_id) REFERENCES delivery_routes(route_id),
+                        FOREIGN KEY (order_id) REFERENCES orders(order_id)
+                    )
+                ''')
+                
+                # Inventory log table (for audit, optional)
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS inventory_log (
+                        log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        product_id INTEGER NOT NULL,
+                        change_amount REAL NOT NULL,
+                        new_stock REAL NOT NULL,
+                        reason TEXT,
+                        logged_by INTEGER,
+                        log_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        FOREIGN KEY (product_id) REFERENCES products(product_id),
+                        FOREIGN KEY (logged_by) REFERENCES users(user_id)
+                    )
+                ''')
+                
+                print("✅ Database tables created successfully")
             
         except sqlite3.Error as e:
             print(f"❌ Error creating tables: {e}")
     
+    def schema_version(self) -> int:
+        """Migration version of the database, 0 if it cannot be read"""
+        try:
+            with self.connection() as conn:
+                return get_schema_version(conn)
+        except sqlite3.Error as e:
+            print(f"❌ Schema version error: {e}")
+            return 0
+    
+    def run_migrations(self) -> List[int]:
+        """Apply any schema migrations the database has not seen yet"""
+        try:
+            with self.connection() as conn:
+                return migrate(conn)
+        except sqlite3.Error as e:
+            print(f"❌ Migration error: {e}")
+            return []
+    
     def create_default_data(self):
         """Seed database with default data"""
         try:
-            # Insert default admin user
-            admin_pass = self.hash_password("admin123")
-            self.cursor.execute('''
-                INSERT OR IGNORE INTO users (username, password, role, first_name, last_name, email)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', ('admin', admin_pass, 'owner', 'System', 'Admin', 'admin@jsfoods.com'))
-            
-            # Insert default users
-            default_users = [
-                ('john_customer', 'password123', 'customer', 'John', 'Doe', 'john@example.com', '1234567890', '123 Main St'),
-                ('jane_employee', 'password123', 'employee', 'Jane', 'Smith', 'jane@example.com', '9876543210', '456 Oak Ave'),
-                ('bob_manager', 'password123', 'manager', 'Bob', 'Johnson', 'bob@example.com', '5551234567', '789 Pine Rd')
-            ]
-            for user in default_users:
-                hashed = self.hash_password(user[1])
-                self.cursor.execute('''
-                    INSERT OR IGNORE INTO users (username, password, role, first_name, last_name, email, phone, address)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (user[0], hashed, user[2], user[3], user[4], user[5], user[6], user[7]))
-            
-            # Insert sample products
-            sample_products = [
-                ('Beef Sirloin', 'Beef', 'Premium beef sirloin', 12.50, 100, 20, 'kg'),
-                ('Chicken Breast', 'Poultry', 'Boneless chicken breast', 8.50, 150, 25, 'kg'),
-                ('Lamb Chops', 'Lamb', 'Fresh lamb chops', 15.00, 80, 15, 'kg'),
-                ('Pork Belly', 'Pork', 'Crispy pork belly', 10.00, 120, 20, 'kg'),
-                ('Whole Chicken', 'Poultry', 'Fresh whole chicken', 6.50, 200, 30, 'kg'),
-                ('Ribeye Steak', 'Beef', 'Premium ribeye', 18.00, 60, 10, 'kg')
-            ]
-            for prod in sample_products:
-                self.cursor.execute('''
-                    INSERT OR IGNORE INTO products (name, category, description, price_per_kg, current_stock_kg, min_stock_level, unit)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', prod)
-            
-            self.conn.commit()
-            print("✅ Default data inserted")
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                # Insert default admin user
+                admin_pass = self.hash_password("admin123")
+                cursor.execute('''
+                    INSERT OR IGNORE INTO users (username, password, role, first_name, last_name, email)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', ('admin', admin_pass, 'owner', 'System', 'Admin', 'admin@jsfoods.com'))
+                
+                # Insert default users
+                default_users = [
+                    ('john_customer', 'password123', 'customer', 'John', 'Doe', 'john@example.com', '1234567890', '123 Main St'),
+                    ('jane_employee', 'password123', 'employee', 'Jane', 'Smith', 'jane@example.com', '9876543210', '456 Oak Ave'),
+                    ('bob_manager', 'password123', 'manager', 'Bob', 'Johnson', 'bob@example.com', '5551234567', '789 Pine Rd')
+                ]
+                for user in default_users:
+                    hashed = self.hash_password(user[1])
+                    cursor.execute('''
+                        INSERT OR IGNORE INTO users (username, password, role, first_name, last_name, email, phone, address)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (user[0], hashed, user[2], user[3], user[4], user[5], user[6], user[7]))
+                
+                # Insert sample products
+                sample_products = [
+                    ('Beef Sirloin', 'Beef', 'Premium beef sirloin', 12.50, 100, 20, 'kg'),
+                    ('Chicken Breast', 'Poultry', 'Boneless chicken breast', 8.50, 150, 25, 'kg'),
+                    ('Lamb Chops', 'Lamb', 'Fresh lamb chops', 15.00, 80, 15, 'kg'),
+                    ('Pork Belly', 'Pork', 'Crispy pork belly', 10.00, 120, 20, 'kg'),
+                    ('Whole Chicken', 'Poultry', 'Fresh whole chicken', 6.50, 200, 30, 'kg'),
+                    ('Ribeye Steak', 'Beef', 'Premium ribeye', 18.00, 60, 10, 'kg')
+                ]
+                for prod in sample_products:
+                    cursor.execute('''
+                        INSERT OR IGNORE INTO products (name, category, description, price_per_kg, current_stock_kg, min_stock_level, unit)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''', prod)
+                
+                print("✅ Default data inserted")
         except sqlite3.Error as e:
             print(f"⚠️ Seed data error: {e}")
     
@@ -218,86 +671,96 @@ class DatabaseManager:
         """Hash password for security"""
         return hashlib.sha256(password.encode()).hexdigest()
     
+    @tracked_action
     def verify_user(self, username: str, password: str) -> Optional[Dict]:
         """Verify user credentials"""
         try:
-            self.cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
-            user = self.cursor.fetchone()
-            if not user:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
+                user = cursor.fetchone()
+                if not user:
+                    return None
+                hashed_input = self.hash_password(password)
+                if hashed_input == user['password']:
+                    return dict(user)
                 return None
-            hashed_input = self.hash_password(password)
-            if hashed_input == user['password']:
-                return dict(user)
-            return None
         except sqlite3.Error as e:
             print(f"❌ Login error: {e}")
             return None
     
+    @tracked_action
     def create_user(self, user_data: Dict) -> bool:
         """Create new user"""
         try:
-            hashed_password = self.hash_password(user_data['password'])
-            self.cursor.execute('''
-                INSERT INTO users (username, password, role, first_name, last_name, email, phone, address)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                user_data['username'],
-                hashed_password,
-                user_data['role'],
-                user_data['first_name'],
-                user_data['last_name'],
-                user_data['email'],
-                user_data.get('phone', ''),
-                user_data.get('address', '')
-            ))
-            self.conn.commit()
-            return True
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                hashed_password = self.hash_password(user_data['password'])
+                cursor.execute('''
+                    INSERT INTO users (username, password, role, first_name, last_name, email, phone, address)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    user_data['username'],
+                    hashed_password,
+                    user_data['role'],
+                    user_data['first_name'],
+                    user_data['last_name'],
+                    user_data['email'],
+                    user_data.get('phone', ''),
+                    user_data.get('address', '')
+                ))
+                return True
         except sqlite3.IntegrityError:
             return False
         except sqlite3.Error as e:
             print(f"❌ User creation error: {e}")
             return False
     
+    @tracked_action
     def get_users(self, role: str = None) -> List[Dict]:
         """Get users with optional role filter"""
         try:
-            if role:
-                self.cursor.execute("SELECT * FROM users WHERE role = ? ORDER BY last_name, first_name", (role,))
-            else:
-                self.cursor.execute("SELECT * FROM users ORDER BY last_name, first_name")
-            return [dict(row) for row in self.cursor.fetchall()]
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                if role:
+                    cursor.execute("SELECT * FROM users WHERE role = ? ORDER BY last_name, first_name", (role,))
+                else:
+                    cursor.execute("SELECT * FROM users ORDER BY last_name, first_name")
+                return [dict(row) for row in cursor.fetchall()]
         except sqlite3.Error as e:
             print(f"❌ Get users error: {e}")
             return []
     
+    @tracked_action
     def get_user_by_id(self, user_id: int) -> Optional[Dict]:
         """Get single user by ID"""
         try:
-            self.cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-            user = self.cursor.fetchone()
-            return dict(user) if user else None
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
+                user = cursor.fetchone()
+                return dict(user) if user else None
         except sqlite3.Error as e:
             print(f"❌ Get user error: {e}")
             return None
     
+    @tracked_action
     def get_user_stats(self) -> Dict:
         """Get user statistics"""
         try:
-            stats = {}
-            self.cursor.execute("SELECT COUNT(*) FROM users WHERE role = 'customer'")
-            stats['total_customers'] = self.cursor.fetchone()[0]
-            self.cursor.execute("SELECT COUNT(*) FROM users WHERE role = 'employee'")
-            stats['total_employees'] = self.cursor.fetchone()[0]
-            self.cursor.execute("SELECT COUNT(*) FROM users WHERE role = 'manager'")
-            stats['total_managers'] = self.cursor.fetchone()[0]
             month_start = datetime.now().replace(day=1).strftime("%Y-%m-%d")
-            self.cursor.execute("SELECT COUNT(*) FROM users WHERE registration_date >= ?", (month_start,))
-            stats['new_this_month'] = self.cursor.fetchone()[0]
-            return stats
+            return self.cached_query('''
+                SELECT COUNT(CASE WHEN role = 'customer' THEN 1 END) as total_customers,
+                       COUNT(CASE WHEN role = 'employee' THEN 1 END) as total_employees,
+                       COUNT(CASE WHEN role = 'manager' THEN 1 END) as total_managers,
+                       COUNT(CASE WHEN registration_date >= ? THEN 1 END) as new_this_month
+                FROM users
+            ''', (month_start,))[0]
         except sqlite3.Error as e:
             print(f"❌ Get user stats error: {e}")
             return {}
     
+    @tracked_action
     def get_products(self, category: str = None, active_only: bool = True) -> List[Dict]:
         """Get products with optional category filter"""
         try:
@@ -306,63 +769,149 @@ class DatabaseManager:
                 params = (category,)
                 if active_only:
                     query += " AND is_active = 1"
-                self.cursor.execute(query, params)
             else:
                 query = "SELECT * FROM products"
+                params = ()
                 if active_only:
                     query += " WHERE is_active = 1"
-                self.cursor.execute(query)
-            return [dict(row) for row in self.cursor.fetchall()]
+            return self.cached_query(query, params)
+        except sqlite3.Error as e:
+            print(f"❌ Get products error: {e}")
+            return []
+    
+    @tracked_action
+    def get_products_by_ids(self, product_ids: List[int]) -> List[Dict]:
+        """Get the products with these IDs, active or not, in ID order"""
+        if not product_ids:
+            return []
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    f"SELECT * FROM products WHERE product_id IN ({', '.join('?' for _ in product_ids)}) "
+                    "ORDER BY product_id",
+                    list(product_ids)
+                )
+                return [dict(row) for row in cursor.fetchall()]
         except sqlite3.Error as e:
             print(f"❌ Get products error: {e}")
             return []
     
+    @tracked_action
     def get_product_by_id(self, product_id: int) -> Optional[Dict]:
         """Get single product by ID"""
         try:
-            self.cursor.execute("SELECT * FROM products WHERE product_id = ?", (product_id,))
-            product = self.cursor.fetchone()
-            return dict(product) if product else None
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT * FROM products WHERE product_id = ?", (product_id,))
+                product = cursor.fetchone()
+                return dict(product) if product else None
         except sqlite3.Error as e:
             print(f"❌ Get product error: {e}")
             return None
     
+    @tracked_action
     def update_stock(self, product_id: int, change_amount: float, reason: str, user_id: int) -> bool:
         """Update product stock and log transaction"""
-        try:
-            # Get current stock
-            self.cursor.execute("SELECT current_stock_kg FROM products WHERE product_id = ?", (product_id,))
-            result = self.cursor.fetchone()
-            if not result:
+        # Movement type logged to stock_transactions
+        transaction_type = "adjustment"
+        if change_amount > 0:
+            transaction_type = "receive"
+        elif change_amount < 0:
+            transaction_type = "sale"
+        
+        def write(conn):
+            cursor = conn.cursor()
+            # Update product stock in place, so the change applies to the latest level
+            cursor.execute(
+                "UPDATE products SET current_stock_kg = current_stock_kg + ? WHERE product_id = ?",
+                (change_amount, product_id)
+            )
+            if cursor.rowcount == 0:
                 return False
-            current_stock = result[0]
-            new_stock = current_stock + change_amount
-            
-            # Update product stock
-            self.cursor.execute("UPDATE products SET current_stock_kg = ? WHERE product_id = ?", (new_stock, product_id))
-            
-            # Log to stock_transactions
-            transaction_type = "adjustment"
-            if change_amount > 0:
-                transaction_type = "receive"
-            elif change_amount < 0:
-                transaction_type = "sale"
-            
-            self.cursor.execute('''
-                INSERT INTO stock_transactions (product_id, transaction_type, quantity_kg, notes)
-                VALUES (?, ?, ?, ?)
-            ''', (product_id, transaction_type, abs(change_amount), reason))
-            
-            self.conn.commit()
+            cursor.execute('''
+                INSERT INTO stock_transactions (product_id, transaction_type, quantity_kg, notes, user_id)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (product_id, transaction_type, abs(change_amount), reason, user_id))
             return True
+        
+        try:
+            return self.write_transaction(write)
         except sqlite3.Error as e:
             print(f"❌ Update stock error: {e}")
             return False
     
+    @tracked_action
+    def receive_stock(self, product_id: int, quantity: float, notes: str, user_id: int = None) -> Optional[float]:
+        """Book a delivery into stock and return the new stock level
+        
+        Returns None if the product does not exist or the write fails.
+        """
+        def write(conn):
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE products SET current_stock_kg = current_stock_kg + ? WHERE product_id = ?",
+                (quantity, product_id)
+            )
+            if cursor.rowcount == 0:
+                return None
+            cursor.execute('''
+                INSERT INTO stock_transactions (product_id, transaction_type, quantity_kg, notes, user_id)
+                VALUES (?, 'receive', ?, ?, ?)
+            ''', (product_id, quantity, notes, user_id))
+            cursor.execute("SELECT current_stock_kg FROM products WHERE product_id = ?", (product_id,))
+            return cursor.fetchone()[0]
+        
+        try:
+            new_stock = self.write_transaction(write)
+            if new_stock is None:
+                print(f"❌ Receive stock error: product {product_id} not found")
+            return new_stock
+        except sqlite3.Error as e:
+            print(f"❌ Receive stock error: {e}")
+            return None
+    
+    @tracked_action
+    def adjust_stock(self, product_id: int, amount: float, notes: str, user_id: int = None) -> Optional[float]:
+        """Correct a stock level by amount kg (negative removes) and return the new level
+        
+        Returns None if the product does not exist, the removal is more than
+        is in stock, or the write fails.
+        """
+        def write(conn):
+            cursor = conn.cursor()
+            # The guard refuses a removal larger than the stock at the moment of writing
+            cursor.execute('''
+                UPDATE products SET current_stock_kg = current_stock_kg + ?
+                WHERE product_id = ? AND current_stock_kg + ? >= 0
+            ''', (amount, product_id, amount))
+            updated = cursor.rowcount == 1
+            if updated:
+                cursor.execute('''
+                    INSERT INTO stock_transactions (product_id, transaction_type, quantity_kg, notes, user_id)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (product_id, "adjustment_add" if amount > 0 else "adjustment_remove", abs(amount), notes,
+                      user_id))
+            cursor.execute("SELECT current_stock_kg FROM products WHERE product_id = ?", (product_id,))
+            result = cursor.fetchone()
+            return updated, result[0] if result else None
+        
+        try:
+            updated, stock = self.write_transaction(write)
+            if stock is None:
+                print(f"❌ Adjust stock error: product {product_id} not found")
+            elif not updated:
+                print(f"❌ Adjust stock error: cannot remove {-amount} kg, only {stock} kg in stock")
+            return stock if updated else None
+        except sqlite3.Error as e:
+            print(f"❌ Adjust stock error: {e}")
+            return None
+    
+    @tracked_action
     def get_low_stock_items(self, threshold_percent: float = 0.2) -> List[Dict]:
         """Get items with low stock"""
         try:
-            self.cursor.execute('''
+            return self.cached_query('''
                 SELECT *,
                        (current_stock_kg / min_stock_level) as stock_percentage
                 FROM products
@@ -370,75 +919,125 @@ class DatabaseManager:
                 AND current_stock_kg <= min_stock_level * ?
                 ORDER BY stock_percentage ASC
             ''', (threshold_percent,))
-            return [dict(row) for row in self.cursor.fetchall()]
         except sqlite3.Error as e:
             print(f"❌ Low stock error: {e}")
             return []
     
+    @tracked_action
     def create_order(self, order_data: Dict, items: List[Dict]) -> Optional[int]:
-        """Create new order with items"""
-        try:
-            self.cursor.execute("BEGIN TRANSACTION")
-            self.cursor.execute('''
-                INSERT INTO orders (customer_id, total_amount, delivery_date, delivery_address, payment_method, notes)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                order_data['customer_id'],
-                order_data['total_amount'],
-                order_data.get('delivery_date'),
-                order_data.get('delivery_address'),
-                order_data.get('payment_method', 'cash'),
-                order_data.get('notes', '')
-            ))
-            order_id = self.cursor.lastrowid
+        """Create new order with items in a single transaction
+        
+        Discounts come from the in-memory rule engine, the lines go in
+        with one batched insert and stock is decremented in SQL with a guard so
+        an order can never take a product below zero. Nothing is written unless
+        every line succeeds, and the order lands with exactly one commit.
+        Pricing happens before the write lock is taken.
+        """
+        try:
+            lines = [
+                (item['product_id'], item['quantity_kg'], item['unit_price'], priced['discount_percent'], priced['final_price'])
+                for item, priced in zip(items, self.price_cart(items))
+            ]
             
-            for item in items:
-                discount = self.calculate_discount(item['product_id'], item['quantity_kg'])
-                final_price = item['quantity_kg'] * item['unit_price'] * (1 - discount/100)
-                self.cursor.execute('''
+            def write(conn):
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO orders (customer_id, total_amount, delivery_date, delivery_address, payment_method, notes)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (
+                    order_data['customer_id'],
+                    order_data['total_amount'],
+                    order_data.get('delivery_date'),
+                    order_data.get('delivery_address'),
+                    order_data.get('payment_method', 'cash'),
+                    order_data.get('notes', '')
+                ))
+                order_id = cursor.lastrowid
+                
+                cursor.executemany('''
                     INSERT INTO order_items (order_id, product_id, quantity_kg, unit_price, discount_percent, final_price)
                     VALUES (?, ?, ?, ?, ?, ?)
-                ''', (order_id, item['product_id'], item['quantity_kg'], item['unit_price'], discount, final_price))
-                # Update stock (negative change)
-                self.update_stock(item['product_id'], -item['quantity_kg'], f"Order #{order_id}", order_data['customer_id'])
+                ''', [(order_id,) + line for line in lines])
+                
+                # Decrement stock in one statement; the guard skips any product that
+                # would go below zero, so a short result means the order must fail
+                stock_changes = {}
+                for product_id, quantity, *_ in lines:
+                    stock_changes[product_id] = stock_changes.get(product_id, 0) + quantity
+                stock_after = {}
+                if stock_changes:
+                    cart_values = ", ".join("(?, ?)" for _ in stock_changes)
+                    params = [value for change in stock_changes.items() for value in change]
+                    stock_after = dict(cursor.execute(f'''
+                        UPDATE products
+                        SET current_stock_kg = current_stock_kg - cart.quantity
+                        FROM (SELECT column1 AS product_id, column2 AS quantity FROM (VALUES {cart_values})) AS cart
+                        WHERE products.product_id = cart.product_id
+                        AND products.current_stock_kg >= cart.quantity
+                        RETURNING products.product_id, products.current_stock_kg
+                    ''', params).fetchall())
+                    if len(stock_after) != len(stock_changes):
+                        raise sqlite3.IntegrityError("Insufficient stock for one or more items")
+                
+                # One sale per line, each with the stock left after it, worked
+                # back from the stock left after the whole order so the last
+                # balance matches it exactly. The trigger cannot do this: it
+                # would start a product's first movement from the stock left
+                # after all of its lines, not just that one.
+                balances = dict(stock_after)
+                movements = []
+                for product_id, quantity, *_ in reversed(lines):
+                    movements.append((product_id, quantity, f"Order #{order_id}", balances[product_id],
+                                      order_data['customer_id']))
+                    balances[product_id] += quantity
+                movements.reverse()
+                cursor.executemany('''
+                    INSERT INTO stock_transactions (product_id, transaction_type, quantity_kg, notes, balance_kg, user_id)
+                    VALUES (?, 'sale', ?, ?, ?, ?)
+                ''', movements)
+                
+                return order_id
             
-            self.conn.commit()
-            return order_id
+            return self.write_transaction(write)
         except sqlite3.Error as e:
-            self.conn.rollback()
             print(f"❌ Create order error: {e}")
             return None
     
+    @tracked_action
+    def price_cart(self, items: List[Dict]) -> List[Dict]:
+        """Price every line of a cart in one call
+        
+        Returns a dict with discount_percent and final_price per item, in the
+        order given, using the in-memory discount engine.
+        """
+        if not items:
+            return []
+        try:
+            return self.discounts.price_cart(items)
+        except sqlite3.Error as e:
+            print(f"❌ Discount calculation error: {e}")
+            return [
+                {'discount_percent': 0.0, 'final_price': item['quantity_kg'] * item['unit_price']}
+                for item in items
+            ]
+    
+    def calculate_cart_discounts(self, items: List[Dict]) -> List[float]:
+        """Calculate the discount percentage for every line of a cart"""
+        return [line['discount_percent'] for line in self.price_cart(items)]
+    
     def calculate_discount(self, product_id: int, quantity: float) -> float:
         """Calculate discount based on quantity and product category"""
         try:
-            # Get product category
-            self.cursor.execute("SELECT category FROM products WHERE product_id = ?", (product_id,))
-            row = self.cursor.fetchone()
-            if not row:
-                return 0.0
-            category = row[0]
-            # Get applicable discount rules
-            self.cursor.execute('''
-                SELECT discount_percent FROM discount_rules 
-                WHERE min_quantity_kg <= ? 
-                AND (applicable_categories IS NULL OR applicable_categories LIKE ?)
-                AND is_active = 1
-                AND (start_date IS NULL OR start_date <= date('now'))
-                AND (end_date IS NULL OR end_date >= date('now'))
-                ORDER BY min_quantity_kg DESC
-                LIMIT 1
-            ''', (quantity, f"%{category}%"))
-            result = self.cursor.fetchone()
-            return result[0] if result else 0.0
+            return self.discounts.discount_for(product_id, quantity)
         except sqlite3.Error as e:
             print(f"❌ Discount calculation error: {e}")
             return 0.0
     
+    @tracked_action
     def get_user_orders(self, user_id: int, limit: int = 50) -> List[Dict]:
         """Get orders for a specific user"""
         try:
-            self.cursor.execute('''
+            return self.cached_query('''
                 SELECT o.*, 
                        (SELECT COUNT(*) FROM order_items WHERE order_id = o.order_id) as item_count
                 FROM orders o
@@ -446,121 +1045,482 @@ class DatabaseManager:
                 ORDER BY o.order_date DESC
                 LIMIT ?
             ''', (user_id, limit))
-            return [dict(row) for row in self.cursor.fetchall()]
         except sqlite3.Error as e:
             print(f"❌ Get user orders error: {e}")
             return []
     
+    @tracked_action
+    def get_orders_page(self, status: str = None, customer_id: int = None, start_date: str = None,
+                        end_date: str = None, after: Tuple[str, int] = None,
+                        limit: int = ORDER_PAGE_SIZE,
+                        order_ids: List[int] = None) -> Tuple[List[Dict], Optional[Tuple[str, int]]]:
+        """One page of orders, newest first, with optional filters
+        
+        Pages are keyed on (order_date, order_id) rather than OFFSET, so every
+        page costs the same however far back it is. Pass the cursor returned
+        with one page as `after` to get the next; it is None on the last page.
+        Dates are whole days and inclusive. order_ids limits the page to those
+        orders, which is how portals re-read rows the changes feed reports.
+        """
+        conditions = []
+        params = []
+        if order_ids is not None:
+            conditions.append(f"o.order_id IN ({', '.join('?' for _ in order_ids) or 'NULL'})")
+            params.extend(order_ids)
+        if status:
+            conditions.append("o.status = ?")
+            params.append(status)
+        if customer_id is not None:
+            conditions.append("o.customer_id = ?")
+            params.append(customer_id)
+        if start_date:
+            conditions.append("o.order_date >= date(?)")
+            params.append(start_date)
+        if end_date:
+            conditions.append("o.order_date < date(?, '+1 day')")
+            params.append(end_date)
+        if after:
+            conditions.append("(o.order_date, o.order_id) < (?, ?)")
+            params.extend(after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT o.order_id, o.customer_id,
+                           u.first_name || ' ' || u.last_name as customer,
+                           o.order_date, o.total_amount, o.status, o.delivery_date
+                    FROM orders o
+                    JOIN users u ON o.customer_id = u.user_id
+                    {where}
+                    ORDER BY o.order_date DESC, o.order_id DESC
+                    LIMIT ?
+                ''', params + [limit])
+                orders = [dict(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"❌ Get orders page error: {e}")
+            return [], None
+        if len(orders) < limit:
+            return orders, None
+        return orders, (orders[-1]['order_date'], orders[-1]['order_id'])
+    
+    @tracked_action
     def get_order_details(self, order_id: int) -> Tuple[Optional[Dict], List[Dict]]:
         """Get order details with items"""
         try:
-            self.cursor.execute("SELECT * FROM orders WHERE order_id = ?", (order_id,))
-            order = self.cursor.fetchone()
-            if not order:
-                return None, []
-            self.cursor.execute('''
-                SELECT oi.*, p.name as product_name, p.category
-                FROM order_items oi
-                JOIN products p ON oi.product_id = p.product_id
-                WHERE oi.order_id = ?
-            ''', (order_id,))
-            items = [dict(row) for row in self.cursor.fetchall()]
-            return dict(order), items
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT * FROM orders WHERE order_id = ?", (order_id,))
+                order = cursor.fetchone()
+                if not order:
+                    return None, []
+                cursor.execute('''
+                    SELECT oi.*, p.name as product_name, p.category
+                    FROM order_items oi
+                    JOIN products p ON oi.product_id = p.product_id
+                    WHERE oi.order_id = ?
+                ''', (order_id,))
+                items = [dict(row) for row in cursor.fetchall()]
+                return dict(order), items
         except sqlite3.Error as e:
             print(f"❌ Get order details error: {e}")
             return None, []
     
+    @tracked_action
     def get_sales_report(self, start_date: str, end_date: str) -> Dict:
-        """Generate sales report for date range"""
-        try:
-            self.cursor.execute('''
-                SELECT 
-                    COUNT(*) as total_orders,
-                    SUM(total_amount) as total_revenue,
-                    AVG(total_amount) as avg_order_value
-                FROM orders 
-                WHERE order_date BETWEEN ? AND ?
-                AND status != 'cancelled'
-            ''', (start_date, end_date))
-            totals = dict(self.cursor.fetchone()) or {}
-            self.cursor.execute('''
-                SELECT 
-                    p.category,
-                    SUM(oi.quantity_kg) as total_kg,
-                    SUM(oi.final_price) as total_revenue,
-                    COUNT(DISTINCT o.order_id) as order_count
-                FROM order_items oi
-                JOIN orders o ON oi.order_id = o.order_id
-                JOIN products p ON oi.product_id = p.product_id
-                WHERE o.order_date BETWEEN ? AND ?
-                AND o.status != 'cancelled'
-                GROUP BY p.category
-                ORDER BY total_revenue DESC
-            ''', (start_date, end_date))
-            by_category = [dict(row) for row in self.cursor.fetchall()]
-            self.cursor.execute('''
-                SELECT 
-                    p.name,
-                    p.category,
-                    SUM(oi.quantity_kg) as total_kg,
-                    SUM(oi.final_price) as total_revenue,
-                    COUNT(*) as times_ordered
-                FROM order_items oi
-                JOIN orders o ON oi.order_id = o.order_id
-                JOIN products p ON oi.product_id = p.product_id
-                WHERE o.order_date BETWEEN ? AND ?
-                AND o.status != 'cancelled'
-                GROUP BY p.product_id
-                ORDER BY total_revenue DESC
-                LIMIT 10
-            ''', (start_date, end_date))
-            top_products = [dict(row) for row in self.cursor.fetchall()]
-            return {
-                'period': {'start': start_date, 'end': end_date},
-                'totals': totals,
-                'by_category': by_category,
-                'top_products': top_products
-            }
+        """Generate sales report for date range
+        
+        Answered from the trigger-maintained sales rollups, so the cost
+        depends on the number of days rather than the number of orders.
+        Both dates are whole days and inclusive.
+        """
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT 
+                        COALESCE(SUM(order_count), 0) as total_orders,
+                        CASE WHEN SUM(order_count) > 0 THEN SUM(revenue) END as total_revenue,
+                        SUM(revenue) / NULLIF(SUM(order_count), 0) as avg_order_value
+                    FROM sales_daily 
+                    WHERE day BETWEEN date(?) AND date(?)
+                ''', (start_date, end_date))
+                totals = dict(cursor.fetchone()) or {}
+                cursor.execute('''
+                    SELECT 
+                        category,
+                        SUM(kg) as total_kg,
+                        SUM(revenue) as total_revenue,
+                        SUM(order_count) as order_count
+                    FROM sales_category_daily
+                    WHERE day BETWEEN date(?) AND date(?)
+                    GROUP BY category
+                    HAVING SUM(line_count) > 0
+                    ORDER BY total_revenue DESC
+                ''', (start_date, end_date))
+                by_category = [dict(row) for row in cursor.fetchall()]
+                cursor.execute('''
+                    SELECT 
+                        p.name,
+                        r.category,
+                        SUM(r.kg) as total_kg,
+                        SUM(r.revenue) as total_revenue,
+                        SUM(r.line_count) as times_ordered
+                    FROM sales_rollup r
+                    JOIN products p ON r.product_id = p.product_id
+                    WHERE r.day BETWEEN date(?) AND date(?)
+                    GROUP BY r.product_id
+                    HAVING SUM(r.line_count) > 0
+                    ORDER BY total_revenue DESC
+                    LIMIT 10
+                ''', (start_date, end_date))
+                top_products = [dict(row) for row in cursor.fetchall()]
+                return {
+                    'period': {'start': start_date, 'end': end_date},
+                    'totals': totals,
+                    'by_category': by_category,
+                    'top_products': top_products
+                }
         except sqlite3.Error as e:
             print(f"❌ Sales report error: {e}")
             return {}
     
+    @tracked_action
+    def get_daily_revenue(self, start_date: str, end_date: str) -> List[Dict]:
+        """Revenue per day between two dates (inclusive) from the sales rollup
+        
+        Days with no orders are left out; the chart fills them in.
+        """
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT day, revenue
+                    FROM sales_daily
+                    WHERE day BETWEEN ? AND ?
+                    AND order_count > 0
+                    ORDER BY day
+                ''', (start_date, end_date))
+                return [dict(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"❌ Daily revenue error: {e}")
+            return []
+    
+    @tracked_action
+    def get_revenue(self, start_date: str, end_date: str) -> float:
+        """Total revenue of non-cancelled orders between two dates (inclusive)"""
+        try:
+            with self.connection() as conn:
+                row = conn.execute(
+                    "SELECT SUM(revenue) FROM sales_daily WHERE day BETWEEN date(?) AND date(?)",
+                    (start_date, end_date)
+                ).fetchone()
+                return row[0] or 0
+        except sqlite3.Error as e:
+            print(f"❌ Revenue total error: {e}")
+            return 0
+    
+    @tracked_action
+    def rebuild_sales_rollup(self) -> bool:
+        """Recompute the sales rollups from orders and order_items
+        
+        The triggers keep them current; this is for repairs, e.g. after rows
+        were changed with triggers disabled.
+        """
+        try:
+            with self.transaction() as conn:
+                for statement in SALES_ROLLUP_REBUILD:
+                    conn.execute(statement)
+                return True
+        except sqlite3.Error as e:
+            print(f"❌ Rebuild sales rollup error: {e}")
+            return False
+    
+    # Stock ledger. Every movement in stock_transactions carries the stock
+    # level after it (balance_kg), kept by a trigger, so a level at any
+    # moment is one index lookup. Ledger order is (transaction_date,
+    # transaction_id); movements are only ever appended, never backdated.
+    
+    @tracked_action
+    def get_stock_as_of(self, when: str, product_id: int = None) -> List[Dict]:
+        """Stock level of each product (or one product) at a moment in the past
+        
+        when is a 'YYYY-MM-DD HH:MM:SS' timestamp in the same clock as
+        transaction_date. A product with no movement before then had the
+        stock its first movement started from.
+        """
+        try:
+            with self.connection() as conn:
+                return [dict(row) for row in conn.execute(f'''
+                    SELECT p.product_id, p.name, p.category,
+                           ROUND(COALESCE(
+                               (SELECT st.balance_kg FROM stock_transactions st
+                                WHERE st.product_id = p.product_id AND st.transaction_date <= :when
+                                ORDER BY st.transaction_date DESC, st.transaction_id DESC LIMIT 1),
+                               (SELECT st.balance_kg - {signed_quantity("st")} FROM stock_transactions st
+                                WHERE st.product_id = p.product_id
+                                ORDER BY st.transaction_date, st.transaction_id LIMIT 1),
+                               p.current_stock_kg
+                           ), 3) AS stock_kg
+                    FROM products p
+                    WHERE :product_id IS NULL OR p.product_id = :product_id
+                    ORDER BY p.product_id
+                ''', {'when': when, 'product_id': product_id})]
+        except sqlite3.Error as e:
+            print(f"❌ Stock as of error: {e}")
+            return []
+    
+    @tracked_action
+    def get_stock_movement(self, start_date: str, end_date: str, product_id: int = None) -> List[Dict]:
+        """Opening and closing stock and the kg moved by type, per product, between two dates
+        
+        Dates are inclusive 'YYYY-MM-DD'. Only the movements inside the
+        period are read; the opening and closing levels are lookups.
+        Products that did not move are left out.
+        """
+        try:
+            with self.connection() as conn:
+                return [dict(row) for row in conn.execute(f'''
+                    SELECT p.product_id, p.name, p.category,
+                           ROUND(first.balance_kg - {signed_quantity("first")}, 3) AS opening_kg,
+                           ROUND(moved.received_kg, 3) AS received_kg, ROUND(moved.sold_kg, 3) AS sold_kg,
+                           ROUND(moved.adjusted_kg, 3) AS adjusted_kg, moved.movements,
+                           ROUND((SELECT st.balance_kg FROM stock_transactions st
+                                  WHERE st.product_id = p.product_id AND st.transaction_date < date(:end, '+1 day')
+                                  ORDER BY st.transaction_date DESC, st.transaction_id DESC LIMIT 1), 3) AS closing_kg
+                    FROM (
+                        SELECT product_id,
+                               SUM(CASE WHEN transaction_type IN ('receive', 'initial') THEN quantity_kg ELSE 0 END) AS received_kg,
+                               SUM(CASE WHEN transaction_type = 'sale' THEN quantity_kg ELSE 0 END) AS sold_kg,
+                               SUM(CASE WHEN transaction_type LIKE 'adjustment%' THEN {signed_quantity("stock_transactions")} ELSE 0 END) AS adjusted_kg,
+                               COUNT(*) AS movements
+                        FROM stock_transactions
+                        WHERE transaction_date >= :start AND transaction_date < date(:end, '+1 day')
+                        AND (:product_id IS NULL OR product_id = :product_id)
+                        GROUP BY product_id
+                    ) AS moved
+                    JOIN products p ON p.product_id = moved.product_id
+                    JOIN stock_transactions first ON first.transaction_id = (
+                        SELECT st.transaction_id FROM stock_transactions st
+                        WHERE st.product_id = moved.product_id AND st.transaction_date >= :start
+                        ORDER BY st.transaction_date, st.transaction_id LIMIT 1
+                    )
+                    ORDER BY p.product_id
+                ''', {'start': start_date, 'end': end_date, 'product_id': product_id})]
+        except sqlite3.Error as e:
+            print(f"❌ Stock movement error: {e}")
+            return []
+    
+    @tracked_action
+    def reconcile_stock(self, tolerance: float = 0.001) -> List[Dict]:
+        """Products whose stock level does not match their ledger
+        
+        Starts from each product's latest snapshot and replays only the
+        movements logged after it, so the cost grows with the time since
+        the last snapshot, not with the history. A product is listed when
+        the replayed level, the ledger's newest balance and
+        products.current_stock_kg do not all agree within tolerance kg.
+        """
+        try:
+            with self.connection() as conn:
+                rows = conn.execute(f'''
+                    WITH latest AS (
+                        -- Without a snapshot, replay from the product's first movement
+                        SELECT p.product_id, p.name, p.current_stock_kg, s.transaction_id, s.transaction_date,
+                               CASE WHEN s.product_id IS NULL THEN (
+                                        SELECT st.balance_kg - {signed_quantity("st")} FROM stock_transactions st
+                                        WHERE st.product_id = p.product_id
+                                        ORDER BY st.transaction_date, st.transaction_id LIMIT 1)
+                                    WHEN s.transaction_id IS NULL THEN s.stock_kg
+                                    ELSE s.balance_kg END AS snapshot_kg
+                        FROM products p
+                        LEFT JOIN stock_snapshots s ON s.product_id = p.product_id AND s.snapshot_date = (
+                            SELECT MAX(snapshot_date) FROM stock_snapshots WHERE product_id = p.product_id
+                        )
+                    )
+                    SELECT latest.product_id, latest.name, latest.current_stock_kg AS stock_kg,
+                           latest.snapshot_kg + COALESCE((
+                               SELECT SUM({signed_quantity("st")}) FROM stock_transactions st
+                               WHERE st.product_id = latest.product_id
+                               AND st.transaction_date >= COALESCE(latest.transaction_date, '')
+                               AND st.transaction_id > COALESCE(latest.transaction_id, 0)
+                           ), 0) AS replayed_kg,
+                           (SELECT st.balance_kg FROM stock_transactions st
+                            WHERE st.product_id = latest.product_id
+                            ORDER BY st.transaction_date DESC, st.transaction_id DESC LIMIT 1) AS ledger_kg
+                    FROM latest
+                ''').fetchall()
+        except sqlite3.Error as e:
+            print(f"❌ Reconcile stock error: {e}")
+            return []
+        mismatches = []
+        for row in rows:
+            row = dict(row)
+            # A product that never moved has no ledger to disagree with
+            if row['ledger_kg'] is None:
+                continue
+            levels = (row['stock_kg'], row['replayed_kg'], row['ledger_kg'])
+            if max(levels) - min(levels) > tolerance:
+                mismatches.append(row)
+        return mismatches
+    
+    def snapshot_stock(self, snapshot_date: str = None) -> int:
+        """Record today's (or snapshot_date's) per-product stock snapshot and return how many products"""
+        try:
+            with self.transaction() as conn:
+                return conn.execute(
+                    STOCK_SNAPSHOT, (snapshot_date or datetime.now().strftime('%Y-%m-%d'),)
+                ).rowcount
+        except sqlite3.Error as e:
+            print(f"⚠️ Stock snapshot error: {e}")
+            return 0
+    
+    @tracked_action
+    def rebuild_stock_ledger(self) -> bool:
+        """Recompute every running balance from current stock and snapshot it
+        
+        The trigger keeps balances current; this is for repairs, e.g. after
+        movements were edited, deleted or backdated.
+        """
+        try:
+            with self.transaction() as conn:
+                for statement in STOCK_LEDGER_REBUILD:
+                    conn.execute(statement)
+                conn.execute("DELETE FROM stock_snapshots")
+                conn.execute(STOCK_SNAPSHOT, (datetime.now().strftime('%Y-%m-%d'),))
+                return True
+        except sqlite3.Error as e:
+            print(f"❌ Rebuild stock ledger error: {e}")
+            return False
+    
+    def latest_change_id(self) -> int:
+        """ID of the newest row in the changes feed, 0 if it is empty"""
+        try:
+            with self.connection() as conn:
+                return conn.execute("SELECT COALESCE(MAX(change_id), 0) FROM changes").fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"❌ Changes feed error: {e}")
+            return 0
+    
+    def get_changes(self, after_id: int, limit: int) -> List[Dict]:
+        """Rows of the changes feed newer than after_id, oldest first
+        
+        A first row whose change_id is not after_id + 1 means the rows in
+        between were pruned before they were read.
+        """
+        try:
+            with self.connection() as conn:
+                return [dict(row) for row in conn.execute('''
+                    SELECT change_id, table_name, row_id, operation
+                    FROM changes
+                    WHERE change_id > ?
+                    ORDER BY change_id
+                    LIMIT ?
+                ''', (after_id, limit))]
+        except sqlite3.Error as e:
+            print(f"❌ Changes feed error: {e}")
+            return []
+    
+    def prune_changes(self, keep: int = CHANGE_RETENTION) -> int:
+        """Delete all but the newest keep rows of the changes feed and return how many went"""
+        try:
+            with self.transaction() as conn:
+                return conn.execute(
+                    "DELETE FROM changes WHERE change_id <= (SELECT MAX(change_id) FROM changes) - ?",
+                    (keep,)
+                ).rowcount
+        except sqlite3.Error as e:
+            print(f"⚠️ Changes feed prune error: {e}")
+            return 0
+    
+    @tracked_action
     def create_delivery_route(self, route_data: Dict) -> bool:
         """Create delivery route"""
         try:
-            self.cursor.execute('''
-                INSERT INTO delivery_routes (route_name, employee_id, delivery_date, vehicle_info, notes)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                route_data['route_name'],
-                route_data.get('employee_id'),
-                route_data['delivery_date'],
-                route_data.get('vehicle_info', ''),
-                route_data.get('notes', '')
-            ))
-            self.conn.commit()
-            return True
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO delivery_routes (route_name, employee_id, delivery_date, vehicle_info, notes)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (
+                    route_data['route_name'],
+                    route_data.get('employee_id'),
+                    route_data['delivery_date'],
+                    route_data.get('vehicle_info', ''),
+                    route_data.get('notes', '')
+                ))
+                return True
         except sqlite3.Error as e:
             print(f"❌ Create route error: {e}")
             return False
     
+    @tracked_action
     def assign_order_to_route(self, route_id: int, order_id: int, sequence: int) -> bool:
         """Assign order to delivery route"""
         try:
-            self.cursor.execute('''
-                INSERT INTO route_orders (route_id, order_id, sequence_number)
-                VALUES (?, ?, ?)
-            ''', (route_id, order_id, sequence))
-            self.conn.commit()
-            return True
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO route_orders (route_id, order_id, sequence_number)
+                    VALUES (?, ?, ?)
+                ''', (route_id, order_id, sequence))
+                return True
         except sqlite3.Error as e:
             print(f"❌ Assign order to route error: {e}")
             return False
     
     def close(self):
-        """Close database connection"""
-        if self.conn:
-            self.conn.close()
+        """Close database connections"""
+        self._stop_maintenance.set()
+        if self._maintenance_thread is not None:
+            self._maintenance_thread.join()
+            self._maintenance_thread = None
+        if self.pool:
+            # SQLite recommends PRAGMA optimize just before closing
+            self.run_maintenance()
+            self.pool.close_all()
+            self.pool = None
+        if self.cache:
+            self.cache.close()
+            self.cache = None
+        self.query_stats.close()
+
+
+class LazyDatabaseManager:
+    """Stands in for the shared DatabaseManager until it is first used
+    
+    Importing this module no longer touches the database: the manager is
+    built, once, on the first attribute access from any thread, so windows
+    can appear before the connection pool and schema check have run.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        self._args = args
+        self._kwargs = kwargs
+        self._manager = None
+        self._lock = threading.Lock()
+    
+    @property
+    def is_open(self) -> bool:
+        return self._manager is not None
+    
+    def open(self) -> DatabaseManager:
+        """Build the manager now if it has not been built yet"""
+        if self._manager is None:
+            with self._lock:
+                if self._manager is None:
+                    self._manager = DatabaseManager(*self._args, **self._kwargs)
+        return self._manager
+    
+    def __getattr__(self, name):
+        return getattr(self.open(), name)
+    
+    def close(self):
+        """Close the manager if it was ever opened; the next use reopens it"""
+        with self._lock:
+            if self._manager is not None:
+                self._manager.close()
+                self._manager = None
 
-# Singleton instance
-db = DatabaseManager()
\ No newline at end of file
+# Singleton instance, opened on first use
+db = LazyDatabaseManager()
@@ -0,0 +1,567 @@
+"""
+JS Foods Dataset Generator
+Fills a fresh database with realistic data at production scale
+"""
+
+import argparse
+import itertools
+import math
+import os
+import random
+import sqlite3
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from statistics import NormalDist
+from typing import Dict, List, Optional, Tuple
+
+from jsfoods_database import DatabaseManager
+from jsfoods_migrations import STOCK_LEDGER_REBUILD, STOCK_SNAPSHOT
+
+# Preset sizes; any value can be overridden on the command line
+SCALES = {
+    'small': {'customers': 200, 'employees': 5, 'products': 60, 'orders': 10000, 'years': 1},
+    'medium': {'customers': 2000, 'employees': 12, 'products': 250, 'orders': 100000, 'years': 2},
+    'large': {'customers': 20000, 'employees': 40, 'products': 600, 'orders': 1000000, 'years': 3},
+}
+DEFAULT_SCALE = 'medium'
+DEFAULT_SEED = 1
+# Rows buffered before each executemany
+BATCH_SIZE = 50000
+# Zipf exponents: a few products and customers account for most of the trade
+PRODUCT_ZIPF = 1.1
+CUSTOMER_ZIPF = 0.8
+
+CATEGORIES = {
+    'Beef': (['Sirloin', 'Ribeye', 'Rump', 'Brisket', 'Mince', 'Fillet', 'Shin', 'Topside', 'Short Rib', 'Diced Steak'], 9.0, 32.0),
+    'Pork': (['Belly', 'Loin', 'Shoulder', 'Chops', 'Ribs', 'Sausages', 'Mince', 'Tenderloin', 'Gammon'], 5.0, 14.0),
+    'Poultry': (['Chicken Breast', 'Chicken Thighs', 'Whole Chicken', 'Chicken Wings', 'Drumsticks', 'Turkey Crown', 'Duck Breast'], 4.0, 16.0),
+    'Lamb': (['Chops', 'Leg', 'Shoulder', 'Rack', 'Mince', 'Shank', 'Neck Fillet'], 10.0, 28.0),
+}
+GRADES = ['Standard', 'Select', 'Premium', 'Organic', 'Free Range', 'Dry Aged', 'Butcher\'s']
+FIRST_NAMES = ['James', 'Mary', 'Patrick', 'Siobhan', 'Conor', 'Aoife', 'David', 'Ciara', 'Michael', 'Niamh',
+               'Sean', 'Emma', 'Mark', 'Grace', 'Paul', 'Orla', 'Peter', 'Sarah', 'John', 'Roisin']
+LAST_NAMES = ['Murphy', 'Kelly', 'Wilson', 'Campbell', 'Stewart', 'McLaughlin', 'Doherty', 'Smith', 'Johnston',
+              'Moore', 'Thompson', 'Quinn', 'Brown', 'O\'Neill', 'Robinson', 'McCann', 'Boyle', 'Graham']
+BUSINESSES = ['Grill', 'Bistro', 'Butchers', 'Hotel', 'Deli', 'Kitchen', 'Catering', 'Steakhouse', 'Cafe', 'Inn']
+TOWNS = ['Randalstown', 'Antrim', 'Ballymena', 'Belfast', 'Lisburn', 'Larne', 'Carrickfergus', 'Magherafelt',
+         'Toome', 'Crumlin', 'Ballyclare', 'Newtownabbey']
+# Each product is always delivered by the same one of these
+SUPPLIERS = ['Antrim Meats', 'Glens Farm Produce', 'Lough Neagh Poultry', 'Moyola Lamb Co', 'Six Mile Water Farms',
+             'Sperrin Pork']
+STREETS = ['Main St', 'Church Rd', 'Market Sq', 'Mill Row', 'High St', 'Station Rd', 'Bridge St', 'New St']
+PAYMENT_METHODS = (['account', 'card', 'bank', 'cash'], [50, 25, 15, 10])
+# (min kg, percent, categories or None for all, start, end) - dates as days
+# before the end of the data, None for open-ended
+DISCOUNT_RULES = [
+    (10, 5, None, None, None),
+    (25, 10, None, None, None),
+    (50, 15, None, None, None),
+    (20, 12, 'Beef,Lamb', None, None),
+    (30, 18, 'Poultry', 200, 140),
+    (15, 8, 'Pork', 60, None),
+]
+# Share of orders per weekday, Monday first; Sunday deliveries are rare
+WEEKDAY_WEIGHTS = [1.2, 1.1, 1.1, 1.2, 1.4, 0.7, 0.3]
+# Lines per order, 1 to 8
+LINE_WEIGHTS = [10, 22, 24, 18, 11, 7, 5, 3]
+# Line quantities in kg: lognormal, median about 10kg with a long bulk tail.
+# Drawn from a table of quantiles so a whole day is one random.choices call
+QUANTITY_MU = 2.3
+QUANTITY_SIGMA = 0.7
+QUANTITY_STEPS = 1000
+# Orders this many days old or newer may still be in progress
+OPEN_ORDER_DAYS = 4
+# Orders are placed in wholesale hours, 05:00 to 19:00
+ORDER_TIMES = [f"{second // 3600:02d}:{second // 60 % 60:02d}:{second % 60:02d}"
+               for second in range(5 * 3600, 19 * 3600 + 1)]
+CANCEL_RATE = 0.03
+ROUTES_PER_DAY = 3
+
+
+def seasonal_weight(day: date) -> float:
+    """Relative order volume through the year
+
+    A peak in the run-up to Christmas, a smaller one for summer barbecues
+    and a quiet January.
+    """
+    doy = day.timetuple().tm_yday
+    christmas = math.exp(-((doy - 350) / 12.0) ** 2) * 0.9
+    summer = math.exp(-((doy - 190) / 30.0) ** 2) * 0.3
+    january = -0.25 if doy <= 20 else 0.0
+    return 1.0 + christmas + summer + january
+
+
+def zipf_cum_weights(count: int, exponent: float) -> List[float]:
+    """Cumulative Zipf weights for ranks 1..count, for random.choices"""
+    return list(itertools.accumulate(1.0 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+def daily_order_counts(start: date, days: int, total: int, growth: float = 0.15) -> List[int]:
+    """Split total orders across the days so they follow the weekly and seasonal pattern
+
+    Volume also grows by `growth` over the whole period. Largest
+    remainders keep the sum exact without randomness.
+    """
+    weights = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        trend = 1.0 + growth * offset / max(days - 1, 1)
+        weights.append(WEEKDAY_WEIGHTS[day.weekday()] * seasonal_weight(day) * trend)
+    scale = total / sum(weights)
+    exact = [weight * scale for weight in weights]
+    counts = [int(value) for value in exact]
+    by_remainder = sorted(range(days), key=lambda i: exact[i] - counts[i], reverse=True)
+    for i in by_remainder[:total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+def pick_discount(rules: List[Tuple], category: str, quantity: float, day: str) -> float:
+    """Discount percent the app would give, as DiscountEngine picks it
+
+    The rule with the highest min_quantity_kg at or below the quantity
+    wins, among rules for the product's category whose dates cover the day.
+    """
+    best_min, percent = -1.0, 0.0
+    for min_kg, rule_percent, categories, start, end in rules:
+        if quantity < min_kg or min_kg <= best_min:
+            continue
+        if categories and category not in categories:
+            continue
+        if (start and day < start) or (end and day > end):
+            continue
+        best_min, percent = min_kg, rule_percent
+    return percent
+
+
+def quantity_table(steps: int = QUANTITY_STEPS) -> List[float]:
+    """Evenly spaced quantiles of the line quantity distribution, rounded to 0.1kg"""
+    spread = NormalDist(QUANTITY_MU, QUANTITY_SIGMA)
+    return [round(math.exp(spread.inv_cdf((step + 0.5) / steps)), 1) or 0.5 for step in range(steps)]
+
+
+def strip_for_load(conn: sqlite3.Connection) -> List[str]:
+    """Drop secondary indexes and triggers and return the SQL that recreates them
+
+    Bulk inserts are much faster without them, and building an index once
+    over the loaded rows is cheaper than updating it row by row. The
+    schema version is left alone: the tables are already at the latest
+    migration and the generator fills in the sales rollups itself.
+    """
+    objects = conn.execute(
+        "SELECT type, name, sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND sql IS NOT NULL"
+    ).fetchall()
+    for object_type, name, _ in objects:
+        conn.execute(f'DROP {object_type.upper()} "{name}"')
+    # Indexes first so the trigger bodies find them when first run
+    return [sql for object_type, _, sql in sorted(objects, key=lambda row: row[0] != 'index')]
+
+
+class DatasetGenerator:
+    """Writes one synthetic dataset into a new database file
+
+    Everything is drawn from a single seeded random.Random, so the same
+    seed, sizes and end date always produce the same database.
+    """
+
+    def __init__(self, path: str, customers: int, employees: int, products: int, orders: int,
+                 years: int, seed: int = DEFAULT_SEED, end: date = None):
+        self.path = path
+        self.customers = customers
+        self.employees = employees
+        self.products = products
+        self.orders = orders
+        self.years = years
+        # The last day is stamped up to 20:00 and the stock ledger is read in
+        # date order, so a day not yet over would put history after the live
+        # movements that follow it
+        self.end = end or date.today() - timedelta(days=1)
+        if self.end >= date.today():
+            raise ValueError(f"end date {self.end} must be before today")
+        self.start = self.end - timedelta(days=365 * years - 1)
+        self.rng = random.Random(seed)
+        self.counts: Dict[str, int] = {}
+        # Filled in while writing orders, for the routes and restocks after them
+        self.deliveries: Dict[str, List[int]] = defaultdict(list)
+        self.sold_by_week: Dict[Tuple[int, str], float] = defaultdict(float)
+
+    def generate(self) -> Dict[str, int]:
+        """Create the database and return the number of rows written per table"""
+        if os.path.exists(self.path):
+            raise FileExistsError(f"{self.path} already exists")
+        # DatabaseManager creates the schema and the default logins
+        manager = DatabaseManager(database=self.path)
+        password = manager.hash_password("password123")
+        manager.close()
+
+        conn = sqlite3.connect(self.path)
+        try:
+            # The file is new, so a crash mid-load loses nothing worth keeping.
+            # Without a journal every page is written once instead of going
+            # through the WAL first
+            conn.execute("PRAGMA synchronous = OFF")
+            conn.execute("PRAGMA journal_mode = OFF")
+            conn.execute("PRAGMA cache_size = -200000")
+            conn.execute("PRAGMA foreign_keys = OFF")
+            # Every generated status and role is valid; checking each one
+            # costs several seconds per million orders
+            conn.execute("PRAGMA ignore_check_constraints = ON")
+            deferred = strip_for_load(conn)
+            conn.execute("BEGIN")
+            # Opening and closing the manager snapshots the default products'
+            # stock under today's date; the dataset gets its own snapshot at
+            # --end, and a later one would hide it from reconcile_stock
+            conn.execute("DELETE FROM stock_snapshots")
+            staff = self.insert_users(conn, password)
+            catalogue = self.insert_products(conn)
+            rules = self.insert_discount_rules(conn)
+            self.insert_orders(conn, catalogue, rules)
+            self.insert_routes(conn, staff)
+            self.insert_restocks(conn)
+            # The balance trigger is dropped, so work the running balances
+            # out in one pass
+            for statement in STOCK_LEDGER_REBUILD:
+                conn.execute(statement)
+            # Put back the indexes and triggers, then give the planner statistics
+            for statement in deferred:
+                conn.execute(statement)
+            # The snapshot looks up each product's newest movement by index
+            self.counts['stock_snapshots'] = conn.execute(STOCK_SNAPSHOT, (self.end.isoformat(),)).rowcount
+            # The changes feed only holds the default data's rows, stamped
+            # with the wall clock; a new dataset starts with an empty feed
+            conn.execute("DELETE FROM changes")
+            conn.execute("DELETE FROM sqlite_sequence WHERE name = 'changes'")
+            conn.commit()
+            conn.execute("ANALYZE")
+            conn.commit()
+            conn.execute("PRAGMA journal_mode = WAL")
+        finally:
+            conn.close()
+        return self.counts
+
+    def _day_text(self, offset_days: int) -> Optional[str]:
+        return None if offset_days is None else (self.end - timedelta(days=offset_days)).isoformat()
+
+    def insert_users(self, conn: sqlite3.Connection, password: str) -> List[int]:
+        """Customers (mostly businesses) and staff; returns the staff user ids"""
+        rng = self.rng
+        # The default logins are stamped with the current time; fix it so the
+        # database depends only on the seed, sizes and end date
+        conn.execute("UPDATE users SET registration_date = ?", (f"{self.start - timedelta(days=730)} 08:00:00",))
+        rows = []
+        for i in range(self.customers):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            town = rng.choice(TOWNS)
+            registered = self.start - timedelta(days=rng.randint(1, 730))
+            rows.append((
+                f"customer{i + 1}", password, 'customer', first,
+                f"{last} ({town} {rng.choice(BUSINESSES)})" if rng.random() < 0.7 else last,
+                f"customer{i + 1}@example.com", f"07{rng.randint(100000000, 999999999)}",
+                f"{rng.randint(1, 250)} {rng.choice(STREETS)}, {town}",
+                f"{registered.isoformat()} 09:00:00"
+            ))
+        for i in range(self.employees):
+            role = 'manager' if i % 5 == 0 else 'employee'
+            rows.append((
+                f"{role}{i + 1}", password, role, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+                f"{role}{i + 1}@jsfoods.com", f"07{rng.randint(100000000, 999999999)}",
+                f"{rng.randint(1, 250)} {rng.choice(STREETS)}, {rng.choice(TOWNS)}",
+                f"{self.start.isoformat()} 08:00:00"
+            ))
+        conn.executemany('''
+            INSERT INTO users (username, password, role, first_name, last_name, email, phone, address, registration_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        self.counts['users'] = len(rows)
+        return [row[0] for row in conn.execute("SELECT user_id FROM users WHERE role IN ('employee', 'manager')")]
+
+    def insert_products(self, conn: sqlite3.Connection) -> List[Tuple[int, str, float]]:
+        """Products across the categories; returns (id, category, price) by popularity rank"""
+        rng = self.rng
+        names = [
+            (f"{grade} {cut}", category, low, high)
+            for category, (cuts, low, high) in CATEGORIES.items()
+            for cut in cuts
+            for grade in GRADES
+        ]
+        rng.shuffle(names)
+        rows = []
+        for i in range(self.products):
+            name, category, low, high = names[i % len(names)]
+            if i >= len(names):
+                name = f"{name} {i // len(names) + 1}"
+            price = round(rng.uniform(low, high), 2)
+            rows.append((name, category, f"{category} - {name.lower()}", 'kg',
+                         0.0, float(rng.choice([10, 15, 20, 25, 30, 50])), 0 if rng.random() < 0.03 else 1, price))
+        conn.executemany('''
+            INSERT INTO products (name, category, description, unit, current_stock_kg, min_stock_level, is_active, price_per_kg)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        self.counts['products'] = len(rows)
+        catalogue = [
+            tuple(row) for row in conn.execute(
+                "SELECT product_id, category, price_per_kg FROM products WHERE is_active = 1 ORDER BY product_id"
+            )
+        ]
+        # Popularity rank is independent of insertion order
+        rng.shuffle(catalogue)
+        return catalogue
+
+    def insert_discount_rules(self, conn: sqlite3.Connection) -> List[Tuple]:
+        """The bulk discount rules, returned with their dates resolved"""
+        rules = [
+            (min_kg, percent, categories, self._day_text(start), self._day_text(end))
+            for min_kg, percent, categories, start, end in DISCOUNT_RULES
+        ]
+        conn.executemany('''
+            INSERT INTO discount_rules (min_quantity_kg, discount_percent, applicable_categories, is_active, start_date, end_date)
+            VALUES (?, ?, ?, 1, ?, ?)
+        ''', rules)
+        self.counts['discount_rules'] = len(rules)
+        return rules
+
+    def insert_orders(self, conn: sqlite3.Connection, catalogue: List[Tuple], rules: List[Tuple]):
+        """Orders, their lines, the matching stock sales and the sales rollups, day by day
+
+        The rollups are summed here as the rows are made, exactly as the
+        migration 3 triggers would have, so they never need rebuilding from
+        the loaded tables.
+        """
+        rng = self.rng
+        customers = [
+            tuple(row) for row in conn.execute("SELECT user_id, address FROM users WHERE role = 'customer'")
+        ]
+        rng.shuffle(customers)
+        customer_weights = zipf_cum_weights(len(customers), CUSTOMER_ZIPF)
+        product_weights = zipf_cum_weights(len(catalogue), PRODUCT_ZIPF)
+        quantities = quantity_table()
+        category_of = {product_id: category for product_id, category, _ in catalogue}
+        line_counts = range(1, len(LINE_WEIGHTS) + 1)
+        methods, method_weights = PAYMENT_METHODS
+        open_statuses = ['pending', 'confirmed', 'processing', 'ready']
+        first_order = (conn.execute("SELECT MAX(order_id) FROM orders").fetchone()[0] or 0) + 1
+
+        days = (self.end - self.start).days + 1
+        per_day = daily_order_counts(self.start, days, self.orders)
+        rows = {'orders': [], 'items': [], 'sales': [], 'daily': [], 'products': [], 'categories': []}
+        add_order, add_item, add_sale = rows['orders'].append, rows['items'].append, rows['sales'].append
+        order_id = first_order
+        for offset, count in enumerate(per_day):
+            day = self.start + timedelta(days=offset)
+            day_text = day.isoformat()
+            week = day.strftime('%Y-%W')
+            age = days - 1 - offset
+            # Everything random for the day in a handful of calls
+            chosen = rng.choices(customers, cum_weights=customer_weights, k=count)
+            line_totals = rng.choices(line_counts, weights=LINE_WEIGHTS, k=count)
+            picks = iter(rng.choices(catalogue, cum_weights=product_weights, k=sum(line_totals)))
+            amounts = iter(rng.choices(quantities, k=sum(line_totals)))
+            paid_by = rng.choices(methods, weights=method_weights, k=count)
+            deliveries = rng.choices([(day + timedelta(days=wait)).isoformat() for wait in (1, 1, 2, 3)], k=count)
+            if age <= OPEN_ORDER_DAYS:
+                # Open orders only exist in the last few days
+                status_weights = [age + 1, 2, 2 if age < 3 else 1, 1 if age < 2 else 0]
+                statuses = rng.choices(open_statuses, weights=status_weights, k=count)
+            else:
+                statuses = ['cancelled' if rng.random() < CANCEL_RATE else 'delivered' for _ in range(count)]
+            # Earliest first so order ids follow order dates
+            times = sorted(rng.choices(ORDER_TIMES, k=count))
+            # The rules in force only change with the day
+            discounts = {}
+            day_orders, day_revenue = 0, 0.0
+            sold = defaultdict(float)
+            by_product = defaultdict(lambda: [0.0, 0.0, 0])
+            by_category = defaultdict(lambda: [0.0, 0.0, 0, 0])
+            for (customer_id, address), lines, clock, status, method, delivery in zip(
+                    chosen, line_totals, times, statuses, paid_by, deliveries):
+                placed = f"{day_text} {clock}"
+                note = f"Order #{order_id}"
+                counted = status != 'cancelled'
+                total = 0.0
+                seen = set()
+                categories = set()
+                for _ in range(lines):
+                    product_id, category, price = next(picks)
+                    quantity = next(amounts)
+                    if product_id in seen:
+                        continue
+                    seen.add(product_id)
+                    discount = discounts.get((category, quantity))
+                    if discount is None:
+                        discount = discounts[category, quantity] = pick_discount(rules, category, quantity, day_text)
+                    final_price = round(quantity * price * (1 - discount / 100), 2)
+                    total += final_price
+                    add_item((order_id, product_id, quantity, price, discount, final_price))
+                    add_sale((product_id, quantity, note, placed))
+                    sold[product_id] += quantity
+                    if counted:
+                        product = by_product[product_id]
+                        product[0] += quantity
+                        product[1] += final_price
+                        product[2] += 1
+                        line = by_category[category]
+                        line[0] += quantity
+                        line[1] += final_price
+                        line[3] += 1
+                        categories.add(category)
+                total = round(total, 2)
+                add_order((order_id, customer_id, placed, total, status, delivery, address, method))
+                if counted:
+                    day_orders += 1
+                    day_revenue += total
+                    for category in categories:
+                        by_category[category][2] += 1
+                    self.deliveries[delivery].append(order_id)
+                order_id += 1
+            for product_id, quantity in sold.items():
+                self.sold_by_week[product_id, week] += quantity
+            if day_orders:
+                rows['daily'].append((day_text, day_orders, day_revenue))
+            # Each product appears at most once per order, so its order and line counts match
+            rows['products'].extend(
+                (day_text, product_id, category_of[product_id], kg, revenue, lines, lines)
+                for product_id, (kg, revenue, lines) in sorted(by_product.items())
+            )
+            rows['categories'].extend(
+                (day_text, category, kg, revenue, order_count, lines)
+                for category, (kg, revenue, order_count, lines) in sorted(by_category.items())
+            )
+            if len(rows['items']) >= BATCH_SIZE:
+                self._flush_orders(conn, rows)
+        self._flush_orders(conn, rows)
+
+    def _flush_orders(self, conn: sqlite3.Connection, rows: Dict[str, List]):
+        """Write buffered order and rollup rows and empty the buffers"""
+        for key, table, sql in (
+            ('orders', 'orders', '''
+                INSERT INTO orders (order_id, customer_id, order_date, total_amount, status, delivery_date, delivery_address, payment_method, last_modified)
+                VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?3)
+            '''),
+            ('items', 'order_items', '''
+                INSERT INTO order_items (order_id, product_id, quantity_kg, unit_price, discount_percent, final_price)
+                VALUES (?, ?, ?, ?, ?, ?)
+            '''),
+            ('sales', 'stock_transactions', '''
+                INSERT INTO stock_transactions (product_id, transaction_type, quantity_kg, notes, transaction_date)
+                VALUES (?, 'sale', ?, ?, ?)
+            '''),
+            ('daily', 'sales_daily', "INSERT INTO sales_daily (day, order_count, revenue) VALUES (?, ?, ?)"),
+            ('products', 'sales_rollup', '''
+                INSERT INTO sales_rollup (day, product_id, category, kg, revenue, order_count, line_count)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            '''),
+            ('categories', 'sales_category_daily', '''
+                INSERT INTO sales_category_daily (day, category, kg, revenue, order_count, line_count)
+                VALUES (?, ?, ?, ?, ?, ?)
+            '''),
+        ):
+            conn.executemany(sql, rows[key])
+            self.counts[table] = self.counts.get(table, 0) + len(rows[key])
+            rows[key].clear()
+
+    def insert_routes(self, conn: sqlite3.Connection, staff: List[int]):
+        """Delivery routes for every day with deliveries, each with its orders in sequence"""
+        rng = self.rng
+        routes = 0
+        route_orders = []
+        today = self.end.isoformat()
+        cursor = conn.cursor()
+        for day in sorted(self.deliveries):
+            order_ids = self.deliveries[day]
+            route_count = min(ROUTES_PER_DAY, len(order_ids))
+            status = 'completed' if day < today else 'scheduled'
+            for route in range(route_count):
+                cursor.execute('''
+                    INSERT INTO delivery_routes (route_name, employee_id, delivery_date, status, vehicle_info)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (f"{day} Route {route + 1}", rng.choice(staff) if staff else None, day, status,
+                      f"Van {rng.randint(1, 8)}"))
+                route_id = cursor.lastrowid
+                routes += 1
+                for sequence, order_id in enumerate(order_ids[route::route_count], 1):
+                    route_orders.append((route_id, order_id, sequence))
+            if len(route_orders) >= BATCH_SIZE:
+                self._flush_route_orders(conn, route_orders)
+        self._flush_route_orders(conn, route_orders)
+        self.counts['delivery_routes'] = routes
+
+    def _flush_route_orders(self, conn: sqlite3.Connection, route_orders: List):
+        conn.executemany("INSERT INTO route_orders (route_id, order_id, sequence_number) VALUES (?, ?, ?)", route_orders)
+        self.counts['route_orders'] = self.counts.get('route_orders', 0) + len(route_orders)
+        route_orders.clear()
+
+    def insert_restocks(self, conn: sqlite3.Connection):
+        """Opening stock, weekly deliveries and a closing stock take, then the resulting stock level
+
+        Every product opens with a cover above its minimum level and is
+        restocked each Monday with what it sells that week, so its balance
+        never runs below the opening cover. A stock take on the last
+        evening brings each product to a random final level that leaves some
+        below their minimum and a few on the low stock list.
+        """
+        rng = self.rng
+        movements = []
+        ledger = defaultdict(float)
+        opened = f"{self.start - timedelta(days=7)} 04:00:00"
+        products = conn.execute("SELECT product_id, min_stock_level FROM products ORDER BY product_id").fetchall()
+        for product_id, min_level in products:
+            cover = round(rng.uniform(1.5, 3.0) * min_level, 1)
+            ledger[product_id] = cover
+            movements.append((product_id, 'initial', cover, "Opening stock", opened))
+        for (product_id, week), quantity in sorted(self.sold_by_week.items()):
+            monday = datetime.strptime(f"{week}-1", "%Y-%W-%w").date()
+            delivered = round(quantity, 1)
+            ledger[product_id] += delivered - quantity
+            # Noted the way the inventory portal notes a delivery
+            supplier = SUPPLIERS[product_id % len(SUPPLIERS)]
+            movements.append((product_id, 'receive', delivered, f"Received from {supplier}. Batch: {week}. Weekly delivery",
+                              f"{monday} 04:30:00"))
+        final_stock = []
+        for product_id, min_level in products:
+            final = round(rng.uniform(0.05, 8.0) * min_level, 1)
+            final_stock.append((final, product_id))
+            counted = round(final - ledger[product_id], 3)
+            if counted:
+                movements.append((product_id, 'adjustment_add' if counted > 0 else 'adjustment_remove', abs(counted),
+                                  "Stock take", f"{self.end} 20:00:00"))
+        conn.executemany('''
+            INSERT INTO stock_transactions (product_id, transaction_type, quantity_kg, notes, transaction_date)
+            VALUES (?, ?, ?, ?, ?)
+        ''', movements)
+        self.counts['stock_transactions'] = self.counts.get('stock_transactions', 0) + len(movements)
+        conn.executemany("UPDATE products SET current_stock_kg = ? WHERE product_id = ?", final_stock)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic JS Foods database")
+    parser.add_argument("path", help="database file to create (must not exist)")
+    parser.add_argument("--scale", choices=list(SCALES), default=DEFAULT_SCALE, help="preset sizes")
+    parser.add_argument("--customers", type=int, help="customer accounts")
+    parser.add_argument("--employees", type=int, help="employee and manager accounts")
+    parser.add_argument("--products", type=int, help="products across the categories")
+    parser.add_argument("--orders", type=int, help="orders in total")
+    parser.add_argument("--years", type=int, help="years of order history ending at --end")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="random seed")
+    parser.add_argument("--end", type=date.fromisoformat, help="last day of orders, YYYY-MM-DD, before today (default: yesterday)")
+    args = parser.parse_args()
+
+    sizes = dict(SCALES[args.scale])
+    for key in sizes:
+        if getattr(args, key) is not None:
+            sizes[key] = getattr(args, key)
+    print(f"🏭 Generating {sizes['orders']:,} orders for {sizes['customers']:,} customers "
+          f"over {sizes['years']} year(s) into {args.path}")
+    start = time.perf_counter()
+    try:
+        counts = DatasetGenerator(args.path, seed=args.seed, end=args.end, **sizes).generate()
+    except (FileExistsError, ValueError, sqlite3.Error) as e:
+        print(f"❌ Dataset generation error: {e}")
+        raise SystemExit(1)
+    for table, count in counts.items():
+        print(f"   {table:<20} {count:>10,}")
+    print(f"✅ Done in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+JS Foods Discount Engine
+Bulk discount rules compiled into memory for fast cart pricing
+"""
+
+import re
+import sqlite3
+import threading
+from bisect import bisect_right
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Version counters bumped by triggers (see migration 2) whenever the inputs
+# to discount pricing change
+WATCHED_VERSIONS = ('discount_rules', 'product_categories')
+
+
+def _like_contains(category: str) -> re.Pattern:
+    """Compile the SQL test applicable_categories LIKE '%' || category || '%'
+
+    LIKE folds case for ASCII letters only and treats % and _ inside the
+    category as wildcards, so the regex does the same.
+    """
+    pattern = "".join(".*" if ch == "%" else "." if ch == "_" else re.escape(ch) for ch in f"%{category}%")
+    return re.compile(pattern, re.IGNORECASE | re.ASCII | re.DOTALL)
+
+
+def _compare_date(stored, today: str) -> int:
+    """Compare a stored date with today's date string the way SQLite does
+
+    Returns -1, 0 or 1. SQLite sorts numbers before text and text before
+    blobs, so a date that was stored as a number is always "earlier".
+    """
+    if isinstance(stored, str):
+        return (stored > today) - (stored < today)
+    if isinstance(stored, bytes):
+        return 1
+    return -1
+
+
+class DiscountEngine:
+    """Active discount rules indexed by category and quantity threshold
+
+    Rules are loaded once and rebuilt only when the discount_rules table or
+    a product's category changes, which is detected from the trigger-bumped
+    table_versions counters. Pricing matches calculate_discount's original
+    SQL exactly: the rule with the highest min_quantity_kg at or below the
+    quantity wins, among active rules whose categories contain the
+    product's category (or that apply to every category) and whose date
+    window includes today's UTC date.
+    """
+
+    def __init__(self, connection: Callable):
+        self._connection = connection
+        self._lock = threading.Lock()
+        self._versions = None
+        # (product categories, active rules, per-category compiled rules),
+        # swapped as one tuple so a lookup never mixes two generations
+        self._state: Tuple[Dict[int, Optional[str]], List[Tuple], Dict] = ({}, [], {})
+
+    def refresh(self, conn: sqlite3.Connection = None) -> bool:
+        """Rebuild the compiled rules if the database changed; True if rebuilt"""
+        if conn is None:
+            with self._connection() as conn:
+                return self.refresh(conn)
+        placeholders = ", ".join("?" for _ in WATCHED_VERSIONS)
+        versions = tuple(
+            tuple(row) for row in conn.execute(
+                f"SELECT table_name, version FROM table_versions WHERE table_name IN ({placeholders}) ORDER BY table_name",
+                WATCHED_VERSIONS
+            )
+        )
+        if versions == self._versions:
+            return False
+        with self._lock:
+            if versions == self._versions:
+                return False
+            categories = {
+                row[0]: row[1]
+                for row in conn.execute("SELECT product_id, category FROM products")
+            }
+            rules = [
+                (row[0], row[1], row[2], row[3], row[4], row[5])
+                for row in conn.execute('''
+                    SELECT rule_id, min_quantity_kg, discount_percent, applicable_categories, start_date, end_date
+                    FROM discount_rules
+                    WHERE is_active = 1
+                ''')
+            ]
+            self._state = (categories, rules, {})
+            self._versions = versions
+        return True
+
+    @staticmethod
+    def _rules_for(state: Tuple, category: Optional[str]) -> Tuple[List[float], List[Tuple]]:
+        """Thresholds and rules that can apply to a category, sorted for bisect"""
+        _, all_rules, by_category = state
+        compiled = by_category.get(category)
+        if compiled is not None:
+            return compiled
+        matcher = _like_contains(category) if category is not None else None
+        matching = [
+            rule for rule in all_rules
+            if rule[3] is None or (matcher is not None and matcher.fullmatch(str(rule[3])))
+        ]
+        # Ascending threshold; within a threshold the lowest rule_id sorts last
+        # so a reverse scan finds it first
+        matching.sort(key=lambda rule: (rule[1], -rule[0]))
+        compiled = ([rule[1] for rule in matching], matching)
+        by_category[category] = compiled
+        return compiled
+
+    def _lookup(self, state: Tuple, product_id: int, quantity: float, today: str) -> float:
+        """Discount percentage for one line against the compiled rules"""
+        categories = state[0]
+        if product_id not in categories:
+            return 0.0
+        thresholds, rules = self._rules_for(state, categories[product_id])
+        for index in range(bisect_right(thresholds, quantity) - 1, -1, -1):
+            rule = rules[index]
+            start_date, end_date = rule[4], rule[5]
+            if start_date is not None and _compare_date(start_date, today) > 0:
+                continue
+            if end_date is not None and _compare_date(end_date, today) < 0:
+                continue
+            return rule[2] if rule[2] is not None else 0.0
+        return 0.0
+
+    def discount_for(self, product_id: int, quantity: float, conn: sqlite3.Connection = None) -> float:
+        """Discount percentage for a single product and quantity"""
+        self.refresh(conn)
+        return self._lookup(self._state, product_id, quantity, datetime.now(timezone.utc).strftime("%Y-%m-%d"))
+
+    def price_cart(self, items: List[Dict], conn: sqlite3.Connection = None) -> List[Dict]:
+        """Discount and final price for every cart line, in the order given"""
+        self.refresh(conn)
+        state = self._state
+        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        lines = []
+        for item in items:
+            discount = self._lookup(state, item['product_id'], item['quantity_kg'], today)
+            lines.append({
+                'discount_percent': discount,
+                'final_price': item['quantity_kg'] * item['unit_price'] * (1 - discount/100)
+            })
+        return lines
@@ -6,13 +6,17 @@ Employee and manager interface
 import customtkinter as tk
 from tkinter import ttk, messagebox
 import sqlite3
-import subprocess
 from datetime import datetime, timedelta
-from jsfoods_database import db
+from jsfoods_background import BackgroundRunner
+from jsfoods_changes import ChangeFeed
+from jsfoods_database import ORDER_PAGE_SIZE, db
+from jsfoods_instrumentation import tracked_action
+from jsfoods_widgets import ORDER_STATUS_COLORS, TreeviewBinding
 
-class EmployeePortal(tk.CTk):
-    def __init__(self):
-        super().__init__()
+class EmployeePortal(tk.CTkToplevel):
+    def __init__(self, shell, user=None):
+        super().__init__(shell)
+        self.shell = shell
         
         self.title("JS Foods - Employee Portal")
         self.geometry("1400x800")
@@ -21,12 +25,21 @@ class EmployeePortal(tk.CTk):
         tk.set_appearance_mode("light")
         tk.set_default_color_theme("blue")
         
-        # Demo employee ID
-        self.employee_id = 2
-        self.is_manager = True  # Demo: this employee is a manager
+        # The logged-in employee; the demo manager when opened directly
+        self.employee_id = user['user_id'] if user else 2
+        self.is_manager = user['role'] in ('manager', 'owner') if user else True
+        
+        # Queries run here so a slow report never freezes the window
+        self.background = BackgroundRunner(self)
         
         self.setup_ui()
         self.load_dashboard_data()
+        
+        # Orders and stock changed by other windows or processes show up by themselves
+        self.changes = ChangeFeed(self, db, {
+            'orders': self.apply_order_changes,
+            'products': self.refresh_dashboard_data
+        }, on_reset=self.reload_all)
     
     def setup_ui(self):
         """Setup employee portal UI"""
@@ -141,31 +154,44 @@ class EmployeePortal(tk.CTk):
         ).pack(side="right", padx=20)
     
     def load_dashboard_data(self):
-        """Load dashboard statistics"""
-        try:
-            # Get pending orders count
-            conn = sqlite3.connect('jsfoods.db')
+        """Load dashboard statistics in the background"""
+        for label in self.stats_labels.values():
+            label.configure(text="…")
+        self.refresh_dashboard_data()
+    
+    def refresh_dashboard_data(self, changed=None):
+        """Re-read the dashboard statistics, keeping the current figures until they arrive"""
+        self.background.submit(
+            "dashboard",
+            self.fetch_dashboard_data,
+            on_done=self.show_dashboard_data,
+            on_error=lambda e: print(f"Dashboard data error: {e}")
+        )
+    
+    @tracked_action
+    def fetch_dashboard_data(self):
+        """Read the dashboard counts; runs on a worker thread"""
+        today = datetime.now().strftime("%Y-%m-%d")
+        with db.connection() as conn:
             cursor = conn.cursor()
             
+            # Get pending orders count
             cursor.execute("SELECT COUNT(*) FROM orders WHERE status IN ('pending', 'confirmed')")
             pending = cursor.fetchone()[0]
-            self.stats_labels['pending_orders'].configure(text=str(pending))
-            
-            # Get low stock items
-            low_stock = db.get_low_stock_items()
-            self.stats_labels['low_stock'].configure(text=str(len(low_stock)))
-            
-            # Get today's sales
-            today = datetime.now().strftime("%Y-%m-%d")
-            cursor.execute(
-                "SELECT SUM(total_amount) FROM orders WHERE DATE(order_date) = ? AND status != 'cancelled'",
-                (today,)
-            )
-            sales = cursor.fetchone()[0] or 0
-            self.stats_labels['today_sales'].configure(text=f"£{sales:.2f}")
-            
-        except sqlite3.Error as e:
-            print(f"Dashboard data error: {e}")
+        
+        # Get today's sales from the daily sales rollup
+        sales = db.get_revenue(today, today)
+        
+        # Get low stock items
+        low_stock = db.get_low_stock_items()
+        return pending, len(low_stock), sales
+    
+    def show_dashboard_data(self, stats):
+        """Update the dashboard labels with fetched counts"""
+        pending, low_stock, sales = stats
+        self.stats_labels['pending_orders'].configure(text=str(pending))
+        self.stats_labels['low_stock'].configure(text=str(low_stock))
+        self.stats_labels['today_sales'].configure(text=f"£{sales:.2f}")
     
     def setup_orders_tab(self):
         """Setup orders management tab"""
@@ -211,10 +237,13 @@ class EmployeePortal(tk.CTk):
         )
         self.orders_tree.grid(row=1, column=0, sticky="nsew", padx=10, pady=(0, 10))
         
-        # Configure scrollbar
-        scrollbar = ttk.Scrollbar(orders_frame, orient="vertical", command=self.orders_tree.yview)
-        scrollbar.grid(row=1, column=1, sticky="ns", pady=(0, 10))
-        self.orders_tree.configure(yscrollcommand=scrollbar.set)
+        # Configure scrollbar; scrolling near the bottom fetches the next page
+        self.orders_scrollbar = ttk.Scrollbar(orders_frame, orient="vertical", command=self.orders_tree.yview)
+        self.orders_scrollbar.grid(row=1, column=1, sticky="ns", pady=(0, 10))
+        self.orders_tree.configure(yscrollcommand=self.on_orders_scroll)
+        self.orders_cursor = None
+        self.orders_filter = None
+        self.orders_page_pending = False
         
         # Configure columns
         columns = [
@@ -230,6 +259,7 @@ class EmployeePortal(tk.CTk):
             self.orders_tree.heading(col, text=col)
             self.orders_tree.column(col, width=width, anchor=anchor)
         
+        self.order_rows = TreeviewBinding(self.orders_tree, ORDER_STATUS_COLORS)
         self.orders_tree.bind("<Double-1>", self.view_order_details)
         
         # Action buttons
@@ -262,55 +292,83 @@ class EmployeePortal(tk.CTk):
         # Load initial orders
         self.load_orders()
     
+    @tracked_action
     def load_orders(self, event=None):
-        """Load orders based on filter"""
-        try:
-            conn = sqlite3.connect('jsfoods.db')
-            cursor = conn.cursor()
-            
-            status_filter = self.order_status_var.get()
-            
-            if status_filter == "All":
-                query = """
-                    SELECT o.order_id, u.first_name || ' ' || u.last_name as customer,
-                           o.order_date, o.total_amount, o.status, o.delivery_date
-                    FROM orders o
-                    JOIN users u ON o.customer_id = u.user_id
-                    ORDER BY o.order_date DESC
-                    LIMIT 100
-                """
-                cursor.execute(query)
-            else:
-                query = """
-                    SELECT o.order_id, u.first_name || ' ' || u.last_name as customer,
-                           o.order_date, o.total_amount, o.status, o.delivery_date
-                    FROM orders o
-                    JOIN users u ON o.customer_id = u.user_id
-                    WHERE o.status = ?
-                    ORDER BY o.order_date DESC
-                """
-                cursor.execute(query, (status_filter,))
-            
-            # Clear existing items
-            for item in self.orders_tree.get_children():
-                self.orders_tree.delete(item)
-            
-            # Add orders
-            for order in cursor.fetchall():
-                status_color = {
-                    'pending': 'orange',
-                    'confirmed': 'blue',
-                    'processing': 'purple',
-                    'ready': 'green',
-                    'delivered': '#2E7D32',
-                    'cancelled': 'red'
-                }.get(order[4], 'black')
-                
-                self.orders_tree.insert("", "end", values=order, tags=(order[4],))
-                self.orders_tree.tag_configure(order[4], foreground=status_color)
-                
-        except sqlite3.Error as e:
-            messagebox.showerror("Database Error", f"Could not load orders: {e}")
+        """Load orders for the current filter
+        
+        Refreshing the same filter re-reads as many orders as are already
+        paged in, so the list keeps its length and scroll position and only
+        changed rows are redrawn. A new filter starts again from page one.
+        """
+        status_filter = self.order_status_var.get()
+        limit = ORDER_PAGE_SIZE
+        if status_filter == self.orders_filter:
+            limit = max(limit, len(self.order_rows))
+        else:
+            self.orders_filter = status_filter
+            self.orders_tree.yview_moveto(0)
+        orders, self.orders_cursor = db.get_orders_page(
+            status=None if status_filter == "All" else status_filter,
+            limit=limit
+        )
+        self.order_rows.set_rows(self.order_row(order) for order in orders)
+    
+    @tracked_action
+    def load_more_orders(self):
+        """Append the next page of orders to the table"""
+        self.orders_page_pending = False
+        if self.orders_cursor is None:
+            return
+        orders, self.orders_cursor = db.get_orders_page(
+            status=None if self.orders_filter == "All" else self.orders_filter,
+            after=self.orders_cursor
+        )
+        self.order_rows.extend(self.order_row(order) for order in orders)
+    
+    @tracked_action
+    def apply_order_changes(self, order_ids):
+        """Update, add or drop just these orders in the table and refresh the counts
+        
+        Orders that no longer match the filter are dropped. New ones are only
+        added where they fall within the pages already loaded, so scrolling
+        on still fetches from where the list ends.
+        """
+        orders, _ = db.get_orders_page(
+            status=None if self.orders_filter == "All" else self.orders_filter,
+            order_ids=sorted(order_ids),
+            limit=len(order_ids)
+        )
+        found = {order['order_id']: order for order in orders}
+        rows = {row[0]: row for row in self.order_rows.rows()}
+        for order_id in order_ids:
+            order = found.get(order_id)
+            if order is None:
+                rows.pop(order_id, None)
+            elif (order_id in rows or self.orders_cursor is None
+                  or (order['order_date'], order_id) > tuple(self.orders_cursor)):
+                rows[order_id] = self.order_row(order)
+        # Newest first, by the date and ID columns
+        self.order_rows.set_rows(sorted(rows.values(), key=lambda row: (row[1][2], row[0]), reverse=True))
+        self.refresh_dashboard_data()
+    
+    def order_row(self, order):
+        """Treeview key, values and tags for one order"""
+        return order['order_id'], (
+            order['order_id'],
+            order['customer'],
+            order['order_date'],
+            order['total_amount'],
+            order['status'],
+            order['delivery_date']
+        ), (order['status'],)
+    
+    def on_orders_scroll(self, first, last):
+        """Keep the scrollbar in step and fetch more orders near the bottom"""
+        self.orders_scrollbar.set(first, last)
+        if self.orders_cursor is not None and not self.orders_page_pending and float(last) > 0.9:
+            # Let Tk finish this scroll before the table grows underneath it
+            self.orders_page_pending = True
+            self.after_idle(self.load_more_orders)
     
     def view_order_details(self, event):
         """View order details"""
@@ -320,8 +378,35 @@ class EmployeePortal(tk.CTk):
             return
         
         order_id = self.orders_tree.item(selection[0])['values'][0]
+        self.configure(cursor="watch")
+        self.background.submit(
+            "order_details",
+            self.fetch_order_details,
+            order_id,
+            on_done=self.show_order_details,
+            on_error=lambda e: self.configure(cursor="")
+        )
+    
+    @tracked_action
+    def fetch_order_details(self, order_id):
+        """Read an order, its items and its customer; runs on a worker thread"""
         order, items = db.get_order_details(order_id)
-        
+        customer = None
+        if order:
+            try:
+                with db.connection() as conn:
+                    customer = conn.execute(
+                        "SELECT first_name, last_name, email, phone FROM users WHERE user_id = ?",
+                        (order['customer_id'],)
+                    ).fetchone()
+            except sqlite3.Error:
+                pass
+        return order_id, order, items, customer
+    
+    def show_order_details(self, details):
+        """Open the order details window for fetched details"""
+        self.configure(cursor="")
+        order_id, order, items, customer = details
         if not order:
             return
         
@@ -347,29 +432,18 @@ class EmployeePortal(tk.CTk):
         cust_frame = tk.CTkFrame(info_frame)
         cust_frame.pack(fill="x", padx=10, pady=10)
         
-        try:
-            conn = sqlite3.connect('jsfoods.db')
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT first_name, last_name, email, phone FROM users WHERE user_id = ?",
-                (order['customer_id'],)
-            )
-            customer = cursor.fetchone()
+        if customer:
+            tk.CTkLabel(
+                cust_frame,
+                text=f"Customer: {customer[0]} {customer[1]}",
+                font=("Helvetica", 12, "bold")
+            ).pack(anchor="w")
             
-            if customer:
-                tk.CTkLabel(
-                    cust_frame,
-                    text=f"Customer: {customer[0]} {customer[1]}",
-                    font=("Helvetica", 12, "bold")
-                ).pack(anchor="w")
-                
-                tk.CTkLabel(
-                    cust_frame,
-                    text=f"Email: {customer[2]} | Phone: {customer[3] or 'N/A'}",
-                    font=("Helvetica", 11)
-                ).pack(anchor="w", pady=2)
-        except sqlite3.Error:
-            pass
+            tk.CTkLabel(
+                cust_frame,
+                text=f"Email: {customer[2]} | Phone: {customer[3] or 'N/A'}",
+                font=("Helvetica", 11)
+            ).pack(anchor="w", pady=2)
         
         # Order details
         details_grid = tk.CTkFrame(info_frame, fg_color="transparent")
@@ -445,6 +519,7 @@ class EmployeePortal(tk.CTk):
                 f"£{item['final_price']:.2f}"
             ))
     
+    @tracked_action
     def update_order_status(self):
         """Update selected order status"""
         selection = self.orders_tree.selection()
@@ -494,13 +569,11 @@ class EmployeePortal(tk.CTk):
         def update_status():
             new_status = status_var.get()
             try:
-                conn = sqlite3.connect('jsfoods.db')
-                cursor = conn.cursor()
-                cursor.execute(
-                    "UPDATE orders SET status = ? WHERE order_id = ?",
-                    (new_status, order_id)
-                )
-                conn.commit()
+                with db.transaction() as conn:
+                    conn.execute(
+                        "UPDATE orders SET status = ? WHERE order_id = ?",
+                        (new_status, order_id)
+                    )
                 
                 messagebox.showinfo("Success", f"Order status updated to {new_status}")
                 status_window.destroy()
@@ -618,6 +691,7 @@ class EmployeePortal(tk.CTk):
                 height=25
             ).pack(pady=17)
     
+    @tracked_action
     def create_delivery_route(self):
         """Create new delivery route with scrollable form"""
         route_window = tk.CTkToplevel(self)
@@ -697,10 +771,10 @@ class EmployeePortal(tk.CTk):
         
         # Get employees for dropdown
         try:
-            conn = sqlite3.connect('jsfoods.db')
-            cursor = conn.cursor()
-            cursor.execute("SELECT user_id, first_name, last_name FROM users WHERE role IN ('employee', 'manager')")
-            employees = cursor.fetchall()
+            with db.connection() as conn:
+                employees = conn.execute(
+                    "SELECT user_id, first_name, last_name FROM users WHERE role IN ('employee', 'manager')"
+                ).fetchall()
             driver_options = ["None"] + [f"{emp[0]}: {emp[1]} {emp[2]}" for emp in employees]
         except:
             driver_options = ["None"]
@@ -890,21 +964,23 @@ class EmployeePortal(tk.CTk):
     
     def open_inventory_manager(self):
         """Open the Inventory Manager"""
-        self.destroy()
-        subprocess.Popen(["python", "jsfoods_inventory.py"])
+        self.shell.show("inventory")
     
-    def refresh_all(self):
-        """Refresh all data"""
+    def reload_all(self):
+        """Re-read the dashboard and the orders list"""
         self.load_dashboard_data()
         self.load_orders()
+    
+    def refresh_all(self):
+        """Refresh all data"""
+        self.reload_all()
         messagebox.showinfo("Refreshed", "All data has been refreshed")
     
     def go_back(self):
         """Return to main menu"""
-        self.destroy()
-        subprocess.Popen(["python", "jsfoods_main.py"])
+        self.shell.logout()
 
 
 if __name__ == "__main__":
-    app = EmployeePortal()
-    app.mainloop()
\ No newline at end of file
+    from jsfoods_main import run
+    run("employee")
\ No newline at end of file
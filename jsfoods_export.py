@@ -0,0 +1,234 @@
+"""
+JS Foods Export
+Streams query results to CSV, Excel and Parquet files
+"""
+
+import csv
+import importlib.util
+import os
+from contextlib import closing
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Excel and Parquet need optional packages; they are imported only when a
+# file of that kind is written, and offered only if installed
+EXPORT_FORMATS = {
+    'CSV': ('.csv', None),
+    'Excel': ('.xlsx', 'openpyxl'),
+    'Parquet': ('.parquet', 'pyarrow'),
+}
+# An Excel sheet holds 1,048,576 rows; longer exports continue on a new
+# sheet, each with its own header row
+EXCEL_SHEET_ROWS = 1048575
+# Report rows are already in memory; they are written in batches of this
+# size only so the export can report its progress
+REPORT_BATCH_ROWS = 5000
+
+# Columns are (name, type) with type 'int', 'float' or 'text', so Parquet
+# gets a fixed schema even when the first rows of a column are all NULL.
+# The count query gives the progress total.
+EXPORTS = {
+    'orders': {
+        'title': "Orders",
+        'columns': [('order_id', 'int'), ('order_date', 'text'), ('customer_id', 'int'), ('customer', 'text'),
+                    ('status', 'text'), ('total_amount', 'float'), ('payment_method', 'text'),
+                    ('delivery_date', 'text'), ('delivery_address', 'text')],
+        'sql': """
+            SELECT o.order_id, o.order_date, o.customer_id, u.username, o.status, o.total_amount,
+                   o.payment_method, o.delivery_date, o.delivery_address
+            FROM orders o
+            LEFT JOIN users u ON u.user_id = o.customer_id
+            ORDER BY o.order_id""",
+        'count_sql': "SELECT COUNT(*) FROM orders",
+    },
+    'order_items': {
+        'title': "Order Lines",
+        'columns': [('item_id', 'int'), ('order_id', 'int'), ('order_date', 'text'), ('product_id', 'int'),
+                    ('product', 'text'), ('category', 'text'), ('quantity_kg', 'float'), ('unit_price', 'float'),
+                    ('discount_percent', 'float'), ('final_price', 'float')],
+        'sql': """
+            SELECT oi.item_id, oi.order_id, o.order_date, oi.product_id, p.name, p.category,
+                   oi.quantity_kg, oi.unit_price, oi.discount_percent, oi.final_price
+            FROM order_items oi
+            JOIN orders o ON o.order_id = oi.order_id
+            LEFT JOIN products p ON p.product_id = oi.product_id
+            ORDER BY oi.item_id""",
+        'count_sql': "SELECT COUNT(*) FROM order_items",
+    },
+    # Every stock movement with who made it, for the audit log export
+    'stock_ledger': {
+        'title': "Stock Ledger",
+        'columns': [('transaction_id', 'int'), ('transaction_date', 'text'), ('product_id', 'int'),
+                    ('product', 'text'), ('transaction_type', 'text'), ('quantity_kg', 'float'),
+                    ('balance_kg', 'float'), ('user_id', 'int'), ('username', 'text'), ('notes', 'text')],
+        'sql': """
+            SELECT st.transaction_id, st.transaction_date, st.product_id, p.name, st.transaction_type,
+                   st.quantity_kg, st.balance_kg, st.user_id, u.username, st.notes
+            FROM stock_transactions st
+            LEFT JOIN products p ON p.product_id = st.product_id
+            LEFT JOIN users u ON u.user_id = st.user_id
+            ORDER BY st.transaction_id""",
+        'count_sql': "SELECT COUNT(*) FROM stock_transactions",
+    },
+    'customers': {
+        'title': "Customers",
+        'columns': [('user_id', 'int'), ('username', 'text'), ('first_name', 'text'), ('last_name', 'text'),
+                    ('email', 'text'), ('phone', 'text'), ('address', 'text'), ('registration_date', 'text')],
+        'sql': """
+            SELECT user_id, username, first_name, last_name, email, phone, address, registration_date
+            FROM users
+            WHERE role = 'customer'
+            ORDER BY user_id""",
+        'count_sql': "SELECT COUNT(*) FROM users WHERE role = 'customer'",
+    },
+    'products': {
+        'title': "Products",
+        'columns': [('product_id', 'int'), ('name', 'text'), ('category', 'text'), ('price_per_kg', 'float'),
+                    ('current_stock_kg', 'float'), ('min_stock_level', 'float'), ('is_active', 'int')],
+        'sql': """
+            SELECT product_id, name, category, price_per_kg, current_stock_kg, min_stock_level, is_active
+            FROM products
+            ORDER BY product_id""",
+        'count_sql': "SELECT COUNT(*) FROM products",
+    },
+}
+
+
+def available_formats() -> List[str]:
+    """Export formats whose packages are installed, CSV always first"""
+    return [name for name, (_, package) in EXPORT_FORMATS.items()
+            if package is None or importlib.util.find_spec(package) is not None]
+
+
+class CsvExport:
+    """UTF-8 CSV with a header row; the BOM lets Excel open it with £ intact"""
+
+    def __init__(self, path: str, columns: List[Tuple[str, str]]):
+        self.file = open(path, 'w', newline='', encoding='utf-8-sig')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([name for name, _ in columns])
+
+    def write(self, rows: Sequence[Sequence]):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class ExcelExport:
+    """openpyxl write-only workbook: rows go straight to disk, not into memory"""
+
+    def __init__(self, path: str, columns: List[Tuple[str, str]]):
+        from openpyxl import Workbook
+
+        self.path = path
+        self.header = [name for name, _ in columns]
+        self.workbook = Workbook(write_only=True)
+        self.sheets = 0
+        self._new_sheet()
+
+    def _new_sheet(self):
+        self.sheets += 1
+        self.sheet = self.workbook.create_sheet("Export" if self.sheets == 1 else f"Export {self.sheets}")
+        self.sheet.append(self.header)
+        self.room = EXCEL_SHEET_ROWS
+
+    def write(self, rows: Sequence[Sequence]):
+        for row in rows:
+            if not self.room:
+                self._new_sheet()
+            self.sheet.append(row)
+            self.room -= 1
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+class ParquetExport:
+    """pyarrow ParquetWriter: each batch becomes one row group"""
+
+    def __init__(self, path: str, columns: List[Tuple[str, str]]):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        types = {'int': pa.int64(), 'float': pa.float64(), 'text': pa.string()}
+        self.pa = pa
+        self.schema = pa.schema([(name, types[kind]) for name, kind in columns])
+        self.writer = pq.ParquetWriter(path, self.schema, compression='snappy')
+
+    def write(self, rows: Sequence[Sequence]):
+        # Column by column, as Parquet stores them
+        arrays = [self.pa.array(values, type=field.type) for values, field in zip(zip(*rows), self.schema)]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {'CSV': CsvExport, 'Excel': ExcelExport, 'Parquet': ParquetExport}
+
+
+def write_export(batches: Iterable[Sequence[Sequence]], columns: List[Tuple[str, str]], path: str,
+                 export_format: str, progress: Callable[[int, int], None] = None, total: int = None) -> int:
+    """Write batches of rows to path and return how many rows were written
+
+    The file is written under a temporary name and renamed when complete,
+    so a failed or abandoned export never leaves a half-written file at
+    path. progress(rows_written, total) is called after every batch.
+    """
+    partial = path + ".part"
+    writer = WRITERS[export_format](partial, columns)
+    written = 0
+    try:
+        for rows in batches:
+            writer.write(rows)
+            written += len(rows)
+            if progress:
+                progress(written, total)
+        writer.close()
+    except BaseException:
+        try:
+            writer.close()
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        raise
+    os.replace(partial, path)
+    return written
+
+
+def export_dataset(manager, key: str, path: str, export_format: str,
+                   progress: Callable[[int, int], None] = None) -> int:
+    """Stream one of EXPORTS to a file and return the row count
+
+    Rows are read with DatabaseManager.stream_rows, one fetchmany batch at
+    a time, so memory stays flat however many rows there are.
+    """
+    export = EXPORTS[key]
+    with manager.connection() as conn:
+        total = conn.execute(export['count_sql']).fetchone()[0]
+        # Closed explicitly so a failed write hands the connection straight back
+        with closing(manager.stream_rows(export['sql'])) as batches:
+            return write_export(batches, export['columns'], path, export_format, progress, total)
+
+
+def export_report(report: Dict, path: str, export_format: str,
+                  progress: Callable[[int, int], None] = None, batch_rows: int = REPORT_BATCH_ROWS) -> int:
+    """Write a stock report from jsfoods_reports.run_report to a file
+
+    Figures are rounded as the ledger keeps them: weights to the gram,
+    money and ratios to two places. progress is called as in write_export.
+    """
+    decimals = {'kg': 3, 'money': 2, 'pct': 2, 'ratio': 2, 'days': 2}
+    columns = [(field, kind if kind in ('int', 'text') else 'float') for field, _, _, kind in report['columns']]
+    rows = report['rows']
+    batches = ([tuple(round(row[field], decimals[kind]) if kind in decimals and row[field] is not None
+                      else row[field]
+                      for field, _, _, kind in report['columns'])
+                for row in rows[start:start + batch_rows]]
+               for start in range(0, len(rows), batch_rows))
+    return write_export(batches, columns, path, export_format, progress, len(rows))
+
+
+def default_filename(name: str, export_format: str, stamp: str) -> str:
+    """File name for an export, e.g. jsfoods_orders_20250101.csv"""
+    return f"jsfoods_{name}_{stamp}{EXPORT_FORMATS[export_format][0]}"
@@ -0,0 +1,219 @@
+"""
+JS Foods Incremental Export
+Writes the orders, order lines and stock movements added or changed since the last run
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+from contextlib import closing
+from itertools import chain
+from typing import Callable, Dict, Iterable, List, Optional
+
+from jsfoods_database import DatabaseManager
+from jsfoods_export import EXPORT_FORMATS, EXPORTS, available_formats, write_export
+
+# Rows per output file; a run that stops part way carries on at the next file
+INCREMENTAL_BATCH_ROWS = 100000
+# Orders changed in the last minute wait for the next run. A write stamps
+# its orders when it makes them but may commit a moment later, after the
+# export has read past that time, and would otherwise be skipped.
+SETTLE_SECONDS = 60
+
+# Each table is read in key order, after its watermark and up to the bound
+# fixed when the run started. Order lines and stock movements are only ever
+# added, so their rowid is the watermark; orders change status, so they go
+# by last_modified and then order_id.
+INCREMENTAL_EXPORTS = {
+    'orders': {
+        'columns': EXPORTS['orders']['columns'] + [('last_modified', 'text')],
+        'modified': True,
+        'upper_sql': f"SELECT NULL, strftime('%Y-%m-%d %H:%M:%f', 'now', '-{SETTLE_SECONDS} seconds')",
+        'sql': """
+            SELECT o.order_id, o.order_date, o.customer_id, u.username, o.status, o.total_amount,
+                   o.payment_method, o.delivery_date, o.delivery_address, o.last_modified
+            FROM orders o
+            LEFT JOIN users u ON u.user_id = o.customer_id
+            WHERE (o.last_modified, o.order_id) > (:last_modified, :last_id)
+            AND o.last_modified <= :upper_modified
+            ORDER BY o.last_modified, o.order_id
+            LIMIT :limit""",
+    },
+    'order_items': {
+        'columns': EXPORTS['order_items']['columns'],
+        'modified': False,
+        'upper_sql': "SELECT MAX(item_id), NULL FROM order_items",
+        'sql': """
+            SELECT oi.item_id, oi.order_id, o.order_date, oi.product_id, p.name, p.category,
+                   oi.quantity_kg, oi.unit_price, oi.discount_percent, oi.final_price
+            FROM order_items oi
+            JOIN orders o ON o.order_id = oi.order_id
+            LEFT JOIN products p ON p.product_id = oi.product_id
+            WHERE oi.item_id > :last_id AND oi.item_id <= :upper_id
+            ORDER BY oi.item_id
+            LIMIT :limit""",
+    },
+    'stock_transactions': {
+        'columns': EXPORTS['stock_ledger']['columns'],
+        'modified': False,
+        'upper_sql': "SELECT MAX(transaction_id), NULL FROM stock_transactions",
+        'sql': """
+            SELECT st.transaction_id, st.transaction_date, st.product_id, p.name, st.transaction_type,
+                   st.quantity_kg, st.balance_kg, st.user_id, u.username, st.notes
+            FROM stock_transactions st
+            LEFT JOIN products p ON p.product_id = st.product_id
+            LEFT JOIN users u ON u.user_id = st.user_id
+            WHERE st.transaction_id > :last_id AND st.transaction_id <= :upper_id
+            ORDER BY st.transaction_id
+            LIMIT :limit""",
+    },
+}
+
+
+def batch_filename(table: str, state: Dict, export_format: str) -> str:
+    """File name for one batch, e.g. jsfoods_orders_20250101_run00012_0003.csv
+
+    It depends only on the run and batch, so a batch written again after
+    an interrupted run replaces its earlier copy instead of adding a file.
+    """
+    return (f"jsfoods_{table}_{state['run_date']}_run{state['run']:05d}_{state['batch'] + 1:04d}"
+            f"{EXPORT_FORMATS[export_format][0]}")
+
+
+def start_run(manager, table: str) -> Optional[Dict]:
+    """Watermark of table with the bounds of its current run, None if nothing is new
+
+    A run left unfinished keeps its bounds and batch number and is carried
+    on; otherwise a new run is started up to what is committed now.
+    """
+    spec = INCREMENTAL_EXPORTS[table]
+
+    def start(conn):
+        row = conn.execute("SELECT * FROM export_watermarks WHERE table_name = ?", (table,)).fetchone()
+        state = dict(row) if row else {'table_name': table, 'last_id': 0, 'last_modified': '', 'run': 0,
+                                       'run_date': None, 'batch': 0, 'upper_id': None, 'upper_modified': None}
+        state['resumed'] = state['upper_id'] is not None or state['upper_modified'] is not None
+        if state['resumed']:
+            return state
+        state['upper_id'], state['upper_modified'] = conn.execute(spec['upper_sql']).fetchone()
+        if not conn.execute(f"SELECT EXISTS ({spec['sql']})", dict(state, limit=1)).fetchone()[0]:
+            return None
+        state['run'] += 1
+        state['batch'] = 0
+        state['run_date'] = conn.execute("SELECT strftime('%Y%m%d', 'now')").fetchone()[0]
+        conn.execute('''
+            INSERT OR REPLACE INTO export_watermarks
+                (table_name, last_id, last_modified, run, run_date, batch, upper_id, upper_modified, updated_at)
+            VALUES (:table_name, :last_id, :last_modified, :run, :run_date, 0, :upper_id, :upper_modified,
+                    CURRENT_TIMESTAMP)
+        ''', state)
+        return state
+
+    return manager.write_transaction(start)
+
+
+def advance(manager, state: Dict, last_row: Optional[tuple], finished: bool):
+    """Move the watermark past a batch once its file is in place
+
+    last_row is None when there was nothing left to write, which happens
+    when the previous batch ended exactly on the run's bound.
+    """
+    if last_row is not None:
+        state['last_id'] = last_row[0]
+        if INCREMENTAL_EXPORTS[state['table_name']]['modified']:
+            state['last_modified'] = last_row[-1]
+        state['batch'] += 1
+    if finished:
+        state['upper_id'] = state['upper_modified'] = None
+    manager.write_transaction(lambda conn: conn.execute('''
+        UPDATE export_watermarks
+        SET last_id = :last_id, last_modified = :last_modified, batch = :batch,
+            upper_id = :upper_id, upper_modified = :upper_modified, updated_at = CURRENT_TIMESTAMP
+        WHERE table_name = :table_name
+    ''', state))
+
+
+def export_table(manager, table: str, directory: str, export_format: str = 'CSV',
+                 batch_rows: int = INCREMENTAL_BATCH_ROWS,
+                 progress: Callable[[str, int], None] = None) -> Dict:
+    """Write table's new and changed rows to files of up to batch_rows rows
+
+    The watermark moves after each file is complete, so an interrupted run
+    loses at most the file it was writing and the next one carries on from
+    there under the same names. Returns the run number, the files written
+    and the row count. Raises sqlite3.Error or OSError.
+    """
+    spec = INCREMENTAL_EXPORTS[table]
+    state = start_run(manager, table)
+    result = {'table': table, 'run': state['run'] if state else None,
+              'resumed': bool(state and state['resumed']), 'files': [], 'rows': 0}
+    while state is not None:
+        path = os.path.join(directory, batch_filename(table, state, export_format))
+        last = []
+        count = 0
+        with closing(manager.stream_rows(spec['sql'], dict(state, limit=batch_rows))) as batches:
+            # No file at all rather than one with only a header
+            first = next(batches, None)
+            if first is not None:
+                count = write_export(_remember_last(chain([first], batches), last), spec['columns'], path,
+                                     export_format)
+        finished = count < batch_rows
+        advance(manager, state, last[0] if count else None, finished)
+        if count:
+            result['files'].append(path)
+            result['rows'] += count
+            if progress:
+                progress(table, result['rows'])
+        if finished:
+            break
+    return result
+
+
+def _remember_last(batches: Iterable[List[tuple]], last: List) -> Iterable[List[tuple]]:
+    for rows in batches:
+        last[:] = [rows[-1]]
+        yield rows
+
+
+def export_changes(manager, directory: str, export_format: str = 'CSV', tables: List[str] = None,
+                   batch_rows: int = INCREMENTAL_BATCH_ROWS,
+                   progress: Callable[[str, int], None] = None) -> List[Dict]:
+    """Run export_table for each table (all of INCREMENTAL_EXPORTS by default)"""
+    os.makedirs(directory, exist_ok=True)
+    return [export_table(manager, table, directory, export_format, batch_rows, progress)
+            for table in tables or INCREMENTAL_EXPORTS]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export the orders, order lines and stock movements added or changed since the last run")
+    parser.add_argument("directory", help="folder the files are written to")
+    parser.add_argument("--database", help="database file (default: the app's database)")
+    parser.add_argument("--format", choices=available_formats(), default='CSV', help="file format")
+    parser.add_argument("--tables", nargs="+", choices=list(INCREMENTAL_EXPORTS), help="tables to export (default: all)")
+    parser.add_argument("--batch-rows", type=int, default=INCREMENTAL_BATCH_ROWS, help="rows per file")
+    args = parser.parse_args()
+
+    manager = DatabaseManager(database=args.database)
+    start = time.perf_counter()
+    try:
+        results = export_changes(manager, args.directory, args.format, args.tables, args.batch_rows)
+    except (sqlite3.Error, OSError) as e:
+        print(f"❌ Incremental export error: {e}")
+        print("   Run again to carry on from the last complete file")
+        raise SystemExit(1)
+    finally:
+        manager.close()
+    for result in results:
+        if result['run'] is None:
+            print(f"   {result['table']:<20} nothing new")
+            continue
+        note = " (resumed)" if result['resumed'] else ""
+        print(f"   {result['table']:<20} run {result['run']}{note}: {result['rows']:>10,} rows "
+              f"in {len(result['files'])} file(s)")
+    print(f"✅ Done in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,537 @@
+"""
+JS Foods Query Instrumentation
+Per-statement timing, latency histograms and a slow-query log
+"""
+
+import atexit
+import functools
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from functools import lru_cache
+from logging.handlers import RotatingFileHandler
+from typing import Callable, Dict, List, Optional, Tuple
+
+from jsfoods_cache import TrackedConnection, TrackedCursor
+
+SLOW_QUERY_MS = 100.0
+SLOW_LOG_MAX_BYTES = 1024 * 1024
+SLOW_LOG_BACKUPS = 3
+
+# Set to 1 to group queries by action and warn about N+1 patterns
+TRACK_QUERIES_ENV = 'JSFOODS_TRACK_QUERIES'
+# Same-shape statements in one action before it is reported as N+1
+REPEAT_THRESHOLD = 5
+ACTION_HISTORY = 200
+
+# Upper bounds (ms) of the latency histogram buckets; the last is open-ended
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, float('inf'))
+
+# Only these statements have a query plan worth capturing
+_EXPLAINABLE = re.compile(r"\s*(?:SELECT|INSERT|UPDATE|DELETE|REPLACE|WITH)\b", re.IGNORECASE)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PARAM_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+# Transaction control, settings and query plans are not counted as queries
+_NOT_COUNTED = re.compile(r"\s*(?:BEGIN|COMMIT|END|ROLLBACK|SAVEPOINT|RELEASE|PRAGMA|EXPLAIN)\b", re.IGNORECASE)
+
+
+def normalize_sql(sql: str) -> str:
+    """Statement with literals replaced by ? and whitespace collapsed
+
+    Calls that differ only in their values share a shape, and so share a
+    histogram. IN lists of any length become (?, ...).
+    """
+    shape = _STRING.sub("?", sql)
+    shape = _NUMBER.sub("?", shape)
+    shape = _PARAM_LIST.sub("(?, ...)", shape)
+    return _SPACE.sub(" ", shape).strip()
+
+
+# Statements run with bound parameters repeat exactly, so their shapes cache well
+statement_shape = lru_cache(maxsize=1024)(normalize_sql)
+
+
+class ShapeStats:
+    """Call count, total time and latency histogram for one statement shape"""
+
+    def __init__(self):
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.slow = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def add(self, elapsed_ms: float, slow: bool):
+        self.calls += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.slow += slow
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed_ms <= bound:
+                self.buckets[index] += 1
+                break
+
+    def percentile(self, fraction: float) -> float:
+        """Upper bound of the bucket holding the given fraction of calls, capped at the max"""
+        rank = fraction * self.calls
+        seen = 0
+        for count, bound in zip(self.buckets, LATENCY_BUCKETS):
+            seen += count
+            if seen >= rank and count:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+
+class QueryStats:
+    """Timing for every statement run on an instrumented connection
+
+    Statements are grouped by shape (see statement_shape). Any statement
+    slower than slow_ms is also written, with its parameters and
+    EXPLAIN QUERY PLAN, to a rotating log file; slow_ms <= 0 turns the
+    log off. Times cover execute(), which is where SQLite does the work
+    for a statement's first row; fetching further rows is not included.
+    """
+
+    def __init__(self, slow_ms: float = SLOW_QUERY_MS, log_path: str = None):
+        self.slow_ms = slow_ms
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._shapes: Dict[str, ShapeStats] = {}
+        # Failed statements by error message, e.g. "database is locked"
+        self._errors: Counter = Counter()
+        self._logger = None
+
+    def record(self, conn: sqlite3.Connection, sql: str, params, elapsed_ms: float):
+        """Add one execution, logging it if it was slow"""
+        shape = statement_shape(sql)
+        slow = 0 < self.slow_ms <= elapsed_ms
+        with self._lock:
+            stats = self._shapes.get(shape)
+            if stats is None:
+                stats = self._shapes[shape] = ShapeStats()
+            stats.add(elapsed_ms, slow)
+        if slow:
+            self.log_slow(conn, sql, params, elapsed_ms)
+
+    def record_error(self, conn: sqlite3.Connection, sql: str, params, elapsed_ms: float, error: sqlite3.Error):
+        """Add one failed execution; its time still counts towards the shape"""
+        with self._lock:
+            self._errors[str(error)] += 1
+        self.record(conn, sql, params, elapsed_ms)
+
+    def errors(self) -> Dict[str, int]:
+        """How many statements failed with each error message"""
+        with self._lock:
+            return dict(self._errors)
+
+    def log_slow(self, conn: sqlite3.Connection, sql: str, params, elapsed_ms: float):
+        """Write a slow statement, its parameters and its query plan to the log"""
+        print(f"🐢 Slow query ({elapsed_ms:.0f} ms): {statement_shape(sql)[:100]}")
+        if not self.log_path:
+            return
+        plan = explain(conn, sql, params) if isinstance(params, (tuple, list, dict)) else []
+        lines = [f"{elapsed_ms:.1f} ms", sql.strip(), f"params: {params!r}"]
+        if plan:
+            lines += ["plan:"] + [f"  {line}" for line in plan]
+        try:
+            self._get_logger().warning("\n".join(lines) + "\n")
+        except OSError as e:
+            print(f"⚠️ Slow query log error: {e}")
+
+    def _get_logger(self) -> logging.Logger:
+        """Logger writing to log_path, created on the first slow query"""
+        with self._lock:
+            if self._logger is None:
+                logger = logging.getLogger(f"jsfoods.slow_queries.{id(self)}")
+                logger.propagate = False
+                handler = RotatingFileHandler(self.log_path, maxBytes=SLOW_LOG_MAX_BYTES,
+                                              backupCount=SLOW_LOG_BACKUPS, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("[%(asctime)s] %(message)s"))
+                logger.addHandler(handler)
+                self._logger = logger
+            return self._logger
+
+    def snapshot(self) -> List[Dict]:
+        """Stats per shape, most total time first"""
+        with self._lock:
+            rows = [
+                {
+                    'shape': shape,
+                    'calls': stats.calls,
+                    'total_ms': stats.total_ms,
+                    'mean_ms': stats.total_ms / stats.calls,
+                    'p50_ms': stats.percentile(0.5),
+                    'p95_ms': stats.percentile(0.95),
+                    'max_ms': stats.max_ms,
+                    'slow': stats.slow,
+                    'histogram': dict(zip(LATENCY_BUCKETS, stats.buckets))
+                }
+                for shape, stats in self._shapes.items()
+            ]
+        rows.sort(key=lambda row: row['total_ms'], reverse=True)
+        return rows
+
+    def reset(self):
+        """Forget everything recorded so far"""
+        with self._lock:
+            self._shapes = {}
+            self._errors = Counter()
+
+    def close(self):
+        """Close the slow-query log file"""
+        with self._lock:
+            if self._logger is not None:
+                for handler in list(self._logger.handlers):
+                    handler.close()
+                    self._logger.removeHandler(handler)
+                self._logger = None
+
+
+class WriteStats:
+    """Counters for write transactions run through DatabaseManager.write_transaction
+
+    wait_ms is the time from asking for a write until the write lock was
+    held: SQLite's busy handler, failed attempts and the backoff sleeps
+    between them. A failure is a write that was still locked out after
+    its last retry.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def record(self, retries: int, wait_ms: float, failed: bool = False):
+        """Add one write transaction, whether it committed or gave up"""
+        with self._lock:
+            self._writes += 1
+            self._retries += retries
+            self._failures += failed
+            self._wait_ms += wait_ms
+            self._max_wait_ms = max(self._max_wait_ms, wait_ms)
+
+    def snapshot(self) -> Dict:
+        """Totals so far and the mean wait per write"""
+        with self._lock:
+            return {
+                'writes': self._writes,
+                'retries': self._retries,
+                'failures': self._failures,
+                'wait_ms': self._wait_ms,
+                'mean_wait_ms': self._wait_ms / self._writes if self._writes else 0.0,
+                'max_wait_ms': self._max_wait_ms
+            }
+
+    def reset(self):
+        """Forget everything recorded so far"""
+        with self._lock:
+            self._writes = 0
+            self._retries = 0
+            self._failures = 0
+            self._wait_ms = 0.0
+            self._max_wait_ms = 0.0
+
+
+def explain(conn: sqlite3.Connection, sql: str, params=()) -> List[str]:
+    """EXPLAIN QUERY PLAN for a statement as indented lines, [] if it has none"""
+    if not _EXPLAINABLE.match(sql):
+        return []
+    try:
+        # The base class method, so the plan itself is not timed or tracked
+        rows = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    except sqlite3.Error as e:
+        return [f"(plan unavailable: {e})"]
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node] + detail)
+    return lines
+
+
+class InstrumentedCursor(TrackedCursor):
+    """Cursor that times each statement into its connection's QueryStats"""
+
+    def execute(self, sql, *args):
+        query_tracker.statement()
+        stats = self.connection.query_stats
+        if stats is None:
+            return super().execute(sql, *args)
+        started = time.perf_counter()
+        try:
+            result = super().execute(sql, *args)
+        except sqlite3.Error as e:
+            stats.record_error(self.connection, sql, args[0] if args else (), (time.perf_counter() - started) * 1000, e)
+            raise
+        stats.record(self.connection, sql, args[0] if args else (), (time.perf_counter() - started) * 1000)
+        return result
+
+    def executemany(self, sql, *args):
+        stats = self.connection.query_stats
+        with query_tracker.batch():
+            if stats is None:
+                return super().executemany(sql, *args)
+            started = time.perf_counter()
+            try:
+                result = super().executemany(sql, *args)
+            except sqlite3.Error as e:
+                stats.record_error(self.connection, sql, "(executemany)", (time.perf_counter() - started) * 1000, e)
+                raise
+        stats.record(self.connection, sql, "(executemany)", (time.perf_counter() - started) * 1000)
+        return result
+
+
+class InstrumentedConnection(TrackedConnection):
+    """Pooled connection that times statements as well as tracking writes
+
+    query_stats is set by the pool; while it is None nothing is timed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.query_stats: Optional[QueryStats] = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, *args):
+        query_tracker.statement()
+        if self.query_stats is None:
+            return super().execute(sql, *args)
+        started = time.perf_counter()
+        try:
+            result = super().execute(sql, *args)
+        except sqlite3.Error as e:
+            self.query_stats.record_error(self, sql, args[0] if args else (), (time.perf_counter() - started) * 1000, e)
+            raise
+        self.query_stats.record(self, sql, args[0] if args else (), (time.perf_counter() - started) * 1000)
+        return result
+
+    def executemany(self, sql, *args):
+        with query_tracker.batch():
+            if self.query_stats is None:
+                return super().executemany(sql, *args)
+            started = time.perf_counter()
+            try:
+                result = super().executemany(sql, *args)
+            except sqlite3.Error as e:
+                self.query_stats.record_error(self, sql, "(executemany)", (time.perf_counter() - started) * 1000, e)
+                raise
+        self.query_stats.record(self, sql, "(executemany)", (time.perf_counter() - started) * 1000)
+        return result
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised by QueryTracker.expect when a block runs more queries than allowed"""
+
+
+class ActionReport:
+    """Statements run during one action"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.elapsed_ms = 0.0
+        self.statements: Counter = Counter()
+        # Set as each execute starts; cleared once its statement is counted
+        self.fresh = False
+        # Set while an executemany runs; only its first row is counted
+        self.in_batch = False
+        self._batch_counted = False
+
+    def add(self, statement: str):
+        if _NOT_COUNTED.match(statement):
+            return
+        if self.in_batch:
+            if self._batch_counted:
+                return
+            self._batch_counted = True
+        elif not self.fresh:
+            # SQLite reports each step of a trigger with the text of the
+            # statement that fired it; only the first report after an
+            # execute is that statement itself
+            return
+        self.fresh = False
+        self.statements[statement] += 1
+
+    @property
+    def queries(self) -> int:
+        return sum(self.statements.values())
+
+    def shapes(self) -> Counter:
+        """Statement count per shape"""
+        shapes = Counter()
+        for statement, count in self.statements.items():
+            shapes[normalize_sql(statement)] += count
+        return shapes
+
+    def repeated(self, threshold: int = REPEAT_THRESHOLD) -> List[Tuple[str, int]]:
+        """Shapes run at least threshold times, most first"""
+        return [(shape, count) for shape, count in self.shapes().most_common() if count >= threshold]
+
+
+class QueryTracker:
+    """Groups the SQL run during one UI action or DatabaseManager call
+
+    Pooled connections pass every statement to trace() through
+    sqlite3's trace callback. Statements are credited to the action
+    running on the same thread; nested actions (a DatabaseManager method
+    called from a portal handler) join the outermost one. When an action
+    runs the same statement shape repeat_threshold times or more, the
+    shape is reported once as a likely N+1 query.
+
+    Tracking is off unless enabled, or JSFOODS_TRACK_QUERIES=1 is set,
+    in which case a summary is printed at exit.
+    """
+
+    def __init__(self, repeat_threshold: int = REPEAT_THRESHOLD, enabled: bool = False):
+        self.repeat_threshold = repeat_threshold
+        self.enabled = enabled
+        self.recent = deque(maxlen=ACTION_HISTORY)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._summary: Dict[str, Dict] = {}
+        self._flagged = set()
+
+    def trace(self, statement: str):
+        """sqlite3 trace callback"""
+        report = getattr(self._local, 'report', None)
+        if report is not None:
+            report.add(statement)
+
+    def statement(self):
+        """Mark the start of an execute, so its trigger steps can be told apart from a repeat"""
+        report = getattr(self._local, 'report', None)
+        if report is not None:
+            report.fresh = True
+
+    @contextmanager
+    def batch(self):
+        """Count the statements of one executemany as a single query"""
+        report = getattr(self._local, 'report', None)
+        if report is None:
+            yield
+            return
+        report.in_batch, report._batch_counted = True, False
+        try:
+            yield
+        finally:
+            report.in_batch = False
+
+    @contextmanager
+    def action(self, name: str):
+        """Credit the SQL run inside this block to an action called name"""
+        if not self.enabled or getattr(self._local, 'report', None) is not None:
+            yield getattr(self._local, 'report', None)
+            return
+        report = ActionReport(name)
+        self._local.report = report
+        try:
+            yield report
+        finally:
+            self._local.report = None
+            self._finish(report)
+
+    def _finish(self, report: ActionReport):
+        report.elapsed_ms = (time.perf_counter() - report.started) * 1000
+        repeated = report.repeated(self.repeat_threshold)
+        with self._lock:
+            self.recent.append(report)
+            summary = self._summary.setdefault(report.name, {
+                'action': report.name, 'runs': 0, 'queries': 0, 'max_queries': 0, 'repeated': {}
+            })
+            summary['runs'] += 1
+            summary['queries'] += report.queries
+            summary['max_queries'] = max(summary['max_queries'], report.queries)
+            new = []
+            for shape, count in repeated:
+                summary['repeated'][shape] = max(summary['repeated'].get(shape, 0), count)
+                if (report.name, shape) not in self._flagged:
+                    self._flagged.add((report.name, shape))
+                    new.append((shape, count))
+        for shape, count in new:
+            print(f"🔁 Possible N+1 in {report.name}: {count} x {shape[:100]}")
+
+    @contextmanager
+    def expect(self, max_queries: int = None, max_repeats: int = None, name: str = "expected block"):
+        """Fail if the block runs more queries, or more of one shape, than allowed
+
+        Tracks the block even while tracking is otherwise off, so tests can
+        pin the query count of an action:
+
+            with query_tracker.expect(max_queries=3):
+                db.get_order_details(order_id)
+
+        Only this thread's statements are counted, and actions inside the
+        block join it. Inside an action, the block's statements are also
+        added to that action's report. Raises QueryBudgetExceeded when the
+        block finishes over budget.
+        """
+        previous_report = getattr(self._local, 'report', None)
+        report = ActionReport(name)
+        self._local.report = report
+        try:
+            yield report
+        finally:
+            self._local.report = previous_report
+            if previous_report is not None:
+                previous_report.statements.update(report.statements)
+        problems = []
+        if max_queries is not None and report.queries > max_queries:
+            problems.append(f"{report.queries} queries, expected at most {max_queries}")
+        if max_repeats is not None:
+            for shape, count in report.repeated(max_repeats + 1):
+                problems.append(f"{count} x {shape}")
+        if problems:
+            raise QueryBudgetExceeded(f"{name}: " + "; ".join(problems))
+
+    def summary(self) -> List[Dict]:
+        """Per action: runs, total and largest query count, repeated shapes"""
+        with self._lock:
+            rows = [dict(row, repeated=dict(row['repeated'])) for row in self._summary.values()]
+        for row in rows:
+            row['mean_queries'] = row['queries'] / row['runs']
+        rows.sort(key=lambda row: row['max_queries'], reverse=True)
+        return rows
+
+    def print_summary(self):
+        """Print query counts per action, largest first"""
+        rows = self.summary()
+        if not rows:
+            return
+        print("🔎 Queries per action (runs, mean, max):")
+        for row in rows:
+            print(f"   {row['action']:<45} {row['runs']:>5} {row['mean_queries']:>7.1f} {row['max_queries']:>5}")
+            for shape, count in row['repeated'].items():
+                print(f"      🔁 {count} x {shape[:90]}")
+
+    def reset(self):
+        """Forget every finished action"""
+        with self._lock:
+            self.recent.clear()
+            self._summary = {}
+            self._flagged = set()
+
+
+query_tracker = QueryTracker(enabled=os.environ.get(TRACK_QUERIES_ENV) == '1')
+if query_tracker.enabled:
+    atexit.register(query_tracker.print_summary)
+
+
+def tracked_action(func: Callable) -> Callable:
+    """Decorator: run a method as a query_tracker action named after it"""
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not query_tracker.enabled:
+            return func(*args, **kwargs)
+        with query_tracker.action(name):
+            return func(*args, **kwargs)
+    return wrapper
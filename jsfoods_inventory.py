@@ -4,15 +4,32 @@ Advanced inventory tracking and management
 """
 
 import customtkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 import sqlite3
-import subprocess
 from datetime import datetime
+from jsfoods_background import BackgroundRunner
+from jsfoods_changes import ChangeFeed
 from jsfoods_database import db
+from jsfoods_export import EXPORT_FORMATS, available_formats, default_filename, export_report
+from jsfoods_instrumentation import tracked_action
+from jsfoods_reports import REPORT_PERIODS, STOCK_REPORTS, page_count, report_page, run_report
+from jsfoods_widgets import TreeviewBinding
 
-class InventoryManager(tk.CTk):
-    def __init__(self):
-        super().__init__()
+STOCK_STATUS_COLORS = {
+    "Out of Stock": "red",
+    "Very Low": "red",
+    "Low": "orange",
+    "Warning": "#FFC107",
+    "Good": "#4CAF50",
+    "Inactive": "#757575"
+}
+
+class InventoryManager(tk.CTkToplevel):
+    def __init__(self, shell, user=None):
+        super().__init__(shell)
+        self.shell = shell
+        # Stock movements made here are logged against this user
+        self.user_id = user['user_id'] if user else None
         
         self.title("JS Foods - Inventory Management")
         self.geometry("1200x700")
@@ -21,9 +38,17 @@ class InventoryManager(tk.CTk):
         tk.set_appearance_mode("light")
         tk.set_default_color_theme("blue")
         
+        # Queries run here so a slow report never freezes the window
+        self.background = BackgroundRunner(self)
+        # Products on the low stock alerts tab
+        self.low_stock_ids = set()
+        
         self.setup_ui()
         self.load_inventory()
         self.load_low_stock()
+        
+        # Stock moved by other windows or processes shows up by itself
+        self.changes = ChangeFeed(self, db, {'products': self.apply_product_changes}, on_reset=self.reload_all)
     
     def setup_ui(self):
         """Setup inventory management UI"""
@@ -124,39 +149,49 @@ class InventoryManager(tk.CTk):
         ).pack(side="right", padx=20)
     
     def load_inventory(self):
-        """Load inventory data and statistics"""
-        try:
-            conn = sqlite3.connect('jsfoods.db')
-            cursor = conn.cursor()
-            
-            # Get total inventory value
-            cursor.execute("""
+        """Load inventory statistics in the background"""
+        for label in self.stats_labels.values():
+            label.configure(text="…")
+        self.refresh_inventory_stats()
+    
+    def refresh_inventory_stats(self):
+        """Re-read the header stats, keeping the current figures until they arrive"""
+        self.background.submit(
+            "inventory_stats",
+            self.fetch_inventory_stats,
+            on_done=self.show_inventory_stats,
+            on_error=lambda e: print(f"Inventory stats error: {e}")
+        )
+    
+    @tracked_action
+    def fetch_inventory_stats(self):
+        """Read the inventory totals; runs on a worker thread"""
+        # Get total inventory value
+        with db.connection() as conn:
+            result = conn.execute("""
                 SELECT SUM(p.current_stock_kg * p.price_per_kg) as total_value,
                        COUNT(*) as total_items
                 FROM products p
                 WHERE p.is_active = 1
-            """)
-            
-            result = cursor.fetchone()
-            total_value = result[0] or 0
-            total_items = result[1] or 0
-            
-            # Get low stock count
-            low_stock = db.get_low_stock_items()
-            low_count = len(low_stock)
-            
-            # Update stats
-            self.stats_labels['total_value'].configure(text=f"£{total_value:.2f}")
-            self.stats_labels['total_items'].configure(text=str(total_items))
-            self.stats_labels['low_stock'].configure(text=str(low_count))
-            
-        except sqlite3.Error as e:
-            print(f"Inventory stats error: {e}")
+            """).fetchone()
+        
+        # Get low stock count
+        low_stock = db.get_low_stock_items()
+        return result[0] or 0, result[1] or 0, len(low_stock)
+    
+    def show_inventory_stats(self, stats):
+        """Update the header stats with fetched totals"""
+        total_value, total_items, low_count = stats
+        self.stats_labels['total_value'].configure(text=f"£{total_value:.2f}")
+        self.stats_labels['total_items'].configure(text=str(total_items))
+        self.stats_labels['low_stock'].configure(text=str(low_count))
     
+    @tracked_action
     def load_low_stock(self):
         """Load low stock items"""
         try:
             low_stock = db.get_low_stock_items()
+            self.low_stock_ids = {item['product_id'] for item in low_stock}
             
             # Update low stock tab
             tab = self.tabview.tab("⚠️ Low Stock Alerts")
@@ -355,9 +390,12 @@ class InventoryManager(tk.CTk):
             self.inv_tree.heading(col, text=col)
             self.inv_tree.column(col, width=width, anchor=anchor)
         
+        self.inv_rows = TreeviewBinding(self.inv_tree, STOCK_STATUS_COLORS)
+        
         # Load initial inventory
         self.filter_inventory()
     
+    @tracked_action
     def filter_inventory(self, event=None):
         """Filter inventory by category"""
         try:
@@ -366,53 +404,74 @@ class InventoryManager(tk.CTk):
             
             products = db.get_products(category=category, active_only=False)
             
-            # Clear existing items
-            for item in self.inv_tree.get_children():
-                self.inv_tree.delete(item)
+            rows = [self.product_row(product) for product in products]
             
-            # Add products
-            for product in products:
-                stock = product['current_stock_kg']
-                min_stock = product['min_stock_level']
-                stock_value = stock * product['price_per_kg']
-                
-                # Determine status
-                if stock <= 0:
-                    status = "Out of Stock"
-                    status_color = "red"
-                elif stock <= min_stock * 0.2:
-                    status = "Very Low"
-                    status_color = "red"
-                elif stock <= min_stock * 0.5:
-                    status = "Low"
-                    status_color = "orange"
-                elif stock <= min_stock:
-                    status = "Warning"
-                    status_color = "#FFC107"
-                else:
-                    status = "Good"
-                    status_color = "#4CAF50"
-                
-                # Determine active status
-                if not product['is_active']:
-                    status = "Inactive"
-                    status_color = "#757575"
-                
-                self.inv_tree.insert("", "end", values=(
-                    product['product_id'],
-                    product['name'],
-                    product['category'],
-                    f"{stock:.1f}",
-                    product['unit'],
-                    f"£{product['price_per_kg']:.2f}",
-                    f"£{stock_value:.2f}",
-                    status
-                ), tags=(status,))
-                
-                self.inv_tree.tag_configure(status, foreground=status_color)
+            # Only rows that changed since the last refresh touch the table
+            self.inv_rows.set_rows(rows)
                 
         except sqlite3.Error as e:
             messagebox.showerror("Database Error", f"Could not load inventory: {e}")
+    
+    def product_row(self, product):
+        """Treeview key, values and tags for one product"""
+        stock = product['current_stock_kg']
+        min_stock = product['min_stock_level']
+        stock_value = stock * product['price_per_kg']
+        
+        # Determine status
+        if stock <= 0:
+            status = "Out of Stock"
+        elif stock <= min_stock * 0.2:
+            status = "Very Low"
+        elif stock <= min_stock * 0.5:
+            status = "Low"
+        elif stock <= min_stock:
+            status = "Warning"
+        else:
+            status = "Good"
+        
+        # Determine active status
+        if not product['is_active']:
+            status = "Inactive"
+        
+        return product['product_id'], (
+            product['product_id'],
+            product['name'],
+            product['category'],
+            f"{stock:.1f}",
+            product['unit'],
+            f"£{product['price_per_kg']:.2f}",
+            f"£{stock_value:.2f}",
+            status
+        ), (status,)
+    
+    @tracked_action
+    def apply_product_changes(self, product_ids):
+        """Update, add or drop just these products, then refresh the totals
+        
+        The low stock alerts are rebuilt only if a changed product is on the
+        list or now belongs on it.
+        """
+        category = self.category_filter.get()
+        changed = db.get_products_by_ids(sorted(product_ids))
+        shown = {product['product_id']: product for product in changed
+                 if category == "All" or product['category'] == category}
+        rows = {row[0]: row for row in self.inv_rows.rows()}
+        for product_id in product_ids:
+            if product_id in shown:
+                rows[product_id] = self.product_row(shown[product_id])
+            else:
+                rows.pop(product_id, None)
+        self.inv_rows.set_rows(sorted(rows.values(), key=lambda row: row[0]))
+        self.refresh_inventory_stats()
+        
+        # Same rule as get_low_stock_items
+        now_low = {product['product_id'] for product in changed
+                   if product['is_active'] and product['current_stock_kg'] <= product['min_stock_level'] * 0.2}
+        if now_low or self.low_stock_ids & set(product_ids):
+            self.load_low_stock()
+    
+    @tracked_action
     def delete_product(self):
         """Delete the selected product, but only if it has no orders or stock transactions."""
         selection = self.inv_tree.selection()
@@ -427,16 +486,14 @@ class InventoryManager(tk.CTk):
 
         # Check if product is used in any order items
         try:
-            conn = sqlite3.connect('jsfoods.db')
-            cursor = conn.cursor()
-
-            cursor.execute("SELECT COUNT(*) FROM order_items WHERE product_id = ?", (product_id,))
-            order_items_count = cursor.fetchone()[0]
+            with db.connection() as conn:
+                cursor = conn.cursor()
 
-            cursor.execute("SELECT COUNT(*) FROM stock_transactions WHERE product_id = ?", (product_id,))
-            stock_transactions_count = cursor.fetchone()[0]
+                cursor.execute("SELECT COUNT(*) FROM order_items WHERE product_id = ?", (product_id,))
+                order_items_count = cursor.fetchone()[0]
 
-            conn.close()
+                cursor.execute("SELECT COUNT(*) FROM stock_transactions WHERE product_id = ?", (product_id,))
+                stock_transactions_count = cursor.fetchone()[0]
 
             if order_items_count > 0 or stock_transactions_count > 0:
                 messagebox.showerror(
@@ -459,11 +516,8 @@ class InventoryManager(tk.CTk):
             "This action cannot be undone."
         ):
             try:
-                conn = sqlite3.connect('jsfoods.db')
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM products WHERE product_id = ?", (product_id,))
-                conn.commit()
-                conn.close()
+                with db.transaction() as conn:
+                    conn.execute("DELETE FROM products WHERE product_id = ?", (product_id,))
 
                 messagebox.showinfo("Success", f"Product '{product_name}' deleted successfully.")
                 self.filter_inventory()   # Refresh the inventory list
@@ -577,65 +631,37 @@ class InventoryManager(tk.CTk):
                     messagebox.showerror("Error", "Please enter valid positive numbers")
                     return
                 
-                # Save to database using direct SQL
-                try:
-                    conn = sqlite3.connect('jsfoods.db')
+                # Save to database using direct SQL; the initial stock is a stock
+                # movement, so it goes through the locked write path
+                def insert_product(conn):
                     cursor = conn.cursor()
                     
+                    # Check for duplicate product name
+                    cursor.execute("SELECT product_id FROM products WHERE name = ?", (name,))
+                    if cursor.fetchone():
+                        return None
+                    
                     # Insert new product
                     cursor.execute('''
                         INSERT INTO products 
                         (name, category, price_per_kg, current_stock_kg, min_stock_level, unit, description, is_active)
                         VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                     ''', (name, category_var.get(), price, stock, min_stock, "kg", description, 1))
-                    
-                    conn.commit()
                     product_id = cursor.lastrowid
                     
                     # Record initial stock transaction
                     cursor.execute('''
                         INSERT INTO stock_transactions 
-                        (product_id, transaction_type, quantity_kg, notes)
-                        VALUES (?, ?, ?, ?)
-                    ''', (product_id, "initial", stock, f"Initial stock for new product '{name}'"))
-                    
-                    
-                   
-                    
-                            # ✅ NEW: Check for duplicate product name
-                    cursor.execute("SELECT product_id FROM products WHERE name = ?", (name,))
-                    if cursor.fetchone():
+                        (product_id, transaction_type, quantity_kg, notes, user_id)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', (product_id, "initial", stock, f"Initial stock for new product '{name}'", self.user_id))
+                    return product_id
+                
+                try:
+                    product_id = db.write_transaction(insert_product)
+                    if product_id is None:
                         messagebox.showerror("Error", f"A product named '{name}' already exists. Use a different name.")
-                        conn.close()
                         return
-
-                    # Insert new product (only if no duplicate)
-                    cursor.execute('''
-                        INSERT INTO products 
-                        (name, category, price_per_kg, current_stock_kg, min_stock_level, unit, description, is_active)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (name, category_var.get(), price, stock, min_stock, "kg", description, 1))
-                    
-                    conn.commit()
-                    product_id = cursor.lastrowid
-
-                    # Record initial stock transaction
-                    cursor.execute('''
-                        INSERT INTO stock_transactions 
-                        (product_id, transaction_type, quantity_kg, notes)
-                        VALUES (?, ?, ?, ?)
-                    ''', (product_id, "initial", stock, f"Initial stock for new product '{name}'"))
-                    
-                    conn.commit()
-                    conn.close()
-                    
-                    messagebox.showinfo("Product Added", f"Product '{name}' added successfully!")
-                    add_window.destroy()
-                    self.filter_inventory()
-                    self.load_inventory()
-                    
-                except sqlite3.Error as e:
-                    messagebox.showerror("Database Error", f"Could not save product: {e}")
                     
                     messagebox.showinfo(
                         "Product Added",
@@ -794,60 +820,32 @@ class InventoryManager(tk.CTk):
                 product_id = int(product_text.split(":")[0])
                 
                 # Update database
-                try:
-                    conn = sqlite3.connect('jsfoods.db')
-                    cursor = conn.cursor()
-                    
-                    # Get current stock
-                    cursor.execute('SELECT current_stock_kg FROM products WHERE product_id = ?', (product_id,))
-                    result = cursor.fetchone()
-                    if not result:
-                        messagebox.showerror("Error", "Product not found in database")
-                        return
-                    
-                    current_stock = result[0]
-                    new_stock = current_stock + quantity
-                    
-                    # Update product stock
-                    cursor.execute('''
-                        UPDATE products 
-                        SET current_stock_kg = ?
-                        WHERE product_id = ?
-                    ''', (new_stock, product_id))
-                    
-                    # Record transaction
-                    cursor.execute('''
-                        INSERT INTO stock_transactions 
-                        (product_id, transaction_type, quantity_kg, notes)
-                        VALUES (?, ?, ?, ?)
-                    ''', (product_id, "receive", quantity, f"Received from {supplier}. Batch: {batch}. {notes}"))
-                    
-                    conn.commit()
-                    conn.close()
-                    
-                    messagebox.showinfo(
-                        "Stock Received",
-                        f"Stock received successfully!\n\n"
-                        f"Product: {product_text}\n"
-                        f"Quantity: {quantity} kg\n"
-                        f"Supplier: {supplier}\n"
-                        f"New Stock Level: {new_stock} kg\n\n"
-                        "Stock levels have been updated."
-                    )
-                    
-                    # Clear form
-                    quantity_entry.delete(0, tk.END)
-                    supplier_entry.delete(0, tk.END)
-                    batch_entry.delete(0, tk.END)
-                    notes_text.delete("1.0", tk.END)
-                    
-                    # Refresh inventory
-                    self.filter_inventory()
-                    self.load_inventory()
-                    self.load_low_stock()
-                    
-                except sqlite3.Error as e:
-                    messagebox.showerror("Database Error", f"Could not update stock: {e}")
+                new_stock = db.receive_stock(product_id, quantity, f"Received from {supplier}. Batch: {batch}. {notes}",
+                                             self.user_id)
+                if new_stock is None:
+                    messagebox.showerror("Database Error", "Could not update stock. Please try again.")
+                    return
+                
+                messagebox.showinfo(
+                    "Stock Received",
+                    f"Stock received successfully!\n\n"
+                    f"Product: {product_text}\n"
+                    f"Quantity: {quantity} kg\n"
+                    f"Supplier: {supplier}\n"
+                    f"New Stock Level: {new_stock} kg\n\n"
+                    "Stock levels have been updated."
+                )
+                
+                # Clear form
+                quantity_entry.delete(0, tk.END)
+                supplier_entry.delete(0, tk.END)
+                batch_entry.delete(0, tk.END)
+                notes_text.delete("1.0", tk.END)
+                
+                # Refresh inventory
+                self.filter_inventory()
+                self.load_inventory()
+                self.load_low_stock()
                 
             except Exception as e:
                 messagebox.showerror("Error", f"An error occurred: {str(e)}")
@@ -999,72 +997,40 @@ class InventoryManager(tk.CTk):
                 # Extract product ID
                 product_id = int(product_text.split(":")[0])
                 
-                # Update database
-                try:
-                    conn = sqlite3.connect('jsfoods.db')
-                    cursor = conn.cursor()
-                    
-                    # Get current stock
-                    cursor.execute('SELECT current_stock_kg FROM products WHERE product_id = ?', (product_id,))
-                    result = cursor.fetchone()
-                    if not result:
-                        messagebox.showerror("Error", "Product not found in database")
+                # Check if removing more than available
+                if adjust_type.get() == "remove":
+                    product = db.get_product_by_id(product_id)
+                    if product and amount > product['current_stock_kg']:
+                        messagebox.showerror("Error", f"Cannot remove {amount} kg. Only {product['current_stock_kg']} kg available.")
                         return
-                    
-                    current_stock = result[0]
-                    
-                    # Check if removing more than available
-                    if adjust_type.get() == "remove" and amount > current_stock:
-                        messagebox.showerror("Error", f"Cannot remove {amount} kg. Only {current_stock} kg available.")
-                        return
-                    
-                    # Calculate new stock
-                    if adjust_type.get() == "add":
-                        new_stock = current_stock + amount
-                        action = "added"
-                        transaction_type = "adjustment_add"
-                    else:
-                        new_stock = current_stock - amount
-                        action = "removed"
-                        transaction_type = "adjustment_remove"
-                    
-                    # Update product stock
-                    cursor.execute('''
-                        UPDATE products 
-                        SET current_stock_kg = ?
-                        WHERE product_id = ?
-                    ''', (new_stock, product_id))
-                    
-                    # Record transaction
-                    cursor.execute('''
-                        INSERT INTO stock_transactions 
-                        (product_id, transaction_type, quantity_kg, notes)
-                        VALUES (?, ?, ?, ?)
-                    ''', (product_id, transaction_type, amount, f"Stock adjustment - Reason: {reason}. {notes}"))
-                    
-                    conn.commit()
-                    conn.close()
-                    
-                    messagebox.showinfo(
-                        "Stock Adjusted",
-                        f"Stock adjustment successful!\n\n"
-                        f"Product: {product_text.split(':')[1].split('(')[0].strip()}\n"
-                        f"Amount {action}: {amount} kg\n"
-                        f"New Stock Level: {new_stock} kg\n"
-                        f"Reason: {reason}"
-                    )
-                    
-                    # Clear form
-                    amount_entry.delete(0, tk.END)
-                    notes_text.delete("1.0", tk.END)
-                    
-                    # Refresh inventory
-                    self.filter_inventory()
-                    self.load_inventory()
-                    self.load_low_stock()
-                    
-                except sqlite3.Error as e:
-                    messagebox.showerror("Database Error", f"Could not update stock: {e}")
+                    change, action = -amount, "removed"
+                else:
+                    change, action = amount, "added"
+                
+                # Update database
+                new_stock = db.adjust_stock(product_id, change, f"Stock adjustment - Reason: {reason}. {notes}",
+                                            self.user_id)
+                if new_stock is None:
+                    messagebox.showerror("Database Error", "Could not update stock. Please try again.")
+                    return
+                
+                messagebox.showinfo(
+                    "Stock Adjusted",
+                    f"Stock adjustment successful!\n\n"
+                    f"Product: {product_text.split(':')[1].split('(')[0].strip()}\n"
+                    f"Amount {action}: {amount} kg\n"
+                    f"New Stock Level: {new_stock} kg\n"
+                    f"Reason: {reason}"
+                )
+                
+                # Clear form
+                amount_entry.delete(0, tk.END)
+                notes_text.delete("1.0", tk.END)
+                
+                # Refresh inventory
+                self.filter_inventory()
+                self.load_inventory()
+                self.load_low_stock()
                 
             except Exception as e:
                 messagebox.showerror("Error", f"An error occurred: {str(e)}")
@@ -1119,29 +1085,20 @@ class InventoryManager(tk.CTk):
         reports_frame = tk.CTkFrame(content_frame)
         reports_frame.pack(fill="both", expand=True, padx=20, pady=10)
         
-        reports = [
-            ("📋 Stock Summary", "Overview of all inventory items"),
-            ("📈 Stock Movement", "Stock changes over time"),
-            ("💰 Stock Value", "Total inventory value by category"),
-            ("⚠️ Low Stock Report", "Items below minimum levels"),
-            ("📊 Turnover Rate", "Inventory turnover analysis"),
-            ("📋 Supplier Report", "Stock received by supplier")
-        ]
-        
-        for i, (title, description) in enumerate(reports):
+        for i, (key, report) in enumerate(STOCK_REPORTS.items()):
             report_frame = tk.CTkFrame(reports_frame, height=80)
             report_frame.grid(row=i//2, column=i%2, padx=10, pady=10, sticky="nsew")
             report_frame.grid_propagate(False)
             
             tk.CTkLabel(
                 report_frame,
-                text=title,
+                text=report['title'],
                 font=("Helvetica", 14, "bold")
             ).place(x=20, y=15)
             
             tk.CTkLabel(
                 report_frame,
-                text=description,
+                text=report['description'],
                 font=("Helvetica", 11),
                 text_color="#666666"
             ).place(x=20, y=40)
@@ -1151,7 +1108,7 @@ class InventoryManager(tk.CTk):
                 text="Generate",
                 width=80,
                 height=30,
-                command=lambda t=title: self.generate_stock_report(t)
+                command=lambda k=key: self.generate_stock_report(k)
             ).place(x=200, y=25)
         
         reports_frame.grid_columnconfigure(0, weight=1)
@@ -1167,19 +1124,172 @@ class InventoryManager(tk.CTk):
         
         canvas.bind_all("<MouseWheel>", _on_mousewheel)
     
-    def generate_stock_report(self, report_type):
-        """Generate stock report"""
-        messagebox.showinfo(
-            f"Generate {report_type}",
-            f"{report_type} generated successfully!\n\n"
-            "Report would include:\n"
-            "• Current stock levels\n"
-            "• Stock values\n"
-            "• Movement history\n"
-            "• Low stock alerts\n"
-            "• Turnover rates\n\n"
-            "Export options: PDF, Excel, CSV"
-        )
+    def generate_stock_report(self, report_key):
+        """Open a paged preview of one stock report, run in the background"""
+        report = STOCK_REPORTS[report_key]
+        
+        preview = tk.CTkToplevel(self)
+        preview.title(f"JS Foods - {report['title']}")
+        preview.geometry("1000x600")
+        preview.resizable(True, True)
+        preview.transient(self)  # Set as transient to main window
+        preview.lift()  # Bring to front
+        
+        header = tk.CTkFrame(preview, fg_color="transparent")
+        header.pack(fill="x", padx=20, pady=(20, 5))
+        
+        tk.CTkLabel(
+            header,
+            text=report['title'],
+            font=("Helvetica", 18, "bold")
+        ).pack(side="left")
+        
+        # Period selector for the reports that cover a period
+        period_var = tk.StringVar(value=f"{report['period']} days")
+        if report['period'] is not None:
+            tk.CTkSegmentedButton(
+                header,
+                values=list(REPORT_PERIODS),
+                variable=period_var,
+                command=lambda choice: run()
+            ).pack(side="right")
+        
+        status_label = tk.CTkLabel(preview, text="Running report...", font=("Helvetica", 11), text_color="#666666")
+        status_label.pack(anchor="w", padx=20)
+        
+        # Report table
+        table_frame = tk.CTkFrame(preview)
+        table_frame.pack(fill="both", expand=True, padx=20, pady=10)
+        table_frame.grid_columnconfigure(0, weight=1)
+        table_frame.grid_rowconfigure(0, weight=1)
+        
+        headings = [heading for _, heading, _, _ in report['columns']]
+        tree = ttk.Treeview(table_frame, columns=headings, show="headings")
+        tree.grid(row=0, column=0, sticky="nsew")
+        
+        scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=tree.yview)
+        scrollbar.grid(row=0, column=1, sticky="ns")
+        tree.configure(yscrollcommand=scrollbar.set)
+        
+        for _, heading, width, kind in report['columns']:
+            tree.heading(heading, text=heading)
+            tree.column(heading, width=width, anchor="w" if kind == 'text' else "center")
+        
+        # Page controls
+        pager = tk.CTkFrame(preview, fg_color="transparent")
+        pager.pack(pady=(0, 20))
+        
+        state = {'result': None, 'page': 0, 'exporting': False}
+        
+        prev_button = tk.CTkButton(pager, text="◀ Previous", width=100, command=lambda: show_page(state['page'] - 1))
+        prev_button.pack(side="left", padx=10)
+        
+        page_label = tk.CTkLabel(pager, text="", width=120)
+        page_label.pack(side="left", padx=10)
+        
+        next_button = tk.CTkButton(pager, text="Next ▶", width=100, command=lambda: show_page(state['page'] + 1))
+        next_button.pack(side="left", padx=10)
+        
+        # One button per export format that is installed
+        export_buttons = []
+        for export_format in available_formats():
+            button = tk.CTkButton(
+                pager,
+                text=f"📤 {export_format}",
+                width=90,
+                state="disabled",
+                command=lambda f=export_format: export_to(f)
+            )
+            button.pack(side="left", padx=(20 if not export_buttons else 0, 5))
+            export_buttons.append(button)
+        
+        def export_to(export_format):
+            result = state['result']
+            extension = EXPORT_FORMATS[export_format][0]
+            path = filedialog.asksaveasfilename(
+                parent=preview,
+                title=f"Export {report['title']}",
+                initialfile=default_filename(report_key, export_format, datetime.now().strftime('%Y%m%d')),
+                defaultextension=extension,
+                filetypes=[(export_format, f"*{extension}")]
+            )
+            if not path:
+                return
+            set_exporting(True)
+            status_label.configure(text="Exporting...")
+            # Keyed per preview, so a second report window does not cancel this one
+            self.background.submit(
+                f"report_export_{id(preview)}",
+                export_report, result, path, export_format,
+                on_progress=show_export_progress,
+                on_done=lambda count: show_exported(count, path),
+                on_error=show_export_error
+            )
+        
+        def set_exporting(exporting):
+            state['exporting'] = exporting
+            for button in export_buttons:
+                button.configure(state="disabled" if exporting else "normal")
+        
+        def show_export_progress(written, total):
+            if preview.winfo_exists():
+                status_label.configure(text=f"{written:,} of {total:,} rows written")
+        
+        def show_exported(count, path):
+            if preview.winfo_exists():
+                set_exporting(False)
+                status_label.configure(text=f"✅ {count:,} rows exported to {path}")
+        
+        def show_export_error(error):
+            print(f"❌ Report export error: {error}")
+            if preview.winfo_exists():
+                set_exporting(False)
+                status_label.configure(text=f"❌ Export failed: {error}")
+            messagebox.showerror("Export Failed", f"Could not export the report:\n{error}")
+        
+        def show_page(page):
+            # Only one page of rows is ever in the table
+            result = state['result']
+            if result is None:
+                return
+            pages = page_count(result)
+            page = max(0, min(page, pages - 1))
+            state['page'] = page
+            tree.delete(*tree.get_children())
+            for values in report_page(result, page):
+                tree.insert("", "end", values=values)
+            page_label.configure(text=f"Page {page + 1} of {pages}")
+            prev_button.configure(state="normal" if page > 0 else "disabled")
+            next_button.configure(state="normal" if page < pages - 1 else "disabled")
+        
+        def show_report(result):
+            if not preview.winfo_exists():
+                return
+            state['result'] = result
+            # A period change while an export runs must not re-enable its buttons
+            if not state['exporting']:
+                set_exporting(False)
+            period = f"{result['start']} to {result['end']}  •  " if result['start'] else ""
+            status_label.configure(
+                text=f"{period}{len(result['rows'])} rows  •  {result['elapsed_ms']:.0f} ms  •  "
+                     f"generated {datetime.now().strftime('%H:%M:%S')}"
+            )
+            show_page(0)
+        
+        def show_error(error):
+            if preview.winfo_exists():
+                status_label.configure(text=f"❌ Could not run report: {error}")
+        
+        def run():
+            status_label.configure(text="Running report...")
+            self.background.submit(
+                f"stock_report_{id(preview)}",
+                run_report, db, report_key, REPORT_PERIODS.get(period_var.get()),
+                on_done=show_report,
+                on_error=show_error
+            )
+        
+        run()
     
     def reorder_product(self, product):
         """Reorder low stock product"""
@@ -1197,19 +1307,23 @@ class InventoryManager(tk.CTk):
             "4. Track delivery"
         )
     
-    def refresh_all(self):
-        """Refresh all inventory data"""
+    def reload_all(self):
+        """Re-read the totals, the inventory list and the low stock alerts"""
         self.load_inventory()
         self.filter_inventory()
         self.load_low_stock()
+    
+    def refresh_all(self):
+        """Refresh all inventory data"""
+        self.reload_all()
         messagebox.showinfo("Refreshed", "All inventory data has been refreshed")
     
     def go_back(self):
-        """Return to main menu"""
-        self.destroy()
-        subprocess.Popen(["python", "jsfoods_main.py"])
+        """Return to the portal of the logged-in user"""
+        self.shell.show_home()
     
     
+    @tracked_action
     def search_by_id(self):
             """UI Trigger for recursive search"""
             try:
@@ -1229,5 +1343,5 @@ class InventoryManager(tk.CTk):
 
 
 if __name__ == "__main__":
-    app = InventoryManager()
-    app.mainloop()
\ No newline at end of file
+    from jsfoods_main import run
+    run("inventory")
\ No newline at end of file
@@ -0,0 +1,316 @@
+"""
+JS Foods Load Test
+Several processes ordering and moving stock in one database at once
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+from jsfoods_migrations import signed_quantity
+
+DEFAULT_CUSTOMERS = [1, 2, 4, 8]
+DEFAULT_STOCK_WORKERS = 2
+DEFAULT_DURATION = 10.0
+# Orders in the generated dataset used when no --database is given
+DEFAULT_DATASET_ORDERS = 10000
+STOCK_ROLES = ('receive', 'adjust')
+MAX_CART_LINES = 5
+# Workers open the database and load products before the clock starts
+START_TIMEOUT = 60.0
+LOCKED = "database is locked"
+
+
+def customer_call(manager, rng: random.Random, products: List[Tuple], customers: List[Tuple]):
+    """Place one order the way the customer portal does"""
+    customer_id, address = rng.choice(customers)
+    items = [
+        {'product_id': product_id, 'quantity_kg': float(rng.randint(1, 20)), 'unit_price': price}
+        for product_id, price in rng.sample(products, rng.randint(1, min(MAX_CART_LINES, len(products))))
+    ]
+    return manager.create_order({
+        'customer_id': customer_id,
+        'total_amount': sum(item['quantity_kg'] * item['unit_price'] for item in items),
+        'delivery_date': (date.today() + timedelta(days=1)).isoformat(),
+        'delivery_address': address,
+        'payment_method': 'account'
+    }, items)
+
+
+def receive_call(manager, rng: random.Random, products: List[Tuple], customers: List[Tuple]):
+    """Book a delivery the way the inventory Receive Stock tab does"""
+    product_id, _ = rng.choice(products)
+    return manager.receive_stock(product_id, float(rng.randint(20, 200)),
+                                 f"Received from Load Test Supplier. Batch: LT{rng.randint(1000, 9999)}. ")
+
+
+def adjust_call(manager, rng: random.Random, products: List[Tuple], customers: List[Tuple]):
+    """Correct a stock level the way the inventory Adjust Stock tab does"""
+    product_id, _ = rng.choice(products)
+    return manager.adjust_stock(product_id, rng.choice((-1, 1)) * float(rng.randint(1, 10)),
+                                "Stock adjustment - Reason: Load test. ")
+
+
+ROLE_CALLS = {'customer': customer_call, 'receive': receive_call, 'adjust': adjust_call}
+
+
+def run_worker(role: str, path: str, profile: str, duration: float, seed: int, start, results):
+    """One worker process: repeat its role's call until the time is up, then report"""
+    # Failed calls print an error each; from many processes that buries the report
+    with open(os.devnull, "w", encoding="utf-8") as devnull, redirect_stdout(devnull):
+        from jsfoods_database import DatabaseManager
+
+        manager = DatabaseManager(database=path, profile=profile)
+        try:
+            rng = random.Random(seed)
+            products = [(product['product_id'], product['price_per_kg']) for product in manager.get_products()]
+            customers = [(user['user_id'], user['address']) for user in manager.get_users('customer')]
+            call = ROLE_CALLS[role]
+            start.wait(START_TIMEOUT)
+            started = time.perf_counter()
+            deadline = started + duration
+            latencies, succeeded = [], 0
+            while time.perf_counter() < deadline:
+                began = time.perf_counter()
+                result = call(manager, rng, products, customers)
+                latencies.append((time.perf_counter() - began) * 1000)
+                succeeded += result is not None
+            elapsed = time.perf_counter() - started
+            writes = manager.write_stats.snapshot()
+            results.put({
+                'role': role,
+                'calls': len(latencies),
+                'succeeded': succeeded,
+                'latencies': latencies,
+                'elapsed': elapsed,
+                'errors': manager.query_stats.errors(),
+                'writes': writes['writes'],
+                'retries': writes['retries'],
+                'wait_ms': writes['wait_ms']
+            })
+        finally:
+            manager.close()
+
+
+def stock_snapshot(path: str) -> Dict:
+    """Stock levels and the last order and stock movement ids before a run"""
+    conn = sqlite3.connect(path)
+    try:
+        return {
+            'stock': dict(conn.execute("SELECT product_id, current_stock_kg FROM products")),
+            'last_order': conn.execute("SELECT COALESCE(MAX(order_id), 0) FROM orders").fetchone()[0],
+            'last_movement': conn.execute(
+                "SELECT COALESCE(MAX(transaction_id), 0) FROM stock_transactions"
+            ).fetchone()[0]
+        }
+    finally:
+        conn.close()
+
+
+def check_consistency(path: str, before: Dict, orders_placed: int) -> List[str]:
+    """Problems with the stock ledger after a run; empty when everything adds up
+
+    Every product's stock must equal its level before the run plus the
+    movements booked during it and the running balance on its newest
+    movement, each new movement's balance must follow from the one
+    before it, no stock may be negative, every order
+    placed must be in the database, and the kg sold in new order lines must
+    match the sale movements.
+    """
+    problems = []
+    conn = sqlite3.connect(path)
+    try:
+        movements = dict(conn.execute(f'''
+            SELECT product_id, SUM({signed_quantity("stock_transactions")})
+            FROM stock_transactions WHERE transaction_id > ?
+            GROUP BY product_id
+        ''', (before['last_movement'],)))
+        balances = dict(conn.execute('''
+            SELECT p.product_id, (SELECT st.balance_kg FROM stock_transactions st
+                                  WHERE st.product_id = p.product_id
+                                  ORDER BY st.transaction_date DESC, st.transaction_id DESC LIMIT 1)
+            FROM products p
+        '''))
+        broken = conn.execute(f'''
+            SELECT COUNT(*) FROM stock_transactions st
+            WHERE st.transaction_id > ?
+            AND abs(st.balance_kg - {signed_quantity("st")} - (
+                SELECT prev.balance_kg FROM stock_transactions prev
+                WHERE prev.product_id = st.product_id
+                AND prev.transaction_date <= st.transaction_date
+                AND prev.transaction_id < st.transaction_id
+                ORDER BY prev.transaction_date DESC, prev.transaction_id DESC
+                LIMIT 1)) > 1e-6
+        ''', (before['last_movement'],)).fetchone()[0]
+        if broken:
+            problems.append(f"{broken} new movements whose balance does not follow from the one before")
+        for product_id, stock in conn.execute("SELECT product_id, current_stock_kg FROM products"):
+            expected = before['stock'].get(product_id, 0) + movements.get(product_id, 0)
+            if abs(stock - expected) > 1e-6:
+                problems.append(f"product {product_id}: stock {stock:.3f} kg, ledger says {expected:.3f} kg")
+            balance = balances.get(product_id)
+            if balance is not None and abs(stock - balance) > 1e-6:
+                problems.append(f"product {product_id}: stock {stock:.3f} kg, running balance {balance:.3f} kg")
+            if stock < 0:
+                problems.append(f"product {product_id}: negative stock {stock:.3f} kg")
+        orders = conn.execute("SELECT COUNT(*) FROM orders WHERE order_id > ?", (before['last_order'],)).fetchone()[0]
+        if orders != orders_placed:
+            problems.append(f"{orders_placed} orders placed but {orders} in the database")
+        sold, booked = conn.execute('''
+            SELECT (SELECT COALESCE(SUM(quantity_kg), 0) FROM order_items WHERE order_id > ?),
+                   (SELECT COALESCE(SUM(quantity_kg), 0) FROM stock_transactions
+                    WHERE transaction_id > ? AND transaction_type = 'sale')
+        ''', (before['last_order'], before['last_movement'])).fetchone()
+        if abs(sold - booked) > 1e-6:
+            problems.append(f"{sold:.3f} kg on new order lines but {booked:.3f} kg of sale movements")
+    finally:
+        conn.close()
+    return problems
+
+
+def run_load(database: str, customers: int, stock_workers: int, duration: float, seed: int = 1,
+             profile: str = None) -> Dict:
+    """Run one load level on a copy of database and summarise it"""
+    workdir = tempfile.mkdtemp(prefix="jsfoods_load_")
+    try:
+        path = os.path.join(workdir, "load.db")
+        shutil.copyfile(database, path)
+        # Plenty of stock, so failures come from contention rather than empty shelves
+        conn = sqlite3.connect(path)
+        with conn:
+            conn.execute("UPDATE products SET current_stock_kg = current_stock_kg + 1000000")
+            conn.execute('''
+                INSERT INTO stock_transactions (product_id, transaction_type, quantity_kg, notes)
+                SELECT product_id, 'receive', 1000000, 'Load test stock' FROM products
+            ''')
+            # A product with stock but no movements yet
+            new_product = conn.execute('''
+                INSERT INTO products (name, category, price_per_kg, current_stock_kg, min_stock_level)
+                VALUES ('Load test new product', 'Beef', 10.0, 1000000, 0)
+            ''').lastrowid
+        conn.close()
+        # Its ledger starts with an order that has it on two lines, where each
+        # line's balance has to be worked out rather than read from the one
+        # before; check_consistency then compares the balances with its stock
+        with open(os.devnull, "w", encoding="utf-8") as devnull, redirect_stdout(devnull):
+            from jsfoods_database import DatabaseManager
+
+            manager = DatabaseManager(database=path, profile=profile)
+            try:
+                manager.create_order(
+                    {'customer_id': manager.get_users('customer')[0]['user_id'], 'total_amount': 150.0},
+                    [{'product_id': new_product, 'quantity_kg': 3.0, 'unit_price': 10.0},
+                     {'product_id': new_product, 'quantity_kg': 12.0, 'unit_price': 10.0}]
+                )
+            finally:
+                manager.close()
+        before = stock_snapshot(path)
+
+        roles = ['customer'] * customers + [STOCK_ROLES[i % len(STOCK_ROLES)] for i in range(stock_workers)]
+        context = multiprocessing.get_context("spawn")
+        start = context.Barrier(len(roles) + 1)
+        results = context.Queue()
+        processes = [
+            context.Process(target=run_worker, args=(role, path, profile, duration, seed + i, start, results))
+            for i, role in enumerate(roles)
+        ]
+        for process in processes:
+            process.start()
+        try:
+            start.wait(START_TIMEOUT)
+            reports = [results.get(timeout=duration + START_TIMEOUT) for _ in processes]
+        finally:
+            for process in processes:
+                process.join(START_TIMEOUT)
+                if process.is_alive():
+                    process.kill()
+
+        orders_placed = sum(report['succeeded'] for report in reports if report['role'] == 'customer')
+        problems = check_consistency(path, before, orders_placed)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    elapsed = max(report['elapsed'] for report in reports)
+    writes = sum(report['writes'] for report in reports)
+    latencies = [latency for report in reports if report['role'] == 'customer' for latency in report['latencies']]
+    errors: Dict[str, int] = {}
+    for report in reports:
+        for message, count in report['errors'].items():
+            errors[message] = errors.get(message, 0) + count
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else (latencies or [0.0]) * 99
+    return {
+        'customers': customers,
+        'stock_workers': stock_workers,
+        'orders_per_sec': orders_placed / elapsed,
+        'writes_per_sec': sum(report['succeeded'] for report in reports) / elapsed,
+        'order_p50_ms': cuts[49],
+        'order_p95_ms': cuts[94],
+        'orders_failed': sum(report['calls'] - report['succeeded'] for report in reports if report['role'] == 'customer'),
+        'stock_failed': sum(report['calls'] - report['succeeded'] for report in reports if report['role'] != 'customer'),
+        'locked': errors.get(LOCKED, 0),
+        'retries': sum(report['retries'] for report in reports),
+        'errors': errors,
+        'lock_wait_ms': sum(report['wait_ms'] for report in reports) / max(writes, 1),
+        'problems': problems
+    }
+
+
+def print_results(results: List[Dict]):
+    """Print one line per load level, then any errors and ledger problems"""
+    print(f"\n{'Customers':>9} {'Stock':>6} {'Orders/s':>9} {'Writes/s':>9} {'Order p50':>9} {'Order p95':>9} "
+          f"{'Orders failed':>13} {'Stock failed':>12} {'Locked':>7} {'Retries':>7} {'Wait ms':>8}  Ledger")
+    for result in results:
+        print(f"{result['customers']:>9} {result['stock_workers']:>6} {result['orders_per_sec']:>9.1f} "
+              f"{result['writes_per_sec']:>9.1f} {result['order_p50_ms']:>9.2f} {result['order_p95_ms']:>9.2f} "
+              f"{result['orders_failed']:>13} {result['stock_failed']:>12} {result['locked']:>7} {result['retries']:>7} "
+              f"{result['lock_wait_ms']:>8.2f}  {'✅' if not result['problems'] else '❌'}")
+    print("\nLocked counts statements that failed with 'database is locked' and Retries the write transactions "
+          "begun again after one. Wait ms is the mean time per write spent waiting for the write lock.")
+    for result in results:
+        other = {message: count for message, count in result['errors'].items() if message != LOCKED}
+        if other:
+            print(f"⚠️ {result['customers']} customers, other errors: "
+                  + ", ".join(f"{message} x{count}" for message, count in other.items()))
+        for problem in result['problems'][:5]:
+            print(f"❌ {result['customers']} customers: {problem}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test JS Foods with concurrent writer processes")
+    parser.add_argument("--customers", type=int, nargs="+", default=DEFAULT_CUSTOMERS,
+                        help="customer processes placing orders, one run per value")
+    parser.add_argument("--stock-workers", type=int, default=DEFAULT_STOCK_WORKERS,
+                        help="inventory processes, alternately receiving and adjusting stock")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="seconds per run")
+    parser.add_argument("--database", help="database to copy for each run (default: a generated dataset)")
+    parser.add_argument("--profile", help="performance profile for the workers' connections")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for carts and stock moves")
+    args = parser.parse_args()
+
+    database = args.database
+    if database is None:
+        from jsfoods_benchmark import dataset_path
+        database = dataset_path(DEFAULT_DATASET_ORDERS)
+    elif not os.path.exists(database):
+        parser.error(f"{database} does not exist")
+
+    results = []
+    for customers in args.customers:
+        print(f"🏋️ {customers} customer(s) and {args.stock_workers} stock worker(s) for {args.duration:g}s")
+        results.append(run_load(database, customers, args.stock_workers, args.duration, args.seed, args.profile))
+    print_results(results)
+    if any(result['problems'] for result in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
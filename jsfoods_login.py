@@ -7,13 +7,13 @@ import customtkinter as tk
 from tkinter import messagebox
 import re
 import sqlite3
-import subprocess
 from jsfoods_database import db
-import sys
+from jsfoods_instrumentation import tracked_action
 
-class LoginApp(tk.CTk):
-    def __init__(self):
-        super().__init__()
+class LoginApp(tk.CTkToplevel):
+    def __init__(self, shell, user=None):
+        super().__init__(shell)
+        self.shell = shell
         
         self.title("JS Foods - Login")
         self.geometry("500x600")
@@ -209,6 +209,7 @@ class LoginApp(tk.CTk):
             return "Password must be at least 6 characters"
         return None
     
+    @tracked_action
     def login(self):
         """Handle login"""
         username = self.username_entry.get().strip()
@@ -258,14 +259,7 @@ class LoginApp(tk.CTk):
     
     def open_dashboard(self, role):
         """Open appropriate dashboard based on role"""
-        self.destroy()
-        
-        if role == "customer":
-            subprocess.Popen([sys.executable, "jsfoods_customer.py"])
-        elif role in ["employee", "manager"]:
-            subprocess.Popen([sys.executable, "jsfoods_employee.py"])
-        elif role == "owner":
-            subprocess.Popen([sys.executable, "jsfoods_admin.py"])
+        self.shell.login(self.current_user)
 
 
 class RegisterApp(tk.CTkToplevel):
@@ -536,6 +530,7 @@ class RegisterApp(tk.CTkToplevel):
         
         return errors
     
+    @tracked_action
     def register(self):
         """Handle registration"""
         # Validate form
@@ -574,5 +569,5 @@ class RegisterApp(tk.CTkToplevel):
 
 
 if __name__ == "__main__":
-    app = LoginApp()
-    app.mainloop()
\ No newline at end of file
+    from jsfoods_main import run
+    run("login")
\ No newline at end of file
@@ -0,0 +1,472 @@
+"""
+JS Foods Database Migrations
+Versioned schema changes tracked with PRAGMA user_version
+"""
+
+import sqlite3
+from typing import List, Tuple
+
+# Sales rollups (migration 3). An order counts towards sales while its status
+# is not 'cancelled', matching the filter every report used. Contributions
+# are applied as signed deltas so the same statements add and remove them.
+_COUNTED = "coalesce({row}.status != 'cancelled', 0)"
+
+_ROLLUP_UPSERT = """
+    ON CONFLICT ({key}) DO UPDATE SET
+        kg = kg + excluded.kg,
+        revenue = revenue + excluded.revenue,
+        order_count = order_count + excluded.order_count,
+        line_count = line_count + excluded.line_count"""
+
+
+def _order_sales_delta(row: str, sign: str) -> str:
+    """Add (sign '+') or remove (sign '-') an orders row in sales_daily"""
+    return f"""
+        INSERT INTO sales_daily (day, order_count, revenue)
+        SELECT date({row}.order_date), {sign}1, {sign}{row}.total_amount
+        WHERE {_COUNTED.format(row=row)}
+        ON CONFLICT (day) DO UPDATE SET
+            order_count = order_count + excluded.order_count,
+            revenue = revenue + excluded.revenue;"""
+
+
+def _order_items_delta(row: str, sign: str) -> str:
+    """Add or remove every line of an orders row in the product and category rollups"""
+    return f"""
+        INSERT INTO sales_rollup (day, product_id, category, kg, revenue, order_count, line_count)
+        SELECT date({row}.order_date), oi.product_id, p.category,
+               {sign}SUM(oi.quantity_kg), {sign}SUM(oi.final_price), {sign}1, {sign}COUNT(*)
+        FROM order_items oi
+        JOIN products p ON p.product_id = oi.product_id
+        WHERE oi.order_id = {row}.order_id AND {_COUNTED.format(row=row)}
+        GROUP BY oi.product_id
+        {_ROLLUP_UPSERT.format(key="day, product_id")};
+        INSERT INTO sales_category_daily (day, category, kg, revenue, order_count, line_count)
+        SELECT date({row}.order_date), p.category,
+               {sign}SUM(oi.quantity_kg), {sign}SUM(oi.final_price), {sign}1, {sign}COUNT(*)
+        FROM order_items oi
+        JOIN products p ON p.product_id = oi.product_id
+        WHERE oi.order_id = {row}.order_id AND {_COUNTED.format(row=row)}
+        GROUP BY p.category
+        {_ROLLUP_UPSERT.format(key="day, category")};"""
+
+
+def _line_delta(row: str, sign: str) -> str:
+    """Add or remove one order_items row in the product and category rollups
+
+    order_count only moves when this is the order's first (or last) line
+    for the product or category, so it stays a count of distinct orders.
+    """
+    return f"""
+        INSERT INTO sales_rollup (day, product_id, category, kg, revenue, order_count, line_count)
+        SELECT date(o.order_date), {row}.product_id, p.category,
+               {sign}{row}.quantity_kg, {sign}{row}.final_price,
+               {sign}(NOT EXISTS (
+                   SELECT 1 FROM order_items x
+                   WHERE x.order_id = {row}.order_id AND x.product_id = {row}.product_id
+                   AND x.item_id != {row}.item_id
+               )),
+               {sign}1
+        FROM orders o
+        JOIN products p ON p.product_id = {row}.product_id
+        WHERE o.order_id = {row}.order_id AND {_COUNTED.format(row="o")}
+        {_ROLLUP_UPSERT.format(key="day, product_id")};
+        INSERT INTO sales_category_daily (day, category, kg, revenue, order_count, line_count)
+        SELECT date(o.order_date), p.category,
+               {sign}{row}.quantity_kg, {sign}{row}.final_price,
+               {sign}(NOT EXISTS (
+                   SELECT 1 FROM order_items x
+                   JOIN products px ON px.product_id = x.product_id
+                   WHERE x.order_id = {row}.order_id AND px.category = p.category
+                   AND x.item_id != {row}.item_id
+               )),
+               {sign}1
+        FROM orders o
+        JOIN products p ON p.product_id = {row}.product_id
+        WHERE o.order_id = {row}.order_id AND {_COUNTED.format(row="o")}
+        {_ROLLUP_UPSERT.format(key="day, category")};"""
+
+
+# Recomputes all three rollups from the base tables; used by migration 3 to
+# backfill and by DatabaseManager.rebuild_sales_rollup to repair drift
+SALES_ROLLUP_REBUILD = [
+    "DELETE FROM sales_daily",
+    "DELETE FROM sales_rollup",
+    "DELETE FROM sales_category_daily",
+    f"""INSERT INTO sales_daily (day, order_count, revenue)
+        SELECT date(o.order_date), COUNT(*), SUM(o.total_amount)
+        FROM orders o
+        WHERE {_COUNTED.format(row="o")}
+        GROUP BY date(o.order_date)""",
+    f"""INSERT INTO sales_rollup (day, product_id, category, kg, revenue, order_count, line_count)
+        SELECT date(o.order_date), oi.product_id, p.category,
+               SUM(oi.quantity_kg), SUM(oi.final_price), COUNT(DISTINCT o.order_id), COUNT(*)
+        FROM order_items oi
+        JOIN orders o ON o.order_id = oi.order_id
+        JOIN products p ON p.product_id = oi.product_id
+        WHERE {_COUNTED.format(row="o")}
+        GROUP BY date(o.order_date), oi.product_id""",
+    f"""INSERT INTO sales_category_daily (day, category, kg, revenue, order_count, line_count)
+        SELECT date(o.order_date), p.category,
+               SUM(oi.quantity_kg), SUM(oi.final_price), COUNT(DISTINCT o.order_id), COUNT(*)
+        FROM order_items oi
+        JOIN orders o ON o.order_id = oi.order_id
+        JOIN products p ON p.product_id = oi.product_id
+        WHERE {_COUNTED.format(row="o")}
+        GROUP BY date(o.order_date), p.category""",
+]
+
+# Tables whose rows the portals show, with their primary key; every insert,
+# update and delete on them is recorded in the changes feed (migration 4)
+CHANGE_FEED_TABLES = {'orders': 'order_id', 'products': 'product_id', 'users': 'user_id'}
+
+
+def _change_triggers(table: str, key: str) -> List[str]:
+    """Triggers appending a row to the changes feed for every write to table"""
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_{operation}_change AFTER {operation.upper()} ON {table}
+            BEGIN
+                INSERT INTO changes (table_name, row_id, operation) VALUES ('{table}', {row}.{key}, '{operation}');
+            END"""
+        for operation, row in (('insert', 'NEW'), ('update', 'NEW'), ('delete', 'OLD'))
+    ]
+
+
+# UTC to the millisecond, like CURRENT_TIMESTAMP (which order_date defaults
+# to) but fine enough to order several changes within one second
+LAST_MODIFIED_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+# Stock ledger (migration 5). Movements that take stock out are stored with a
+# positive quantity like every other type, so the sign comes from the type.
+STOCK_OUT_TYPES = ('sale', 'adjustment_remove')
+
+
+def signed_quantity(row: str) -> str:
+    """SQL for a stock_transactions row's effect on stock, negative for stock out"""
+    out = ", ".join(f"'{kind}'" for kind in STOCK_OUT_TYPES)
+    return f"(CASE WHEN {row}.transaction_type IN ({out}) THEN -{row}.quantity_kg ELSE {row}.quantity_kg END)"
+
+
+# Recomputes every running balance, in (transaction_date, transaction_id)
+# order, working back from each product's current stock so the newest
+# balance always equals it; used by migration 5 to backfill and by
+# DatabaseManager.rebuild_stock_ledger to repair drift
+STOCK_LEDGER_REBUILD = [
+    f"""UPDATE stock_transactions SET balance_kg = ledger.balance
+        FROM (
+            SELECT st.transaction_id,
+                   p.current_stock_kg - COALESCE(SUM({signed_quantity("st")}) OVER (
+                       PARTITION BY st.product_id ORDER BY st.transaction_date, st.transaction_id
+                       ROWS BETWEEN 1 FOLLOWING AND UNBOUNDED FOLLOWING
+                   ), 0) AS balance
+            FROM stock_transactions st
+            JOIN products p ON p.product_id = st.product_id
+        ) AS ledger
+        WHERE stock_transactions.transaction_id = ledger.transaction_id""",
+]
+
+# One snapshot row per product for the day given as the only parameter:
+# the product's newest movement and balance, and its stock level then.
+# Replaces that day's row, so it can be taken as often as needed.
+STOCK_SNAPSHOT = """
+    INSERT OR REPLACE INTO stock_snapshots (product_id, snapshot_date, transaction_id, transaction_date,
+                                            balance_kg, stock_kg)
+    SELECT p.product_id, ?, last.transaction_id, last.transaction_date, last.balance_kg, p.current_stock_kg
+    FROM products p
+    LEFT JOIN stock_transactions last ON last.transaction_id = (
+        SELECT st.transaction_id FROM stock_transactions st
+        WHERE st.product_id = p.product_id
+        ORDER BY st.transaction_date DESC, st.transaction_id DESC
+        LIMIT 1
+    )"""
+
+# Each migration is (version, description, statements). Versions must be
+# consecutive; the database's user_version records the last one applied.
+# Never edit a migration that has shipped - add a new one that changes it.
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (1, "Indexes for the hot query paths", [
+        # Customer order history: WHERE customer_id = ? ORDER BY order_date DESC
+        "CREATE INDEX IF NOT EXISTS idx_orders_customer_date ON orders(customer_id, order_date)",
+        # Employee order list filtered by status, newest first, and the pending count
+        "CREATE INDEX IF NOT EXISTS idx_orders_status_date ON orders(status, order_date)",
+        # Unfiltered recent orders and date range reports
+        "CREATE INDEX IF NOT EXISTS idx_orders_order_date ON orders(order_date)",
+        # Revenue totals only ever look at orders that were not cancelled, so
+        # a partial covering index answers them without touching the table
+        """CREATE INDEX IF NOT EXISTS idx_orders_revenue ON orders(order_date, total_amount)
+           WHERE status != 'cancelled'""",
+        # Order details and every report join order_items on order_id
+        "CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_id, product_id)",
+        # Product usage checks and per-product sales totals
+        "CREATE INDEX IF NOT EXISTS idx_order_items_product ON order_items(product_id, order_id)",
+        # Stock history per product and the usage check before deleting one
+        "CREATE INDEX IF NOT EXISTS idx_stock_transactions_product ON stock_transactions(product_id, transaction_date)",
+        # Catalogue browsing by category
+        "CREATE INDEX IF NOT EXISTS idx_products_category ON products(category, is_active)",
+        # Duplicate name check when adding a product
+        "CREATE INDEX IF NOT EXISTS idx_products_name ON products(name)",
+        # Lowest stock first among active products
+        """CREATE INDEX IF NOT EXISTS idx_products_active_stock ON products(current_stock_kg)
+           WHERE is_active = 1""",
+        "CREATE INDEX IF NOT EXISTS idx_users_role ON users(role)",
+        "CREATE INDEX IF NOT EXISTS idx_route_orders_route ON route_orders(route_id, sequence_number)",
+        "CREATE INDEX IF NOT EXISTS idx_route_orders_order ON route_orders(order_id)",
+    ]),
+    (2, "Change counters for in-memory caches", [
+        # One counter per cached data set, bumped by triggers from any process
+        """CREATE TABLE IF NOT EXISTS table_versions (
+               table_name TEXT PRIMARY KEY,
+               version INTEGER NOT NULL DEFAULT 0
+           )""",
+        "INSERT OR IGNORE INTO table_versions (table_name) VALUES ('discount_rules'), ('product_categories')",
+        """CREATE TRIGGER IF NOT EXISTS trg_discount_rules_insert_version AFTER INSERT ON discount_rules
+           BEGIN
+               UPDATE table_versions SET version = version + 1 WHERE table_name = 'discount_rules';
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_discount_rules_update_version AFTER UPDATE ON discount_rules
+           BEGIN
+               UPDATE table_versions SET version = version + 1 WHERE table_name = 'discount_rules';
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_discount_rules_delete_version AFTER DELETE ON discount_rules
+           BEGIN
+               UPDATE table_versions SET version = version + 1 WHERE table_name = 'discount_rules';
+           END""",
+        # Stock updates are frequent and do not affect discounts, so only
+        # changes to which category a product is in are counted
+        """CREATE TRIGGER IF NOT EXISTS trg_products_insert_category_version AFTER INSERT ON products
+           BEGIN
+               UPDATE table_versions SET version = version + 1 WHERE table_name = 'product_categories';
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_products_update_category_version AFTER UPDATE OF product_id, category ON products
+           BEGIN
+               UPDATE table_versions SET version = version + 1 WHERE table_name = 'product_categories';
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_products_delete_category_version AFTER DELETE ON products
+           BEGIN
+               UPDATE table_versions SET version = version + 1 WHERE table_name = 'product_categories';
+           END""",
+    ]),
+    (3, "Daily sales rollups maintained by triggers", [
+        # Whole-order totals per day, from orders.total_amount
+        """CREATE TABLE IF NOT EXISTS sales_daily (
+               day TEXT PRIMARY KEY,
+               order_count INTEGER NOT NULL DEFAULT 0,
+               revenue REAL NOT NULL DEFAULT 0
+           ) WITHOUT ROWID""",
+        # Line totals per day x product, with the product's category
+        """CREATE TABLE IF NOT EXISTS sales_rollup (
+               day TEXT NOT NULL,
+               product_id INTEGER NOT NULL,
+               category TEXT,
+               kg REAL NOT NULL DEFAULT 0,
+               revenue REAL NOT NULL DEFAULT 0,
+               order_count INTEGER NOT NULL DEFAULT 0,
+               line_count INTEGER NOT NULL DEFAULT 0,
+               PRIMARY KEY (day, product_id)
+           ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_sales_rollup_product ON sales_rollup(product_id)",
+        # Line totals per day x category; order_count here is distinct orders,
+        # which cannot be summed from the per-product rows
+        """CREATE TABLE IF NOT EXISTS sales_category_daily (
+               day TEXT NOT NULL,
+               category TEXT NOT NULL,
+               kg REAL NOT NULL DEFAULT 0,
+               revenue REAL NOT NULL DEFAULT 0,
+               order_count INTEGER NOT NULL DEFAULT 0,
+               line_count INTEGER NOT NULL DEFAULT 0,
+               PRIMARY KEY (day, category)
+           ) WITHOUT ROWID""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_orders_insert_sales AFTER INSERT ON orders
+            BEGIN {_order_sales_delta("NEW", "+")}
+            END""",
+        # Covers cancelling (and un-cancelling) an order, moving its date and
+        # changing its total
+        f"""CREATE TRIGGER IF NOT EXISTS trg_orders_update_sales
+            AFTER UPDATE OF status, order_date, total_amount ON orders
+            WHEN {_COUNTED.format(row="OLD")} != {_COUNTED.format(row="NEW")}
+              OR OLD.order_date IS NOT NEW.order_date
+              OR OLD.total_amount IS NOT NEW.total_amount
+            BEGIN {_order_sales_delta("OLD", "-")} {_order_sales_delta("NEW", "+")}
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_orders_update_sales_items
+            AFTER UPDATE OF status, order_date ON orders
+            WHEN {_COUNTED.format(row="OLD")} != {_COUNTED.format(row="NEW")}
+              OR date(OLD.order_date) IS NOT date(NEW.order_date)
+            BEGIN {_order_items_delta("OLD", "-")} {_order_items_delta("NEW", "+")}
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_orders_delete_sales AFTER DELETE ON orders
+            BEGIN {_order_sales_delta("OLD", "-")} {_order_items_delta("OLD", "-")}
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_order_items_insert_sales AFTER INSERT ON order_items
+            BEGIN {_line_delta("NEW", "+")}
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_order_items_update_sales AFTER UPDATE ON order_items
+            BEGIN {_line_delta("OLD", "-")} {_line_delta("NEW", "+")}
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_order_items_delete_sales AFTER DELETE ON order_items
+            BEGIN {_line_delta("OLD", "-")}
+            END""",
+        # Moving a product to another category re-derives the category rows
+        # for the days it sold on; this is rare, so a targeted rescan is fine
+        f"""CREATE TRIGGER IF NOT EXISTS trg_products_category_sales
+            AFTER UPDATE OF category ON products
+            WHEN OLD.category IS NOT NEW.category
+            BEGIN
+                UPDATE sales_rollup SET category = NEW.category WHERE product_id = NEW.product_id;
+                DELETE FROM sales_category_daily
+                WHERE category IN (OLD.category, NEW.category)
+                AND day IN (SELECT day FROM sales_rollup WHERE product_id = NEW.product_id);
+                INSERT INTO sales_category_daily (day, category, kg, revenue, order_count, line_count)
+                SELECT date(o.order_date), p.category,
+                       SUM(oi.quantity_kg), SUM(oi.final_price), COUNT(DISTINCT o.order_id), COUNT(*)
+                FROM order_items oi
+                JOIN orders o ON o.order_id = oi.order_id
+                JOIN products p ON p.product_id = oi.product_id
+                WHERE p.category IN (OLD.category, NEW.category)
+                AND date(o.order_date) IN (SELECT day FROM sales_rollup WHERE product_id = NEW.product_id)
+                AND {_COUNTED.format(row="o")}
+                GROUP BY date(o.order_date), p.category;
+            END""",
+        *SALES_ROLLUP_REBUILD,
+    ]),
+    (4, "Change feed for live portal refresh", [
+        # Append-only; written by triggers in the same transaction as the
+        # change, so readers in any process see it exactly when it commits
+        """CREATE TABLE IF NOT EXISTS changes (
+               change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+               table_name TEXT NOT NULL,
+               row_id INTEGER NOT NULL,
+               operation TEXT NOT NULL CHECK(operation IN ('insert', 'update', 'delete')),
+               changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+           )""",
+        *(trigger for table, key in CHANGE_FEED_TABLES.items() for trigger in _change_triggers(table, key)),
+    ]),
+    (5, "Stock ledger with running balances and snapshots", [
+        # Stock level after each movement, and who made it
+        "ALTER TABLE stock_transactions ADD COLUMN balance_kg REAL",
+        "ALTER TABLE stock_transactions ADD COLUMN user_id INTEGER REFERENCES users(user_id)",
+        # inventory_log was a second, never-written history; fold any rows
+        # into the ledger so there is one place to look
+        """INSERT INTO stock_transactions (product_id, transaction_type, quantity_kg, notes, transaction_date, user_id)
+           SELECT product_id, CASE WHEN change_amount < 0 THEN 'adjustment_remove' ELSE 'adjustment_add' END,
+                  abs(change_amount), reason, log_date, logged_by
+           FROM inventory_log""",
+        "DELETE FROM inventory_log",
+        *STOCK_LEDGER_REBUILD,
+        # Every writer updates products before logging the movement, so a
+        # product's first movement starts from the stock it has just set.
+        # The previous balance is found through idx_stock_transactions_product.
+        f"""CREATE TRIGGER IF NOT EXISTS trg_stock_transactions_balance AFTER INSERT ON stock_transactions
+            WHEN NEW.balance_kg IS NULL
+            BEGIN
+                UPDATE stock_transactions SET balance_kg = COALESCE(
+                    (SELECT prev.balance_kg FROM stock_transactions prev
+                     WHERE prev.product_id = NEW.product_id
+                     AND prev.transaction_date <= NEW.transaction_date
+                     AND prev.transaction_id < NEW.transaction_id
+                     ORDER BY prev.transaction_date DESC, prev.transaction_id DESC
+                     LIMIT 1),
+                    (SELECT current_stock_kg FROM products WHERE product_id = NEW.product_id) - {signed_quantity("NEW")}
+                ) + {signed_quantity("NEW")}
+                WHERE transaction_id = NEW.transaction_id;
+            END""",
+        # Per-product checkpoints; reconciliation replays only the movements
+        # after the latest one
+        """CREATE TABLE IF NOT EXISTS stock_snapshots (
+               product_id INTEGER NOT NULL,
+               snapshot_date TEXT NOT NULL,
+               transaction_id INTEGER,
+               transaction_date TIMESTAMP,
+               balance_kg REAL,
+               stock_kg REAL NOT NULL,
+               PRIMARY KEY (product_id, snapshot_date)
+           ) WITHOUT ROWID""",
+    ]),
+    (6, "Index of stock movements other than sales", [
+        # Deliveries and adjustments are a few percent of the ledger; with
+        # the running balances they give sales over any period without
+        # reading the sales themselves. Covers the stock reports' scans.
+        """CREATE INDEX IF NOT EXISTS idx_stock_transactions_inbound
+           ON stock_transactions(product_id, transaction_date, transaction_type, quantity_kg)
+           WHERE transaction_type <> 'sale'""",
+    ]),
+    (7, "Order last-modified times and export watermarks", [
+        # Stamped on every insert and update, so the nightly export can find
+        # orders whose status changed. Existing orders count as last
+        # changed when they were placed.
+        "ALTER TABLE orders ADD COLUMN last_modified TIMESTAMP",
+        # Recreated below so it ignores the stamping updates, which are not
+        # changes the portals need to see; dropped first so the backfill
+        # does not add every order to the changes feed
+        "DROP TRIGGER IF EXISTS trg_orders_update_change",
+        f"UPDATE orders SET last_modified = COALESCE(order_date, {LAST_MODIFIED_NOW})",
+        "CREATE INDEX IF NOT EXISTS idx_orders_last_modified ON orders(last_modified)",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_orders_insert_modified AFTER INSERT ON orders
+            WHEN NEW.last_modified IS NULL
+            BEGIN
+                UPDATE orders SET last_modified = {LAST_MODIFIED_NOW} WHERE order_id = NEW.order_id;
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_orders_update_modified AFTER UPDATE ON orders
+            WHEN NEW.last_modified IS OLD.last_modified
+            BEGIN
+                UPDATE orders SET last_modified = {LAST_MODIFIED_NOW} WHERE order_id = NEW.order_id;
+            END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_orders_update_change AFTER UPDATE ON orders
+            WHEN NEW.last_modified IS OLD.last_modified
+            BEGIN
+                INSERT INTO changes (table_name, row_id, operation) VALUES ('orders', NEW.order_id, 'update');
+            END""",
+        # Where jsfoods_incremental got to in each table. upper_* hold the
+        # bounds of a run still in progress, NULL once it has finished.
+        """CREATE TABLE IF NOT EXISTS export_watermarks (
+               table_name TEXT PRIMARY KEY,
+               last_id INTEGER NOT NULL DEFAULT 0,
+               last_modified TEXT NOT NULL DEFAULT '',
+               run INTEGER NOT NULL DEFAULT 0,
+               run_date TEXT,
+               batch INTEGER NOT NULL DEFAULT 0,
+               upper_id INTEGER,
+               upper_modified TEXT,
+               updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+           ) WITHOUT ROWID""",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Read the migration version stored in the database header"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection, target: int = LATEST_VERSION) -> List[int]:
+    """Apply every pending migration up to target and return the versions applied
+
+    Each migration runs in its own transaction together with the
+    user_version bump, so a failure leaves the database at the last good
+    version. ANALYZE runs once afterwards so the planner has statistics
+    for the new indexes.
+    """
+    current = get_schema_version(conn)
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        if version <= current or version > target:
+            continue
+        try:
+            conn.execute("BEGIN")
+            for statement in statements:
+                conn.execute(statement)
+            # PRAGMA does not take parameters; version is always an int from MIGRATIONS
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        print(f"✅ Applied migration {version}: {description}")
+        applied.append(version)
+    if applied:
+        conn.execute("ANALYZE")
+        conn.commit()
+    return applied
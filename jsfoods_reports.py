@@ -0,0 +1,346 @@
+"""
+JS Foods Stock Reports
+Set-based inventory reports over products and the stock ledger
+"""
+
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+from jsfoods_analytics import window_dates
+from jsfoods_migrations import signed_quantity
+
+# Rows shown per page of the report preview
+REPORT_PAGE_SIZE = 50
+# Period choices for the reports that cover a period
+REPORT_PERIODS = {
+    "7 days": 7,
+    "30 days": 30,
+    "90 days": 90,
+    "365 days": 365
+}
+# The low stock report suggests reordering enough for this many days of
+# sales on top of the minimum level
+REORDER_COVER_DAYS = 14
+# Average stock for turnover is read off the ledger at this many evenly
+# spaced moments across the period, plus its start
+TURNOVER_SAMPLES = 12
+
+# Same thresholds as the inventory list's status column
+STOCK_STATUS = """
+    CASE WHEN p.current_stock_kg <= 0 THEN 'Out of Stock'
+         WHEN p.current_stock_kg <= p.min_stock_level * 0.2 THEN 'Very Low'
+         WHEN p.current_stock_kg <= p.min_stock_level * 0.5 THEN 'Low'
+         WHEN p.current_stock_kg <= p.min_stock_level THEN 'Warning'
+         ELSE 'Good' END"""
+
+
+def stock_before(bound: str) -> str:
+    """SQL for product p's stock just before the timestamp parameter bound
+
+    One lookup on the running balances; a product with no movement before
+    bound had the stock its first movement started from.
+    """
+    return f"""COALESCE(
+        (SELECT st.balance_kg FROM stock_transactions st
+         WHERE st.product_id = p.product_id AND st.transaction_date < {bound}
+         ORDER BY st.transaction_date DESC, st.transaction_id DESC LIMIT 1),
+        (SELECT st.balance_kg - {signed_quantity("st")} FROM stock_transactions st
+         WHERE st.product_id = p.product_id
+         ORDER BY st.transaction_date, st.transaction_id LIMIT 1),
+        p.current_stock_kg)"""
+
+
+def inbound(start: str, end: str) -> str:
+    """SQL for each product's net kg from movements other than sales between two bounds
+
+    Reads idx_stock_transactions_inbound only. Sales over the same period
+    are then opening + inbound - closing, without reading a single sale.
+    """
+    return f"""
+        SELECT product_id,
+               SUM(CASE WHEN transaction_type IN ('receive', 'initial') THEN quantity_kg ELSE 0 END) AS received_kg,
+               SUM(CASE WHEN transaction_type LIKE 'adjustment%' THEN {signed_quantity("stock_transactions")}
+                        ELSE 0 END) AS adjusted_kg
+        FROM stock_transactions
+        WHERE transaction_type <> 'sale' AND transaction_date >= {start} AND transaction_date < {end}
+        GROUP BY product_id"""
+
+
+# Period reports take ?1 = first day, ?2 = the day after the last and
+# ?3 = the number of days; the others take no parameters.
+# Columns are (field, heading, width, format).
+STOCK_REPORTS = {
+    'summary': {
+        'title': "📋 Stock Summary",
+        'description': "Overview of all inventory items",
+        'period': None,
+        'columns': [
+            ('product_id', "ID", 50, 'int'),
+            ('name', "Name", 170, 'text'),
+            ('category', "Category", 90, 'text'),
+            ('stock_kg', "Stock kg", 80, 'kg'),
+            ('min_kg', "Min kg", 70, 'kg'),
+            ('pct_of_min', "% of Min", 70, 'pct'),
+            ('value', "Value", 90, 'money'),
+            ('category_rank', "Rank in Category", 110, 'int'),
+            ('status', "Status", 90, 'text'),
+        ],
+        'sql': f"""
+            SELECT p.product_id, p.name, p.category,
+                   p.current_stock_kg AS stock_kg, p.min_stock_level AS min_kg,
+                   100.0 * p.current_stock_kg / NULLIF(p.min_stock_level, 0) AS pct_of_min,
+                   p.current_stock_kg * p.price_per_kg AS value,
+                   RANK() OVER (PARTITION BY p.category ORDER BY p.current_stock_kg * p.price_per_kg DESC) AS category_rank,
+                   {STOCK_STATUS} AS status
+            FROM products p
+            WHERE p.is_active = 1
+            ORDER BY p.category, category_rank, p.name""",
+    },
+    'movement': {
+        'title': "📈 Stock Movement",
+        'description': "Stock changes over time",
+        'period': 30,
+        'columns': [
+            ('product_id', "ID", 50, 'int'),
+            ('name', "Name", 170, 'text'),
+            ('category', "Category", 90, 'text'),
+            ('opening_kg', "Opening kg", 85, 'kg'),
+            ('received_kg', "Received kg", 85, 'kg'),
+            ('sold_kg', "Sold kg", 80, 'kg'),
+            ('adjusted_kg', "Adjusted kg", 85, 'kg'),
+            ('closing_kg', "Closing kg", 85, 'kg'),
+            ('net_kg', "Net kg", 75, 'kg'),
+            ('category_share', "% of Category Sales", 120, 'pct'),
+        ],
+        'sql': f"""
+            WITH moved AS (
+                SELECT p.product_id, p.name, p.category,
+                       {stock_before('?1')} AS opening_kg,
+                       {stock_before('?2')} AS closing_kg,
+                       COALESCE(i.received_kg, 0) AS received_kg,
+                       COALESCE(i.adjusted_kg, 0) AS adjusted_kg
+                FROM products p
+                LEFT JOIN ({inbound('?1', '?2')}) AS i ON i.product_id = p.product_id
+            ), levels AS (
+                SELECT *, opening_kg + received_kg + adjusted_kg - closing_kg AS sold_kg
+                FROM moved
+                WHERE opening_kg <> 0 OR closing_kg <> 0 OR received_kg <> 0 OR adjusted_kg <> 0
+            )
+            SELECT product_id, name, category, opening_kg, received_kg, sold_kg, adjusted_kg, closing_kg,
+                   closing_kg - opening_kg AS net_kg,
+                   100.0 * sold_kg / NULLIF(SUM(sold_kg) OVER (PARTITION BY category), 0) AS category_share
+            FROM levels
+            ORDER BY category, sold_kg DESC""",
+    },
+    'value': {
+        'title': "💰 Stock Value",
+        'description': "Total inventory value by category",
+        'period': None,
+        'columns': [
+            ('category', "Category", 120, 'text'),
+            ('products', "Products", 80, 'int'),
+            ('stock_kg', "Stock kg", 100, 'kg'),
+            ('value', "Value", 110, 'money'),
+            ('average_price', "Avg £/kg", 80, 'money'),
+            ('share', "% of Value", 90, 'pct'),
+            ('cumulative_share', "Cumulative %", 100, 'pct'),
+        ],
+        'sql': """
+            SELECT p.category, COUNT(*) AS products, SUM(p.current_stock_kg) AS stock_kg,
+                   SUM(p.current_stock_kg * p.price_per_kg) AS value,
+                   SUM(p.current_stock_kg * p.price_per_kg) / NULLIF(SUM(p.current_stock_kg), 0) AS average_price,
+                   100.0 * SUM(p.current_stock_kg * p.price_per_kg)
+                       / NULLIF(SUM(SUM(p.current_stock_kg * p.price_per_kg)) OVER (), 0) AS share,
+                   100.0 * SUM(SUM(p.current_stock_kg * p.price_per_kg)) OVER (
+                       ORDER BY SUM(p.current_stock_kg * p.price_per_kg) DESC ROWS UNBOUNDED PRECEDING
+                   ) / NULLIF(SUM(SUM(p.current_stock_kg * p.price_per_kg)) OVER (), 0) AS cumulative_share
+            FROM products p
+            WHERE p.is_active = 1
+            GROUP BY p.category
+            ORDER BY value DESC""",
+    },
+    'low_stock': {
+        'title': "⚠️ Low Stock Report",
+        'description': "Items below minimum levels",
+        'period': 30,
+        'columns': [
+            ('priority', "#", 40, 'int'),
+            ('product_id', "ID", 50, 'int'),
+            ('name', "Name", 170, 'text'),
+            ('category', "Category", 90, 'text'),
+            ('stock_kg', "Stock kg", 80, 'kg'),
+            ('min_kg', "Min kg", 70, 'kg'),
+            ('shortfall_kg', "Shortfall kg", 90, 'kg'),
+            ('daily_sales_kg', "Sales kg/day", 90, 'kg'),
+            ('days_cover', "Days Cover", 80, 'days'),
+            ('reorder_kg', "Reorder kg", 80, 'kg'),
+        ],
+        'sql': f"""
+            WITH low AS (
+                SELECT p.product_id, p.name, p.category,
+                       p.current_stock_kg AS stock_kg, p.min_stock_level AS min_kg,
+                       p.min_stock_level - p.current_stock_kg AS shortfall_kg,
+                       MAX(({stock_before('?1')} + COALESCE(i.received_kg, 0) + COALESCE(i.adjusted_kg, 0)
+                            - p.current_stock_kg) / ?3, 0) AS daily_sales_kg
+                FROM products p
+                LEFT JOIN ({inbound('?1', '?2')}) AS i ON i.product_id = p.product_id
+                WHERE p.is_active = 1 AND p.current_stock_kg < p.min_stock_level
+            ), cover AS (
+                SELECT *, stock_kg / NULLIF(daily_sales_kg, 0) AS days_cover,
+                       MAX(min_kg + daily_sales_kg * {REORDER_COVER_DAYS} - stock_kg, 0) AS reorder_kg
+                FROM low
+            )
+            SELECT ROW_NUMBER() OVER (ORDER BY days_cover IS NULL, days_cover, shortfall_kg DESC) AS priority,
+                   product_id, name, category, stock_kg, min_kg, shortfall_kg, daily_sales_kg, days_cover, reorder_kg
+            FROM cover
+            ORDER BY priority""",
+    },
+    'turnover': {
+        'title': "📊 Turnover Rate",
+        'description': "Inventory turnover analysis",
+        'period': 365,
+        'columns': [
+            ('turnover_rank', "#", 40, 'int'),
+            ('product_id', "ID", 50, 'int'),
+            ('name', "Name", 170, 'text'),
+            ('category', "Category", 90, 'text'),
+            ('sold_kg', "Sold kg", 90, 'kg'),
+            ('average_kg', "Avg Stock kg", 90, 'kg'),
+            ('turnover', "Turnover", 75, 'ratio'),
+            ('days_cover', "Days Cover", 80, 'days'),
+            ('abc_class', "ABC", 50, 'text'),
+        ],
+        'sql': f"""
+            WITH RECURSIVE samples(k) AS (
+                SELECT 0 UNION ALL SELECT k + 1 FROM samples WHERE k < {TURNOVER_SAMPLES}
+            ), average AS (
+                SELECT p.product_id,
+                       AVG({stock_before(f"datetime(?1, '+' || (s.k * ?3 * 1.0 / {TURNOVER_SAMPLES}) || ' days')")}) AS average_kg
+                FROM products p CROSS JOIN samples s
+                WHERE p.is_active = 1
+                GROUP BY p.product_id
+            ), levels AS (
+                SELECT p.product_id, p.name, p.category, p.price_per_kg, a.average_kg,
+                       {stock_before('?1')} AS opening_kg,
+                       {stock_before('?2')} AS closing_kg,
+                       COALESCE(i.received_kg, 0) + COALESCE(i.adjusted_kg, 0) AS inbound_kg
+                FROM products p
+                JOIN average a ON a.product_id = p.product_id
+                LEFT JOIN ({inbound('?1', '?2')}) AS i ON i.product_id = p.product_id
+            ), sales AS (
+                SELECT *, opening_kg + inbound_kg - closing_kg AS sold_kg
+                FROM levels
+            ), ranked AS (
+                -- ABC classes by cumulative share of sales value: A is the
+                -- top 80%, B the next 15%, C the rest
+                SELECT *, 100.0 * SUM(sold_kg * price_per_kg) OVER (
+                              ORDER BY sold_kg * price_per_kg DESC ROWS UNBOUNDED PRECEDING
+                          ) / NULLIF(SUM(sold_kg * price_per_kg) OVER (), 0) AS cumulative_share
+                FROM sales
+            )
+            SELECT RANK() OVER (ORDER BY sold_kg / NULLIF(average_kg, 0) DESC) AS turnover_rank,
+                   product_id, name, category, sold_kg, average_kg,
+                   sold_kg / NULLIF(average_kg, 0) AS turnover,
+                   closing_kg / NULLIF(sold_kg / ?3, 0) AS days_cover,
+                   CASE WHEN cumulative_share <= 80 THEN 'A' WHEN cumulative_share <= 95 THEN 'B' ELSE 'C' END AS abc_class
+            FROM ranked
+            ORDER BY turnover_rank, name""",
+    },
+    'supplier': {
+        'title': "📋 Supplier Report",
+        'description': "Stock received by supplier",
+        'period': 90,
+        'columns': [
+            ('supplier', "Supplier", 170, 'text'),
+            ('deliveries', "Deliveries", 80, 'int'),
+            ('products', "Products", 70, 'int'),
+            ('received_kg', "Received kg", 100, 'kg'),
+            ('value', "Value", 100, 'money'),
+            ('share', "% of kg", 70, 'pct'),
+            ('first_delivery', "First", 130, 'text'),
+            ('last_delivery', "Last", 130, 'text'),
+        ],
+        # Deliveries booked in the portal are noted "Received from <supplier>. Batch: ..."
+        'sql': """
+            WITH deliveries AS (
+                SELECT st.product_id, st.quantity_kg, st.transaction_date, p.price_per_kg,
+                       CASE WHEN st.notes LIKE 'Received from %. Batch:%'
+                            THEN substr(st.notes, 15, instr(st.notes, '. Batch:') - 15)
+                            ELSE 'Not recorded' END AS supplier
+                FROM stock_transactions st
+                JOIN products p ON p.product_id = st.product_id
+                WHERE st.transaction_type <> 'sale' AND st.transaction_type = 'receive'
+                AND st.transaction_date >= ?1 AND st.transaction_date < ?2
+            )
+            SELECT supplier, COUNT(*) AS deliveries, COUNT(DISTINCT product_id) AS products,
+                   SUM(quantity_kg) AS received_kg, SUM(quantity_kg * price_per_kg) AS value,
+                   100.0 * SUM(quantity_kg) / NULLIF(SUM(SUM(quantity_kg)) OVER (), 0) AS share,
+                   MIN(transaction_date) AS first_delivery, MAX(transaction_date) AS last_delivery
+            FROM deliveries
+            GROUP BY supplier
+            ORDER BY received_kg DESC""",
+    },
+}
+
+
+def report_params(key: str, days: int = None, today: date = None) -> Tuple:
+    """Query parameters for a report, covering the last `days` days including today"""
+    default = STOCK_REPORTS[key]['period']
+    if default is None:
+        return ()
+    days = days or default
+    start, end = window_dates(days, today)
+    params = (start.isoformat(), (end + timedelta(days=1)).isoformat(), days)
+    # SQLite refuses parameters a statement does not use
+    return params if '?3' in STOCK_REPORTS[key]['sql'] else params[:2]
+
+
+def run_report(manager, key: str, days: int = None, today: date = None) -> Dict:
+    """Run one report and return its rows with the columns and period used
+
+    Goes through the manager's query cache, so asking again before any
+    product or stock movement changes costs nothing.
+    """
+    report = STOCK_REPORTS[key]
+    params = report_params(key, days, today)
+    started = time.perf_counter()
+    rows = manager.cached_query(report['sql'], params)
+    return {
+        'key': key,
+        'title': report['title'],
+        'columns': report['columns'],
+        'rows': rows,
+        'start': params[0] if params else None,
+        'end': (date.fromisoformat(params[1]) - timedelta(days=1)).isoformat() if params else None,
+        'elapsed_ms': (time.perf_counter() - started) * 1000
+    }
+
+
+def format_cell(value, kind: str) -> str:
+    """Display text for one report value"""
+    if value is None:
+        return "—"
+    if kind == 'kg':
+        return f"{value:,.1f}"
+    if kind == 'money':
+        return f"£{value:,.2f}"
+    if kind == 'pct':
+        return f"{value:.1f}%"
+    if kind == 'ratio':
+        return f"{value:.2f}"
+    if kind == 'days':
+        return f"{value:,.1f}"
+    return str(value)
+
+
+def report_page(report: Dict, page: int, page_size: int = REPORT_PAGE_SIZE) -> List[Tuple]:
+    """Formatted values for one page of a report, first page 0"""
+    columns = report['columns']
+    rows = report['rows'][page * page_size:(page + 1) * page_size]
+    return [tuple(format_cell(row[field], kind) for field, _, _, kind in columns) for row in rows]
+
+
+def page_count(report: Dict, page_size: int = REPORT_PAGE_SIZE) -> int:
+    """Number of pages, at least one so an empty report still has a page to show"""
+    return max(1, -(-len(report['rows']) // page_size))
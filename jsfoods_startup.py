@@ -0,0 +1,167 @@
+"""
+JS Foods Startup Report
+Import cost and time-to-first-window for each entry point
+"""
+
+import argparse
+import io
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+from typing import Dict, List, Optional, Tuple
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Entry point name -> module started by `python <module>.py`
+ENTRY_POINTS = {
+    'main': 'jsfoods_main',
+    'login': 'jsfoods_login',
+    'customer': 'jsfoods_customer',
+    'employee': 'jsfoods_employee',
+    'inventory': 'jsfoods_inventory',
+    'admin': 'jsfoods_admin'
+}
+
+# Must match jsfoods_main
+STARTUP_REPORT_ENV = 'JSFOODS_STARTUP_REPORT'
+FIRST_WINDOW_MARKER = 'FIRST_WINDOW_READY'
+WINDOW_TIMEOUT = 30.0
+
+
+def import_profile(module: str) -> Tuple[float, List[Tuple[float, float, str]]]:
+    """Import a module in a fresh interpreter under -X importtime
+
+    Returns the total import time in ms and one (cumulative ms, self ms,
+    module) entry per imported module, slowest first. Raises RuntimeError
+    with the last line of stderr if the import fails.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=APP_DIR, capture_output=True, text=True)
+    lines = result.stderr.splitlines()
+    if result.returncode != 0:
+        raise RuntimeError(lines[-1] if lines else f"exit status {result.returncode}")
+    entries = []
+    for line in lines:
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((int(cumulative_us) / 1000, int(self_us) / 1000, name.strip()))
+    # The module itself is imported last, so its cumulative time is the total
+    total = next((cumulative for cumulative, _, name in reversed(entries) if name == module), 0.0)
+    entries.sort(reverse=True)
+    return total, entries
+
+
+def time_to_first_window(view: str) -> float:
+    """Wall time in ms from starting the app on a view to its first window
+
+    Includes interpreter startup. jsfoods_main prints a marker and quits
+    once the window is drawn; needs a display.
+    """
+    # The app prints emoji, which a Windows pipe cannot encode by default
+    env = dict(os.environ, **{STARTUP_REPORT_ENV: "1", "PYTHONIOENCODING": "utf-8"})
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "jsfoods_main.py", view], cwd=APP_DIR, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               encoding="utf-8", errors="replace")
+    # A window that never appears must not hang the report
+    watchdog = threading.Timer(WINDOW_TIMEOUT, process.kill)
+    watchdog.start()
+    try:
+        for line in process.stdout:
+            if line.strip() == FIRST_WINDOW_MARKER:
+                return (time.perf_counter() - started) * 1000
+        error = process.stderr.read().strip().splitlines()
+        raise RuntimeError(error[-1] if error else "no window was shown")
+    finally:
+        watchdog.cancel()
+        process.kill()
+        process.wait()
+
+
+def timed_open(path: str) -> float:
+    """Time in ms to construct and close a DatabaseManager on path"""
+    from jsfoods_database import DatabaseManager
+
+    started = time.perf_counter()
+    # Keep the connection and settings messages out of the report
+    with redirect_stdout(io.StringIO()):
+        DatabaseManager(database=path).close()
+    return (time.perf_counter() - started) * 1000
+
+
+def database_open_times(database: str) -> Dict[str, float]:
+    """Time opening a new database, reopening it, and opening a copy of database
+
+    Reopening shows the fast path: a database already at the latest
+    migration skips the schema DDL and the seed data.
+    """
+    workdir = tempfile.mkdtemp(prefix="jsfoods-startup-")
+    try:
+        fresh = os.path.join(workdir, "new.db")
+        times = {"new file": timed_open(fresh), "reopened": timed_open(fresh)}
+        if os.path.exists(database):
+            copy = os.path.join(workdir, "copy.db")
+            shutil.copyfile(database, copy)
+            times[os.path.basename(database)] = timed_open(copy)
+        return times
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_report(names: List[str], runs: int = 3, top: int = 8, window: bool = True,
+                 database: Optional[str] = None):
+    """Print the startup report for each entry point"""
+    for name in names:
+        module = ENTRY_POINTS[name]
+        print(f"\n🚀 {name} ({module}.py)")
+        try:
+            profiles = [import_profile(module) for _ in range(runs)]
+        except RuntimeError as e:
+            print(f"   ❌ Import failed: {e}")
+            continue
+        totals = [total for total, _ in profiles]
+        print(f"   import        {statistics.median(totals):8.1f} ms  (median of {runs})")
+        # Slowest modules from the median run, by cumulative time
+        _, entries = sorted(profiles)[len(profiles) // 2]
+        for cumulative, self_ms, module_name in entries[1:top + 1]:
+            print(f"     {cumulative:8.1f} ms cumulative {self_ms:7.1f} ms self  {module_name}")
+        if window:
+            view = 'login' if name == 'main' else name
+            try:
+                times = [time_to_first_window(view) for _ in range(runs)]
+                print(f"   first window  {statistics.median(times):8.1f} ms  (median of {runs})")
+            except RuntimeError as e:
+                print(f"   ⚠️ First window not measured: {e}")
+    if database:
+        print("\n🗄️ Opening the database")
+        for label, elapsed in database_open_times(database).items():
+            print(f"   {label:<13} {elapsed:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report JS Foods startup time per entry point")
+    parser.add_argument("entry_points", nargs="*", metavar="entry_point",
+                        help=f"one of {', '.join(ENTRY_POINTS)} (default: all)")
+    parser.add_argument("--runs", type=int, default=3, help="runs per measurement, median reported")
+    parser.add_argument("--top", type=int, default=8, help="slowest imported modules to list")
+    parser.add_argument("--no-window", action="store_true",
+                        help="skip time-to-first-window (for machines without a display)")
+    parser.add_argument("--database", default=os.path.join(APP_DIR, "jsfoods.db"),
+                        help="database copied to time opening an existing database")
+    args = parser.parse_args()
+    unknown = [name for name in args.entry_points if name not in ENTRY_POINTS]
+    if unknown:
+        parser.error(f"unknown entry point {', '.join(unknown)}")
+    print_report(args.entry_points or list(ENTRY_POINTS), args.runs, args.top,
+                 not args.no_window, args.database)
+
+
+if __name__ == "__main__":
+    main()
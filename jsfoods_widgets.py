@@ -0,0 +1,217 @@
+"""
+JS Foods Widgets
+Reusable pieces shared by the portal windows
+"""
+
+import tkinter
+from tkinter import ttk
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Sequence, Tuple
+
+# (primary key, column values, tags) for one Treeview row
+Row = Tuple[Hashable, Tuple, Tuple]
+
+ORDER_STATUS_COLORS = {
+    'pending': 'orange',
+    'confirmed': 'blue',
+    'processing': 'purple',
+    'ready': 'green',
+    'delivered': '#2E7D32',
+    'cancelled': 'red'
+}
+
+
+class TreeviewBinding:
+    """Keeps a ttk.Treeview in step with a list of rows keyed by primary key
+
+    Each refresh is compared with what is already shown: new keys are
+    inserted, rows whose values or tags changed are updated in place and
+    vanished keys are deleted, so an unchanged table costs no Tk calls at
+    all. Item ids are the keys, which keeps the selection across refreshes,
+    and the row at the top of the view stays at the top.
+    """
+
+    def __init__(self, tree: ttk.Treeview, tag_colors: Dict[str, str] = None):
+        self.tree = tree
+        # key -> (values, tags) as last written to the tree, in display order
+        self._rows: Dict[Hashable, Tuple[Tuple, Tuple]] = {}
+        for tag, color in (tag_colors or {}).items():
+            tree.tag_configure(tag, foreground=color)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @staticmethod
+    def _iid(key: Hashable) -> str:
+        return str(key)
+
+    def _top_key(self) -> Any:
+        """Key of the first visible row, or None if the table is empty"""
+        if not self._rows:
+            return None
+        keys = list(self._rows)
+        index = min(int(round(self.tree.yview()[0] * len(keys))), len(keys) - 1)
+        return keys[index]
+
+    def set_rows(self, rows: Iterable[Row]):
+        """Show exactly these rows, in this order"""
+        rows = [(key, tuple(values), tuple(tags)) for key, values, tags in rows]
+        wanted = {key for key, _, _ in rows}
+        top_key = self._top_key()
+
+        vanished = [key for key in self._rows if key not in wanted]
+        if vanished:
+            self.tree.delete(*(self._iid(key) for key in vanished))
+            for key in vanished:
+                del self._rows[key]
+
+        # Rows already shown only need moving if their relative order changed
+        kept = [key for key, _, _ in rows if key in self._rows]
+        reorder = kept != list(self._rows)
+
+        new_rows = {}
+        for index, (key, values, tags) in enumerate(rows):
+            iid = self._iid(key)
+            old = self._rows.get(key)
+            if old is None:
+                self.tree.insert("", index, iid=iid, values=values, tags=tags)
+            else:
+                if old != (values, tags):
+                    self.tree.item(iid, values=values, tags=tags)
+                if reorder:
+                    self.tree.move(iid, "", index)
+            new_rows[key] = (values, tags)
+        self._rows = new_rows
+
+        if top_key in self._rows:
+            self.tree.yview_moveto(list(self._rows).index(top_key) / len(self._rows))
+
+    def extend(self, rows: Iterable[Row]):
+        """Append rows after those already shown, updating any already present"""
+        for key, values, tags in rows:
+            values, tags = tuple(values), tuple(tags)
+            iid = self._iid(key)
+            old = self._rows.get(key)
+            if old is None:
+                self.tree.insert("", "end", iid=iid, values=values, tags=tags)
+            elif old != (values, tags):
+                self.tree.item(iid, values=values, tags=tags)
+            self._rows[key] = (values, tags)
+
+    def clear(self):
+        """Remove every row"""
+        if self._rows:
+            self.tree.delete(*(self._iid(key) for key in self._rows))
+            self._rows = {}
+
+    def keys(self) -> List[Hashable]:
+        """Keys of the rows shown, in display order"""
+        return list(self._rows)
+
+    def rows(self) -> List[Row]:
+        """The rows shown, in display order, as last passed in"""
+        return [(key, values, tags) for key, (values, tags) in self._rows.items()]
+
+
+class VirtualCardGrid:
+    """Scrollable grid of fixed-size cards that only builds what is on screen
+
+    Cards are placed on a canvas with create_window. Only the rows in view,
+    plus `overscan` rows either side, have a card; as the view scrolls,
+    cards that leave it are refilled with the items coming into it, so the
+    number of widgets depends on the window size, not on the item count.
+    make_card(canvas) builds an empty card widget and fill_card(card, item)
+    shows an item on it.
+    """
+
+    def __init__(self, canvas: tkinter.Canvas, scrollbar: ttk.Scrollbar,
+                 make_card: Callable[[tkinter.Canvas], tkinter.Widget],
+                 fill_card: Callable[[tkinter.Widget, Any], None],
+                 card_width: int, card_height: int, columns: int = 3,
+                 padding: int = 10, overscan: int = 1):
+        self.canvas = canvas
+        self.scrollbar = scrollbar
+        self.make_card = make_card
+        self.fill_card = fill_card
+        self.card_width = card_width
+        self.card_height = card_height
+        self.columns = columns
+        self.padding = padding
+        self.overscan = overscan
+        self.items: List = []
+        # item index -> (card, canvas window id) for every card on show
+        self._shown: Dict[int, Tuple[tkinter.Widget, int]] = {}
+        self._spare: List[Tuple[tkinter.Widget, int]] = []
+        self._layout_pending = False
+        canvas.configure(yscrollcommand=self._on_scroll)
+        canvas.bind("<Configure>", lambda event: self._schedule_layout())
+
+    @property
+    def row_height(self) -> int:
+        return self.card_height + 2 * self.padding
+
+    @property
+    def column_width(self) -> int:
+        return self.card_width + 2 * self.padding
+
+    def card_count(self) -> int:
+        """Card widgets built so far, shown or spare"""
+        return len(self._shown) + len(self._spare)
+
+    def set_items(self, items: Sequence):
+        """Show a new list of items from the top"""
+        self.items = list(items)
+        # Every card is refilled, since the item at its index may differ
+        self._spare.extend(self._shown.values())
+        self._shown = {}
+        rows = -(-len(self.items) // self.columns)
+        self.canvas.configure(scrollregion=(0, 0, self.columns * self.column_width, rows * self.row_height))
+        self.canvas.yview_moveto(0)
+        self.layout()
+
+    def update_items(self, changed: Dict[int, Any]):
+        """Replace the items at these indexes, refilling only their cards if on show"""
+        for index, item in changed.items():
+            self.items[index] = item
+            shown = self._shown.get(index)
+            if shown is not None:
+                self.fill_card(shown[0], item)
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self._schedule_layout()
+
+    def _schedule_layout(self):
+        if not self._layout_pending:
+            self._layout_pending = True
+            self.canvas.after_idle(self.layout)
+
+    def visible_range(self) -> range:
+        """Indexes of the items that should have a card right now"""
+        top = self.canvas.canvasy(0)
+        bottom = top + max(self.canvas.winfo_height(), self.row_height)
+        first_row = max(0, int(top // self.row_height) - self.overscan)
+        last_row = int(bottom // self.row_height) + self.overscan
+        return range(first_row * self.columns, min(len(self.items), (last_row + 1) * self.columns))
+
+    def layout(self):
+        """Give every item in view a card, recycling cards that scrolled away"""
+        self._layout_pending = False
+        wanted = self.visible_range()
+        for index in [index for index in self._shown if index not in wanted]:
+            self._spare.append(self._shown.pop(index))
+        for index in wanted:
+            if index in self._shown:
+                continue
+            if self._spare:
+                card, window = self._spare.pop()
+            else:
+                card = self.make_card(self.canvas)
+                window = self.canvas.create_window(0, 0, window=card, anchor="nw",
+                                                   width=self.card_width, height=self.card_height)
+            self.fill_card(card, self.items[index])
+            row, col = divmod(index, self.columns)
+            self.canvas.coords(window, self.padding + col * self.column_width, self.padding + row * self.row_height)
+            self.canvas.itemconfigure(window, state="normal")
+            self._shown[index] = (card, window)
+        for card, window in self._spare:
+            self.canvas.itemconfigure(window, state="hidden")